@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CalculatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'calculator'
+
+    def ready(self):
+        from calculator import imgcache
+
+        # image cache settings (all optional)
+        imgcache.configure(
+            size=getattr(settings, 'MOON_IMG_CACHE_SIZE', imgcache.DEFAULT_SIZE),
+            quantization_step=getattr(settings, 'MOON_IMG_CACHE_STEP', imgcache.DEFAULT_STEP),
+            backend_name=getattr(settings, 'MOON_IMG_BACKEND', imgcache.DEFAULT_BACKEND),
+        )
+        if getattr(settings, 'MOON_IMG_CACHE_PREWARM', False):
+            imgcache.prewarm()
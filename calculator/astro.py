@@ -1,9 +1,6 @@
+import datetime
 import math
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.patches import Circle, Ellipse, Rectangle
-from io import StringIO
+from calculator import lunations
 
 
 # Calculate Julian Date given day, month, year
@@ -13,8 +10,8 @@ def calc_jd(day, month, year):
     y = year
 
     # defensive checks
-    if d < 1 or d > 31:
-        raise ValueError("Day out of range [1,31]")
+    if d < 1 or d >= 32:
+        raise ValueError("Day out of range [1,32) (day 31 may have a fraction)")
     if m < 1 or m > 12:
         raise ValueError("Month out of range [1,12]")
     if y < 1900:
@@ -83,6 +80,40 @@ def calc_date(jd):
     return day, month, year, hour, minute
 
 
+# Julian Date of J2000.0 (1 January 2000, 12h UTC)
+J2000 = 2451545.0
+J2000_DATETIME = datetime.datetime(2000, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+# Split a datetime into day (with the time of day as a fraction), month, year in UTC
+# Naive datetimes are taken as UTC
+def split_datetime(moment):
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc)
+    seconds = moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1000000
+    return moment.day + seconds / 86400, moment.month, moment.year
+
+
+# Calculate Julian Date given a datetime (UTC, or naive as UTC)
+def calc_jd_from_datetime(moment):
+    return calc_jd(*split_datetime(moment))
+
+
+# Calculate the UTC datetime of a Julian Date (to the microsecond, unlike calc_date())
+def calc_datetime(jd):
+    return J2000_DATETIME + datetime.timedelta(days=jd - J2000)
+
+
+# Calculate Moon's right ascension and declination at a datetime (UTC, or naive as UTC)
+def calc_moon_pos_at(moment):
+    return calc_moon_pos(calc_jd_from_datetime(moment))
+
+
+# Calculate the MoonState at a datetime (UTC, or naive as UTC), the phase follows the time of day
+def calc_moon_state_at(moment):
+    return calc_moon_state(*split_datetime(moment))
+
+
 # Vector-scalar dot product
 def dot_product(vector, scalar):
     product = 0
@@ -104,134 +135,148 @@ def reduce_angle(ang, radians=False):
     return ang - int(ang / (2 * math.pi)) * 2 * math.pi
 
 
-# Given a primary and secondary list and a scalar, find cross product of scalar and primary, add secondary, find sum
-# Helper function for nutate()
-def nutate_list_helper(list_primary, list_secondary, scalar):
-    # copy the primary list for operations
-    list_temp = list_primary.copy()
-
-    # multiply each element in temp (primary) by scalar, add value from secondary list
-    for i in range(0, len(list_temp)):
-        list_temp[i] = float(list_temp[i])      # ensure all items are floats first
-        list_temp[i] *= scalar
-        list_temp[i] += list_secondary[i]
-
-    # find sum of elements in temp
-    tmp = 0
-    for i in list_temp:
-        tmp += i
-
-    return tmp
+# Nutation constants from Meeus Chapter 22
+NUT_COEFF1 = [297.85036, 445267.111480, -0.0019142, 1 / 189474]
+NUT_COEFF2 = [357.52772, 35999.050340, -0.0001603, -1 / 300000]
+NUT_COEFF3 = [134.96298, 477198.867398, 0.0086972, 1.0 / 56250]
+NUT_COEFF4 = [93.27191, 483202.017538, -0.0036825, -1.0 / 327270]
+NUT_COEFF5 = [125.04452, -1934.136261, 0.0020708, 1. / 450000]
+NUT_D_LNG = [0, -2, 0, 0, 0, 0, -2, 0, 0, -2, -2, -2, 0, 2, 0, 2, 0, 0, -2, 0, 2, 0, 0, -2, 0, -2, 0, 0, 2,
+             -2, 0, -2, 0, 0, 2, 2, 0, -2, 0, 2, 2, -2, -2, 2, 2, 0, -2, -2, 0, -2, -2, 0, -1, -2, 1, 0, 0, -1, 0, 0,
+             2, 0, 2]
+NUT_M_LNG = [0, 0, 0, 0, 1, 0, 1, 0, 0, -1, 17, 2, 0, 2, 1, 0, -1, 0, 0, 0, 1, 1, -1, 0,
+             0, 0, 0, 0, 0, -1, -1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, -1, 1, -1, -1, 0, -1]
+NUT_MP_LNG = [0, 0, 0, 0, 0, 1, 0, 0, 1, 0, 1, 0, -1, 0, 1, -1, -1, 1, 2, -2, 0, 2, 2, 1, 0, 0, -1, 0, -1,
+              0, 0, 1, 0, 2, -1, 1, 0, 1, 0, 0, 1, 2, 1, -2, 0, 1, 0, 0, 2, 2, 0, 1, 1, 0, 0, 1, -2, 1, 1, 1, -1, 3, 0]
+NUT_F_LNG = [0, 2, 2, 0, 0, 0, 2, 2, 2, 2, 0, 2, 2, 0, 0, 2, 0, 2, 0, 2, 2, 2, 0, 2, 2, 2, 2, 0, 0, 2, 0, 0,
+             0, -2, 2, 2, 2, 0, 2, 2, 0, 2, 2, 0, 0, 0, 2, 0, 2, 0, 2, -2, 0, 0, 0, 2, 2, 0, 0, 2, 2, 2, 2]
+NUT_OM_LNG = [1, 2, 2, 2, 0, 0, 2, 1, 2, 2, 0, 1, 2, 0, 1, 2, 1, 1, 0, 1, 2, 2, 0, 2, 0, 0, 1, 0, 1, 2, 1,
+              1, 1, 0, 1, 2, 2, 0, 2, 1, 0, 2, 1, 1, 1, 0, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 2, 0, 0, 2, 2, 2, 2]
+NUT_SIN_LNG = [-171996, -13187, -2274, 2062, 1426, 712, -517, -386, -301, 217,
+               -158, 129, 123, 63, 63, -59, -58, -51, 48, 46, -38, -31, 29, 29, 26, -22,
+               21, 17, 16, -16, -15, -13, -12, 11, -10, -8, 7, -7, -7, -7,
+               6, 6, 6, -6, -6, 5, -5, -5, -5, 4, 4, 4, -4, -4, -4, 3, -3, -3, -3, -3, -3, -3, -3]
+NUT_SDELT = [-174.2, -1.6, -0.2, 0.2, -3.4, 0.1, 1.2, -0.4, 0, -0.5, 0, 0.1, 0, 0, 0.1, 0, -0.1, 10, -0.1, 0, 0.1, 33]
+NUT_COS_LNG = [92025, 5736, 977, -895, 54, -7, 224, 200, 129, -95, 0, -70, -53, 0,
+               -33, 26, 32, 27, 0, -24, 16, 13, 0, -12, 0, 0, -10, 0, -8, 7, 9, 7, 6, 0, 5, 3, -3, 0, 3, 3,
+               0, -3, -3, 3, 3, 0, 3, 3, 3, 14]
+NUT_CDELT = [8.9, -3.1, -0.5, 0.5, -0.1, 0.0, -0.6, 0.0, -0.1, 0.3, 53]
+
+
+# Nutation terms folded once at import
+# every entry of a table is scaled by the same scalar, so each table reduces to its sum
+NUT_RATES = [sum(NUT_COEFF1), sum(NUT_COEFF2), sum(NUT_COEFF3), sum(NUT_COEFF4), sum(NUT_COEFF5)]
+NUT_ARGS = [sum(NUT_D_LNG), sum(NUT_M_LNG), sum(NUT_MP_LNG), sum(NUT_F_LNG), sum(NUT_OM_LNG)]
+NUT_LONG = [sum(NUT_SIN_LNG[:len(NUT_SDELT)]), sum(NUT_SDELT)]
+NUT_OBLIQUE = [sum(NUT_COS_LNG[:len(NUT_CDELT)]), sum(NUT_CDELT)]
 
 
 # Nutate a given Julian Date
 def nutate(jd):
-    # constants from Meeus
-    coeff1 = [297.85036, 445267.111480, -0.0019142, 1 / 189474]
-    coeff2 = [357.52772, 35999.050340, -0.0001603, -1 / 300000]
-    coeff3 = [134.96298, 477198.867398, 0.0086972, 1.0 / 56250]
-    coeff4 = [93.27191, 483202.017538, -0.0036825, -1.0 / 327270]
-    coeff5 = [125.04452, -1934.136261, 0.0020708, 1. / 450000]
-    d_lng = [0, -2, 0, 0, 0, 0, -2, 0, 0, -2, -2, -2, 0, 2, 0, 2, 0, 0, -2, 0, 2, 0, 0, -2, 0, -2, 0, 0, 2,
-              -2, 0, -2, 0, 0, 2, 2, 0, -2, 0, 2, 2, -2, -2, 2, 2, 0, -2, -2, 0, -2, -2, 0, -1, -2, 1, 0, 0, -1, 0, 0,
-              2, 0, 2]
-    m_lng = [0, 0, 0, 0, 1, 0, 1, 0, 0, -1, 17, 2, 0, 2, 1, 0, -1, 0, 0, 0, 1, 1, -1, 0,
-              0, 0, 0, 0, 0, -1, -1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, -1, 1, -1, -1, 0, -1]
-    mp_lng = [0, 0, 0, 0, 0, 1, 0, 0, 1, 0, 1, 0, -1, 0, 1, -1, -1, 1, 2, -2, 0, 2, 2, 1, 0, 0, -1, 0, -1,
-               0, 0, 1, 0, 2, -1, 1, 0, 1, 0, 0, 1, 2, 1, -2, 0, 1, 0, 0, 2, 2, 0, 1, 1, 0, 0, 1, -2, 1, 1, 1, -1, 3, 0]
-    f_lng = [0, 2, 2, 0, 0, 0, 2, 2, 2, 2, 0, 2, 2, 0, 0, 2, 0, 2, 0, 2, 2, 2, 0, 2, 2, 2, 2, 0, 0, 2, 0, 0,
-              0, -2, 2, 2, 2, 0, 2, 2, 0, 2, 2, 0, 0, 0, 2, 0, 2, 0, 2, -2, 0, 0, 0, 2, 2, 0, 0, 2, 2, 2, 2]
-    om_lng = [1, 2, 2, 2, 0, 0, 2, 1, 2, 2, 0, 1, 2, 0, 1, 2, 1, 1, 0, 1, 2, 2, 0, 2, 0, 0, 1, 0, 1, 2, 1,
-               1, 1, 0, 1, 2, 2, 0, 2, 1, 0, 2, 1, 1, 1, 0, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 2, 0, 0, 2, 2, 2, 2]
-    sin_lng = [-171996, -13187, -2274, 2062, 1426, 712, -517, -386, -301, 217,
-                -158, 129, 123, 63, 63, -59, -58, -51, 48, 46, -38, -31, 29, 29, 26, -22,
-                21, 17, 16, -16, -15, -13, -12, 11, -10, -8, 7, -7, -7, -7,
-                6, 6, 6, -6, -6, 5, -5, -5, -5, 4, 4, 4, -4, -4, -4, 3, -3, -3, -3, -3, -3, -3, -3]
-    sdelt = [-174.2, -1.6, -0.2, 0.2, -3.4, 0.1, 1.2, -0.4, 0, -0.5, 0, 0.1, 0, 0, 0.1, 0, -0.1, 10, -0.1, 0, 0.1, 33]
-    cos_lng = [92025, 5736, 977, -895, 54, -7, 224, 200, 129, -95, 0, -70, -53, 0,
-                -33, 26, 32, 27, 0, -24, 16, 13, 0, -12, 0, 0, -10, 0, -8, 7, 9, 7, 6, 0, 5, 3, -3, 0, 3, 3,
-                0, -3, -3, 3, 3, 0, 3, 3, 3, 14]
-    cdelt = [8.9, -3.1, -0.5, 0.5, -0.1, 0.0, -0.6, 0.0, -0.1, 0.3, 53]
-
     # radians/degrees constant
     rd = math.pi/180
 
     # find time t from julian date
     t = (jd-2451545.0)/36525
 
-    # find d via dot product of t and coeff1
-    d = reduce_angle(dot_product(coeff1, t) * rd, radians=True)
-
-    # find m via dot product of t and coeff2
-    m = reduce_angle(dot_product(coeff2, t) * rd, radians=True)
-
-    # find mprime via dot product of t and coeff3
-    mprime = reduce_angle(dot_product(coeff3, t) * rd, radians=True)
-
-    # find f via dot product of t and coeff4
-    f = reduce_angle(dot_product(coeff4, t) * rd, radians=True)
-
-    # find omega via dot product of t and coeff5
-    omega = reduce_angle(dot_product(coeff5, t) * rd, radians=True)
-
-    # initialize longitude, obliquity
-    long = 0
-    obliquity = 0
+    # find d, m, mprime, f, omega from the folded coeff1-coeff5
+    d = reduce_angle(NUT_RATES[0] * t * rd, radians=True)
+    m = reduce_angle(NUT_RATES[1] * t * rd, radians=True)
+    mprime = reduce_angle(NUT_RATES[2] * t * rd, radians=True)
+    f = reduce_angle(NUT_RATES[3] * t * rd, radians=True)
+    omega = reduce_angle(NUT_RATES[4] * t * rd, radians=True)
 
     # find arg
-    arg = dot_product(d_lng, d) + dot_product(m_lng, m) + dot_product(mp_lng, mprime) + dot_product(f_lng, f) \
-        + dot_product(om_lng, omega)
+    arg = NUT_ARGS[0] * d + NUT_ARGS[1] * m + NUT_ARGS[2] * mprime + NUT_ARGS[3] * f + NUT_ARGS[4] * omega
     sinarg = t * math.sin(arg)
     cosarg = t * math.cos(arg)
 
-    long = 0.0001 * nutate_list_helper(sdelt, sin_lng, t) * sinarg
-    obliquity = 0.0001 * nutate_list_helper(cdelt, cos_lng, t) * cosarg
+    long = 0.0001 * (NUT_LONG[0] + NUT_LONG[1] * t) * sinarg
+    obliquity = 0.0001 * (NUT_OBLIQUE[0] + NUT_OBLIQUE[1] * t) * cosarg
 
     return long, obliquity
 
 
-# Calculate Moon's right ascension and declination given Julian Date
-def calc_moon_pos(jd):
-    # constants from Meeus Chapter 47
-    d_lng = [0, 2, 2, 0, 0, 0, 2, 2, 2, 2, 0, 1, 0, 2, 0, 0, 4, 0, 4, 2, 2, 1, 1, 2, 2, 4, 2, 0, 2, 2, 1, 2, 0, 0,
+# Lunar constants from Meeus Chapter 47
+MOON_D_LNG = [0, 2, 2, 0, 0, 0, 2, 2, 2, 2, 0, 1, 0, 2, 0, 0, 4, 0, 4, 2, 2, 1, 1, 2, 2, 4, 2, 0, 2, 2, 1, 2, 0, 0,
               2, 2, 2, 4, 0, 3, 2, 4, 0, 2, 2, 2, 4, 0, 4, 1, 2, 0, 1, 3, 4, 2, 0, 1, 2, 2]
-    m_lng = [0, 0, 0, 0, 1, 0, 0, -1, 0, -1, 1, 0, 1, 0, 0, 0, 0, 0, 0, 1, 1, 0, 1, -1, 0, 0, 0, 1, 0, -1, 0,
+MOON_M_LNG = [0, 0, 0, 0, 1, 0, 0, -1, 0, -1, 1, 0, 1, 0, 0, 0, 0, 0, 0, 1, 1, 0, 1, -1, 0, 0, 0, 1, 0, -1, 0,
               -2, 1, 2, -2, 0, 0, -1, 0, 0, 1, -1, 2, 2, 1, -1, 0, 0, -1, 0, 1, 0, 1, 0, 0, -1, 2, 1, 0, 0]
-    mp_lng = [1, -1, 0, 2, 0, 0, -2, -1, 1, 0, -1, 0, 1, 0, 1, 1, -1, 3, -2, -1, 0, -1, 0, 1, 2, 0, -3, -2,
+MOON_MP_LNG = [1, -1, 0, 2, 0, 0, -2, -1, 1, 0, -1, 0, 1, 0, 1, 1, -1, 3, -2, -1, 0, -1, 0, 1, 2, 0, -3, -2,
                -1, -2, 1, 0, 2, 0, -1, 1, 0, -1, 2, -1, 1, -2, -1, -1, -2, 0, 1, 4, 0, -2, 0, 2, 1, -2, -3, 2, 1, -1,
                3, -1]
-    f_lng = [0, 0, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, -2, 2, -2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 2, 0, 0, 0,
+MOON_F_LNG = [0, 0, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, -2, 2, -2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 2, 0, 0, 0,
               0, 0, 0, -2, 2, 0, 2, 0, 0, 0, 0, 0, 0, -2, 0, 0, 0, 0, -2, -2, 0, 0, 0, 0, 0, 0, 0, -2]
-    sin_lng = [6288774, 1274027, 658314, 213618, -185116, -114332, 58793, 57066, 53322,
+MOON_SIN_LNG = [6288774, 1274027, 658314, 213618, -185116, -114332, 58793, 57066, 53322,
                 45758, -40923, -34720, -30383, 15327, -12528, 10980, 10675, 10034, 8548, -7888, -6766,
                 -5163, 4987, 4036, 3994, 3861, 3665, -2689, -2602, 2390, -2348, 2236, -2120, -2069, 2048,
                 -1773, -1595, 1215, -1110, -892, -810, 759, -713, -700, 691, 596, 549, 537, 520, -487,
                 -399, -381, 351, -340, 330, 327, -323, 299, 294, 0.0]
-    cos_lng = [-20905355, -3699111, -2955968, -569925, 48888, -3149, 246158, -152138,
+MOON_COS_LNG = [-20905355, -3699111, -2955968, -569925, 48888, -3149, 246158, -152138,
                 -170733, -204586, -129620, 108743, 104755, 10321, 0, 79661, -34782, -23210, -21636,
                 24208, 30824, -8379, -16675, -12831, -10445, -11650, 14403, -7003, 0, 10056, 6322,
                 -9884, 5751, 0, -4950, 4130, 0, -3958, 0, 3258, 2616, -1897, -2117, 2354, 0, 0, -1423,
                 -1117, -1571, -1739, 0, -4421, 0, 0, 0, 0, 1165, 0, 0, 8752.0]
-    d_lat = [0, 0, 0, 2, 2, 2, 2, 0, 2, 0, 2, 2, 2, 2, 2, 2, 2, 0, 4, 0, 0, 0, 1, 0, 0, 0, 1, 0, 4, 4, 0, 4, 2, 2,
+MOON_D_LAT = [0, 0, 0, 2, 2, 2, 2, 0, 2, 0, 2, 2, 2, 2, 2, 2, 2, 0, 4, 0, 0, 0, 1, 0, 0, 0, 1, 0, 4, 4, 0, 4, 2, 2,
               2, 2, 0, 2, 2, 2, 2, 4, 2, 2, 0, 2, 1, 1, 0, 2, 1, 2, 0, 4, 4, 1, 4, 1, 4, 2]
-    m_lat = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -1, 0, 0, 1, -1, -1, -1, 1, 0, 1, 0, 1, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0,
+MOON_M_LAT = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -1, 0, 0, 1, -1, -1, -1, 1, 0, 1, 0, 1, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0,
               0, 0, -1, 0, 0, 0, 0, 1, 1, 0, -1, -2, 0, 1, 1, 1, 1, 1, 0, -1, 1, 0, -1, 0, 0, 0, -1, -2]
-    mp_lat = [0, 1, 1, 0, -1, -1, 0, 2, 1, 2, 0, -2, 1, 0, -1, 0, -1, -1, -1, 0, 0, -1, 0, 1, 1, 0, 0, 3, 0,
+MOON_MP_LAT = [0, 1, 1, 0, -1, -1, 0, 2, 1, 2, 0, -2, 1, 0, -1, 0, -1, -1, -1, 0, 0, -1, 0, 1, 1, 0, 0, 3, 0,
                -1, 1, -2, 0, 2, 1, -2, 3, 2, -3, -1, 0, 0, 1, 0, 1, 1, 0, 0, -2, -1, 1, -2, 2, -2, -1, 1, 1, -1, 0, 0]
-    f_lat = [1, 1, -1, -1, 1, -1, 1, 1, -1, -1, -1, -1, 1, -1, 1, 1, -1, -1, -1, 1, 3, 1, 1, 1, -1, -1, -1,
+MOON_F_LAT = [1, 1, -1, -1, 1, -1, 1, 1, -1, -1, -1, -1, 1, -1, 1, 1, -1, -1, -1, 1, 3, 1, 1, 1, -1, -1, -1,
               1, -1, 1, -3, 1, -3, -1, -1, 1, -1, 1, -1, 1, 1, 1, 1, -1, 3, -1, -1, 1, -1, -1, 1, -1, 1, -1, -1,
               -1, -1, -1, -1, 1]
-    sin_lat = [5128122, 280602, 277693, 173237, 55413, 46271, 32573, 17198, 9266, 8822,
+MOON_SIN_LAT = [5128122, 280602, 277693, 173237, 55413, 46271, 32573, 17198, 9266, 8822,
                 8216, 4324, 4200, -3359, 2463, 2211, 2065, -1870, 1828, -1794, -1749, -1565, -1491,
                 -1475, -1410, -1344, -1335, 1107, 1021, 833, 777, 671, 607, 596, 491, -451, 439, 422,
                 421, -366, -351, 331, 315, 302, -283, -229, 223, 223, -220, -220, -185, 181, -177, 176,
                 166, -164, 132, -119, 115, 107.0]
-    coeff0 = [218.3164477, 481267.88123421, -0.00157860, 1.0 / 538841.0, -1.0 / 65194000]
-    coeff1 = [297.8501921, 445267.1114034, -0.0018819, 1.0 / 545868.0, -1.0 / 113065000]
-    coeff2 = [357.5291092, 35999.0502909, -0.0001536, 1.0 / 24490000]
-    coeff3 = [134.9633964, 477198.8675055, 0.0087414, 1.0 / 69699, -1.0 / 14712000]
-    coeff4 = [93.2720950, 483202.0175233, -0.0036539, -1.0 / 35260000, 1.0 / 863310000]
-    coeff5 = [21.448, -4680.93, -1.55, 1999.25, -51.38, -249.67, -39.05, 7.12, 27.87, 5.79, 2.45]
+MOON_COEFF0 = [218.3164477, 481267.88123421, -0.00157860, 1.0 / 538841.0, -1.0 / 65194000]
+MOON_COEFF1 = [297.8501921, 445267.1114034, -0.0018819, 1.0 / 545868.0, -1.0 / 113065000]
+MOON_COEFF2 = [357.5291092, 35999.0502909, -0.0001536, 1.0 / 24490000]
+MOON_COEFF3 = [134.9633964, 477198.8675055, 0.0087414, 1.0 / 69699, -1.0 / 14712000]
+MOON_COEFF4 = [93.2720950, 483202.0175233, -0.0036539, -1.0 / 35260000, 1.0 / 863310000]
+MOON_COEFF5 = [21.448, -4680.93, -1.55, 1999.25, -51.38, -249.67, -39.05, 7.12, 27.87, 5.79, 2.45]
+
+
+# Additive periodic terms of the longitude (suml) and latitude (sumb) as (amplitude in 1e-6 degrees, angle,
+# second angle or None, sign of the second angle) for amplitude * sin(angle + sign * second angle)
+MOON_SUML_TERMS = [(3958, "a1", None, 0), (1962, "lprime", "f", -1), (318, "a2", None, 0)]
+MOON_SUMB_TERMS = [(-2235, "lprime", None, 0), (382, "a3", None, 0), (175, "a1", "f", -1), (175, "a1", "f", 1),
+                   (127, "lprime", "mprime", -1), (-115, "lprime", "mprime", 1)]
+
+# Precision tiers of calc_moon_pos() as (smallest amplitude of the additive terms kept, whether to nutate)
+# The main longitude and latitude series are always evaluated; fast keeps none of the additive terms
+PRECISION_TIERS = {"fast": (10000, False), "standard": (300, True), "full": (0, True)}
+DEFAULT_PRECISION = "full"
+
+# Largest differences from full over 1900-2100 in arcseconds (right ascension, declination), measured every 0.01 days
+# and checked by PrecisionTests
+PRECISION_ERRORS = {"fast": (36, 20), "standard": (0.03, 2.2), "full": (0, 0)}
+
+
+# Get the (suml terms, sumb terms, whether to nutate) evaluated at precision, raises ValueError for unknown tiers
+def get_precision_terms(precision):
+    if precision not in PRECISION_TIERS:
+        raise ValueError(f"Precision must be one of {', '.join(PRECISION_TIERS)}")
+    min_amplitude, nutation = PRECISION_TIERS[precision]
+    return ([term for term in MOON_SUML_TERMS if abs(term[0]) >= min_amplitude],
+            [term for term in MOON_SUMB_TERMS if abs(term[0]) >= min_amplitude], nutation)
+
+
+# Sum amplitude * sin(angle + sign * second angle) over terms given the angles (radians) by name
+def sum_sin_terms(terms, angles):
+    total = 0
+    for amplitude, first, second, sign in terms:
+        arg = angles[first] if second is None else angles[first] + sign * angles[second]
+        total += amplitude * math.sin(arg)
+    return total
+
+
+# Calculate Moon's right ascension and declination given Julian Date
+# precision is a PRECISION_TIERS name, lower tiers skip small terms and nutation (see PRECISION_ERRORS)
+def calc_moon_pos(jd, precision=DEFAULT_PRECISION):
+    suml_terms, sumb_terms, nutation = get_precision_terms(precision)
 
     # radians/degrees constant
     rd = math.pi/180
@@ -240,19 +285,19 @@ def calc_moon_pos(jd):
     t = (jd-2451545.0)/36525
 
     # find lprime via dot product of t and coeff0
-    lprime = reduce_angle(dot_product(coeff0, t)) * rd
+    lprime = reduce_angle(dot_product(MOON_COEFF0, t)) * rd
 
     # find d via dot product of t and coeff1
-    d = reduce_angle(dot_product(coeff1, t)) * rd
+    d = reduce_angle(dot_product(MOON_COEFF1, t)) * rd
 
     # find m via dot product of t and coeff2
-    m = reduce_angle(dot_product(coeff2, t)) * rd
+    m = reduce_angle(dot_product(MOON_COEFF2, t)) * rd
 
     # find mprime via dot product of t and coeff3
-    mprime = reduce_angle(dot_product(coeff3, t)) * rd
+    mprime = reduce_angle(dot_product(MOON_COEFF3, t)) * rd
 
     # find f via dot product of t and coeff4
-    f = reduce_angle(dot_product(coeff4, t)) * rd
+    f = reduce_angle(dot_product(MOON_COEFF4, t)) * rd
 
     # find a1-a3
     a1 = (119.75 + 131.849 * t) * rd
@@ -260,9 +305,9 @@ def calc_moon_pos(jd):
     a3 = (313.45 + 481266.484 * t) * rd
 
     # find suml and sumb
-    suml = 3958 * math.sin(a1) + 1962 * math.sin(lprime - f) + 318 * math.sin(a2)
-    sumb = -2235 * math.sin(lprime) + 382 * math.sin(a3) + 175 * math.sin(a1 - f) + 175 * math.sin(a1 + f) \
-        + 127 * math.sin(lprime - mprime) - 115 * math.sin(lprime + mprime)
+    angles = {"lprime": lprime, "mprime": mprime, "f": f, "a1": a1, "a2": a2, "a3": a3}
+    suml = sum_sin_terms(suml_terms, angles)
+    sumb = sum_sin_terms(sumb_terms, angles)
 
     # find e
     e = 1 - 0.002516*t - 0.0000074*(t**2)
@@ -272,13 +317,13 @@ def calc_moon_pos(jd):
     geolat = 1
     dis = 1
 
-    # updated sin_lng, cos_lng, sin_lat
-    sinlng = sin_lng
-    coslng = cos_lng
-    sinlat = sin_lat
+    # updated sin_lng, cos_lng, sin_lat (copied so the module constants are not scaled in place)
+    sinlng = MOON_SIN_LNG.copy()
+    coslng = MOON_COS_LNG.copy()
+    sinlat = MOON_SIN_LAT.copy()
 
     for i in range(0, len(sinlng)):
-        mag = abs(m_lng[i])
+        mag = abs(MOON_M_LNG[i])
         if mag == 1:
             sinlng[i] *= e
             coslng[i] *= e
@@ -287,28 +332,30 @@ def calc_moon_pos(jd):
             coslng[i] *= e**2
 
     for i in range(0, len(sinlat)):
-        mag = abs(m_lat[i])
+        mag = abs(MOON_M_LAT[i])
         if mag == 1:
             sinlat[i] *= e
         elif mag == 2:
             sinlat[i] *= e**2
 
     # find arg, geolong, dis, geolat
-    arg = dot_product(d_lng, d) + dot_product(m_lng, m) + dot_product(mp_lng, mprime) + dot_product(f_lng, f)
-    geolong = dot_product(coeff0, t) + (dot_product(sinlng, math.sin(arg)) + suml) / 1000000
+    arg = dot_product(MOON_D_LNG, d) + dot_product(MOON_M_LNG, m) + dot_product(MOON_MP_LNG, mprime) \
+        + dot_product(MOON_F_LNG, f)
+    geolong = dot_product(MOON_COEFF0, t) + (dot_product(sinlng, math.sin(arg)) + suml) / 1000000
     dis = 385000.56 + dot_product(coslng, math.cos(arg)) / 1000
-    arg = dot_product(d_lat, d) + dot_product(m_lat, m) + dot_product(mp_lat, mprime) + dot_product(f_lat, f)
+    arg = dot_product(MOON_D_LAT, d) + dot_product(MOON_M_LAT, m) + dot_product(MOON_MP_LAT, mprime) \
+        + dot_product(MOON_F_LAT, f)
     geolat = (dot_product(sinlat, math.sin(arg)) + sumb) / 1000000
 
     # nutate julian date to correct longitude
-    nut_long, nut_oblique = nutate(jd)
+    nut_long, nut_oblique = nutate(jd) if nutation else (0, 0)
     geolong += nut_long / 3600
     geolong = reduce_angle(geolong)
 
     # find lambda, beta, epsilon
     lmda = geolong * rd
     beta = geolat * rd
-    epsilon = (((23 + 26/60)/360 + dot_product(coeff5, t)/3600) + nut_oblique/3600) * rd
+    epsilon = (((23 + 26/60)/360 + dot_product(MOON_COEFF5, t)/3600) + nut_oblique/3600) * rd
 
     # find right ascension and declination
     ra = math.atan2(math.sin(lmda) * math.cos(epsilon) - math.tan(beta) * math.sin(epsilon), math.cos(lmda))
@@ -348,15 +395,80 @@ def convert_time_zone(time, gmt):
         elif hour > 23:
             hour -= 24
 
-    # convert minutes (if gmt is float)
+    # convert minutes (if gmt is float), carrying into hours
     minute = time[1] + 60 * (gmt - int(gmt))
     while not 0 <= minute < 60:
         if minute < 0:
             minute += 60
+            hour -= 1
         elif minute >= 60:
-            hour -= 60
+            minute -= 60
+            hour += 1
+
+    return int(hour % 24), int(minute)
 
-    return int(hour), int(minute)
+
+# Mean equatorial horizontal parallax of the Moon (degrees)
+MOON_PARALLAX = 0.9507
+
+# Altitude of the Moon's centre at rise and set: 0.7275 * parallax - 0.5667 degrees (Meeus Chapter 15)
+MOON_RISE_ALTITUDE = 0.7275 * MOON_PARALLAX - 0.5667
+
+
+# Calculate Greenwich mean sidereal time (degrees) given Julian Date (Meeus Chapter 12)
+def calc_gmst(jd):
+    t = (jd - 2451545.0) / 36525
+    return (280.46061837 + 360.98564736629 * (jd - 2451545.0) + 0.000387933 * t**2 - t**3 / 38710000) % 360
+
+
+# Calculate the Moon's altitude (degrees) at Julian Date jd for an observer at latitude and east longitude
+# moon_pos is a calc_moon_pos() function, e.g. the generated one of calculator.moonkernel
+def calc_moon_altitude(jd, latitude, longitude, moon_pos=calc_moon_pos):
+    ra, dec = moon_pos(jd)
+    ha = math.radians(calc_gmst(jd) + longitude - ra)
+    lat, dec = math.radians(latitude), math.radians(dec)
+    sin_alt = math.sin(lat) * math.sin(dec) + math.cos(lat) * math.cos(dec) * math.cos(ha)
+    return math.degrees(math.asin(min(max(sin_alt, -1), 1)))
+
+
+# Calculate Moon rise and set times for the local date starting at Julian Date jd (0h, as from calc_jd()) at
+# latitude in time zone gmt, the scalar version of astro_array.calc_rise_set_array() (same samples and steps)
+# Returns (rise, set) in local hours, NaN for a missing event
+def calc_rise_set(jd, latitude, gmt, samples=49, iterations=4, moon_pos=calc_moon_pos):
+    longitude = 15 * gmt
+    start = jd - gmt / 24
+    hours = [24 * i / (samples - 1) for i in range(samples)]
+
+    def altitude(hour):
+        return calc_moon_altitude(start + hour / 24, latitude, longitude, moon_pos) - MOON_RISE_ALTITUDE
+
+    altitudes = [altitude(hour) for hour in hours]
+    events = []
+    for rising in (True, False):
+        # first sample interval in which the altitude crosses the horizon in this direction
+        for i in range(samples - 1):
+            if (altitudes[i] >= 0) != (altitudes[i + 1] >= 0) and (altitudes[i + 1] >= 0) == rising:
+                break
+        else:
+            events.append(math.nan)
+            continue
+
+        # linear interpolation inside the bracketing interval, then Newton steps kept inside it
+        low, high = hours[i], hours[i + 1]
+        hour = low + (high - low) * altitudes[i] / (altitudes[i] - altitudes[i + 1])
+        for _ in range(iterations):
+            alt, alt_later = altitude(hour), altitude(hour + 1 / 60)
+            if (alt < 0) == rising:
+                low = hour
+            else:
+                high = hour
+            if alt_later != alt:
+                hour -= alt / (60 * (alt_later - alt))
+            if not low < hour < high:
+                hour = (low + high) / 2
+        events.append(hour)
+
+    return events[0], events[1]
 
 
 # Convert day,month,year to floating-point years
@@ -372,16 +484,64 @@ def calc_float_years(day, month, year):
 def calc_moon_phase(day, month, year):
     # convert d,m,y to years
     yrs = calc_float_years(day, month, year)
+    return calc_k_from_float_years(yrs)
+
 
+# Get decimal moon phase given floating-point years
+def calc_k_from_float_years(yrs):
     # find value of k
     k = (yrs - 2000) * 12.3685 - 0.25   # offset k by a quarter cycle
     return k                            # phase is k - int(k)
 
 
+# Phase quantities of one date, computed once by calc_moon_state()
+# Every function below that takes day, month, year also accepts state= and reuses it instead of recomputing k
+class MoonState:
+    __slots__ = ("jd", "float_years", "k", "fraction", "phase", "illumination", "phase_angle")
+
+    def __init__(self, jd, float_years, k, fraction, phase, illumination, phase_angle):
+        self.jd = jd
+        self.float_years = float_years
+        self.k = k
+        self.fraction = fraction
+        self.phase = phase
+        self.illumination = illumination
+        self.phase_angle = phase_angle
+
+
+# Calculate the MoonState of day, month, year
+# The phase name, illumination, and phase angle all come from the fraction of the lunation in the lunation index,
+# or from the k estimate outside of it; phase_angle is NaN where the k fraction is negative (k < 0)
+def calc_moon_state(day, month, year):
+    float_years = calc_float_years(day, month, year)
+    k = calc_k_from_float_years(float_years)
+    jd = calc_jd(day, month, year)
+    fraction = lunations.calc_fraction_from_jd(jd)
+    if fraction is None:
+        fraction = k - int(k)
+    phase_angle = math.degrees(math.acos(2 * fraction - 1)) if fraction >= 0 else math.nan
+    return MoonState(jd, float_years, k, fraction, str_phase_from_jd(jd, k), calc_illumination_from_k(fraction),
+                     phase_angle)
+
+
 # Get string moon phase given day,month,year
-def str_moon_phase(day, month, year):
-    # Get decimal moon phase
-    k = calc_moon_phase(day, month, year)
+def str_moon_phase(day, month, year, state=None):
+    if state is None:
+        state = calc_moon_state(day, month, year)
+    return state.phase
+
+
+# Get string moon phase given Julian Date and decimal moon phase k
+# Looks the date up in the lunation index, k is only used outside of it
+def str_phase_from_jd(jd, k):
+    phase = lunations.str_phase_from_jd(jd)
+    if phase is None:
+        phase = str_phase_from_k(k)
+    return phase
+
+
+# Get string moon phase given decimal moon phase k
+def str_phase_from_k(k):
     frac = k - int(k)
 
     # initialize phase variable
@@ -431,15 +591,28 @@ def str_moon_phase(day, month, year):
 
 
 # Check for solar/lunar eclipse, returns string
+# Uses the new and full moons of the lunation index, and the k estimate below outside of it
+def check_eclipse(day, month, year, state=None):
+    jd = calc_jd(day, month, year) if state is None else state.jd
+    eclipse_type = lunations.check_eclipse_from_jd(jd)
+    if eclipse_type is not None:
+        return eclipse_type
+    return check_eclipse_from_k(day, month, year, state)
+
+
+# Check for solar/lunar eclipse from the k estimate, returns string
 # Works well for solar eclipses, inconsistent with lunar eclipses
-def check_eclipse(day, month, year):
+def check_eclipse_from_k(day, month, year, state=None):
     eclipse_type = "No eclipse"
     iterations = 0
 
     # break up day into 10 fractions
     while iterations < 10:
         # get k from date + variation in day
-        k = calc_moon_phase(day+iterations/10, month, year)
+        if state is None:
+            k = calc_moon_phase(day+iterations/10, month, year)
+        else:
+            k = calc_k_from_float_years(state.float_years + iterations/10/365.25)
 
         # get phase fraction
         frac = k - int(k)
@@ -480,106 +653,60 @@ def check_eclipse(day, month, year):
 
 
 # Get illumination percentage from day, month, year
-def calc_illumination(day, month, year):
-    k = calc_moon_phase(day, month, year)
+def calc_illumination(day, month, year, state=None):
+    if state is None:
+        state = calc_moon_state(day, month, year)
+    return state.illumination
+
+
+# Get illumination percentage from decimal moon phase k (or the fraction of the lunation)
+def calc_illumination_from_k(k):
     return 0.5 - math.cos(2 * math.pi * (k - int(k))) / 2
 
 
-# Get phase angle from day, month, year
-def calc_phase_angle(day, month, year):
-    k = calc_moon_phase(day, month, year)
-    phase = k - int(k)
-    return math.degrees(math.acos(2 * phase - 1))
+# Get phase angle from day, month, year, NaN where the fraction of the lunation is negative
+def calc_phase_angle(day, month, year, state=None):
+    if state is None:
+        state = calc_moon_state(day, month, year)
+    return state.phase_angle
 
 
 # Get illuminated Moon image
-def get_moon_img(day, month, year):
+def get_moon_img(day, month, year, state=None):
     # get phase from date
-    phase = str_moon_phase(day, month, year)
+    phase = str_moon_phase(day, month, year, state=state)
 
     # get illumination from phase
-    illumination = calc_illumination(day, month, year)
-
-    # setup matplotlib plot
-    fig = plt.figure()
-    fig.patch.set_facecolor('black')
-    plt.axis('off')
-    ax = plt.gca()
-    ax.set_aspect('equal', adjustable='box')
-    ax.set_facecolor('black')
-
-    # handle new moon
-    if phase == "New Moon":
-        moon_backdrop = Circle(xy=(0.5, 0.5), radius=0.5, edgecolor=(0.8, 0.8, 0.8, 0.1), fc=(0.8, 0.8, 0.8, 0.1))
-        ax.add_patch(moon_backdrop)
-    else:
-        # add moon to plot
-        moon = Circle(xy=(0.5, 0.5), radius=0.5, edgecolor='lightgrey', fc='lightgrey')
-        ax.add_patch(moon)
-
-        # add vertical bar over moon
-        if phase == "First Quarter" or phase == "Waxing Crescent" or phase == "Waxing Gibbous":
-            rect = Rectangle(xy=(0, 0), width=0.5, height=1, edgecolor='k', fc='k')
-            ax.add_patch(rect)
-        elif phase == "Last Quarter" or phase == "Waning Crescent" or phase == "Waning Gibbous":
-            rect = Rectangle(xy=(0.5, 0), width=0.5, height=1, edgecolor='k', fc='k')
-            ax.add_patch(rect)
-
-        # draw ellipses for crescents and gibbouses
-        if phase == "Waxing Crescent" or phase == "Waning Crescent":
-            ellipse = Ellipse(xy=(0.5, 0.5), width=(1-2*illumination), height=1, edgecolor='k', fc='k')
-            ax.add_patch(ellipse)
-        elif phase == "Waxing Gibbous" or phase == "Waning Gibbous":
-            ellipse = Ellipse(xy=(0.5, 0.5), width=(2*illumination-1), height=1, edgecolor='lightgrey', fc='lightgrey')
-            ax.add_patch(ellipse)
-
-    img = StringIO()
-    fig.savefig(img, format='svg')
-    img.seek(0)
-    return img.getvalue()
+    illumination = calc_illumination(day, month, year, state=state)
+
+    return draw_moon_img(phase, illumination)
+
+
+# Draw illuminated Moon image given string phase and illumination
+# matplotlib is imported on the first call
+def draw_moon_img(phase, illumination):
+    from calculator import plot
+    return plot.draw_moon_img(phase, illumination)
 
 
 # Get image of Sun-Earth-Moon system
-def get_system_img(day, month, year):
-    k = calc_moon_phase(day, month, year)
-
-    # setup matplotlib plot
-    fig = plt.figure()
-    plt.axis('off')
-    ax = plt.gca()
-    ax.set_aspect('equal', adjustable='box')
-    ax.set_facecolor('black')
-
-    # add sun
-    sun = Circle(xy=(0.5, 0.5), radius=0.1, edgecolor='orange', fc='orange')
-    ax.add_patch(sun)
-
-    # add earth's orbit
-    earth_orbit_radius = 0.32
-    earth_orbit = Circle(xy=(0.5, 0.5), radius=earth_orbit_radius, edgecolor='k', fill=False)
-    ax.add_patch(earth_orbit)
-
-    # add earth at proper position
-    float_years = calc_float_years(day, month, year)
+def get_system_img(day, month, year, state=None):
+    earth_angle, moon_angle = calc_system_angles(day, month, year, state=state)
+    return draw_system_img(earth_angle, moon_angle)
+
+
+# Get angles (radians) of the Earth around the Sun and the Moon around the Earth given day, month, year
+def calc_system_angles(day, month, year, state=None):
+    if state is None:
+        state = calc_moon_state(day, month, year)
+    float_years = state.float_years
     earth_angle = reduce_angle(2 * math.pi * (float_years - int(float_years)) + math.pi / 2, radians=True)
-    earth_x = 0.5 + earth_orbit_radius * math.cos(earth_angle)
-    earth_y = 0.5 + earth_orbit_radius * math.sin(earth_angle)
-    earth = Circle(xy=(earth_x, earth_y), radius=0.05, edgecolor='b', fc='b')
-    ax.add_patch(earth)
-
-    # add moon's orbit
-    moon_orbit_radius = 0.12
-    moon_orbit = Circle(xy=(earth_x, earth_y), radius=moon_orbit_radius, edgecolor='k', fill=False)
-    ax.add_patch(moon_orbit)
-
-    # add moon at proper position
-    moon_angle = reduce_angle(earth_angle + math.pi + (2 * math.pi * (k - int(k))), radians=True)
-    moon_x = earth_x + moon_orbit_radius * math.cos(moon_angle)
-    moon_y = earth_y + moon_orbit_radius * math.sin(moon_angle)
-    moon = Circle(xy=(moon_x, moon_y), radius=0.035, edgecolor='grey', fc='grey')
-    ax.add_patch(moon)
-
-    img = StringIO()
-    fig.savefig(img, format='svg')
-    img.seek(0)
-    return img.getvalue()
+    moon_angle = reduce_angle(earth_angle + math.pi + 2 * math.pi * state.fraction, radians=True)
+    return earth_angle, moon_angle
+
+
+# Draw image of Sun-Earth-Moon system given Earth and Moon angles (radians)
+# matplotlib is imported on the first call
+def draw_system_img(earth_angle, moon_angle):
+    from calculator import plot
+    return plot.draw_system_img(earth_angle, moon_angle)
@@ -0,0 +1,510 @@
+import numpy as np
+from calculator import lunations
+from calculator.astro import (
+    NUT_RATES, NUT_ARGS, NUT_LONG, NUT_OBLIQUE,
+    MOON_D_LNG, MOON_M_LNG, MOON_MP_LNG, MOON_F_LNG, MOON_SIN_LNG, MOON_COS_LNG,
+    MOON_D_LAT, MOON_M_LAT, MOON_MP_LAT, MOON_F_LAT, MOON_SIN_LAT,
+    MOON_COEFF0, MOON_COEFF1, MOON_COEFF2, MOON_COEFF3, MOON_COEFF4, MOON_COEFF5,
+    DEFAULT_PRECISION, MOON_RISE_ALTITUDE, get_precision_terms,
+)
+
+# Batched versions of the calculations in astro.py, evaluated over NumPy arrays of Julian Dates.
+# Every function here mirrors its scalar counterpart term for term and agrees with it to float tolerance.
+
+# radians/degrees constant
+RD = np.pi / 180
+
+
+# Sum a list of amplitudes by the power of the eccentricity factor applied to each term (|M| = 0, 1, 2)
+def split_by_eccentricity(amplitudes, m_multipliers):
+    sums = np.zeros(3)
+    for amplitude, m in zip(amplitudes, m_multipliers):
+        sums[abs(m)] += amplitude
+    return sums
+
+
+# Precomputed coefficient arrays (Meeus Chapter 47)
+# dot_product() scales every entry of a table by the same scalar, so each table reduces to its sum:
+# rows of MOON_RATES give L', D, M, M', F per century, rows of MOON_ARGS give the multipliers of D, M, M', F
+MOON_RATES = np.array([sum(MOON_COEFF0), sum(MOON_COEFF1), sum(MOON_COEFF2), sum(MOON_COEFF3), sum(MOON_COEFF4)])
+MOON_ARGS = np.array([
+    [sum(MOON_D_LNG), sum(MOON_M_LNG), sum(MOON_MP_LNG), sum(MOON_F_LNG)],
+    [sum(MOON_D_LAT), sum(MOON_M_LAT), sum(MOON_MP_LAT), sum(MOON_F_LAT)],
+], dtype=float)
+# rows: sin_lng, sin_lat amplitudes; columns: multiplied by 1, e, e**2
+MOON_AMPLITUDES = np.array([
+    split_by_eccentricity(MOON_SIN_LNG, MOON_M_LNG),
+    split_by_eccentricity(MOON_SIN_LAT, MOON_M_LAT),
+])
+MOON_OBLIQUITY_RATE = sum(MOON_COEFF5)
+# cos_lng amplitudes of the distance; columns: multiplied by 1, e, e**2
+MOON_DISTANCE_AMPLITUDES = split_by_eccentricity(MOON_COS_LNG, MOON_M_LNG)
+
+# Nutation table (Meeus Chapter 22), folded the same way nutate() folds it
+# row 0: rates of d, m, mprime, f, omega in radians per century; row 1: their multipliers in arg
+NUT_TABLE = np.array([NUT_RATES, NUT_ARGS], dtype=float) * np.array([[RD], [1]])
+# rows: longitude, obliquity; columns: constant and t coefficients, in units of 0.0001"
+NUT_AMPLITUDES = 0.0001 * np.array([NUT_LONG, NUT_OBLIQUE], dtype=float)
+
+
+# Nutate an array of Julian Dates, returns longitude and obliquity arrays
+# With memo=True, repeated dates in the batch are evaluated once and scattered back
+def nutate_array(jd_array, memo=False):
+    jd = np.asarray(jd_array, dtype=float)
+    if memo:
+        unique, inverse = np.unique(jd, return_inverse=True)
+        long, obliquity = nutate_array(unique)
+        return long[inverse].reshape(jd.shape), obliquity[inverse].reshape(jd.shape)
+
+    # find time t from julian date
+    t = (jd - 2451545.0) / 36525
+
+    # d, m, mprime, f, omega stacked along the first axis
+    fund = np.mod(np.multiply.outer(NUT_TABLE[0], t), 2 * np.pi)
+    arg = np.tensordot(NUT_TABLE[1], fund, axes=1)
+
+    long = (NUT_AMPLITUDES[0, 0] + NUT_AMPLITUDES[0, 1] * t) * t * np.sin(arg)
+    obliquity = (NUT_AMPLITUDES[1, 0] + NUT_AMPLITUDES[1, 1] * t) * t * np.cos(arg)
+    return long, obliquity
+
+
+# Sum amplitude * sin(angle + sign * second angle) over terms of astro.MOON_SUML_TERMS or MOON_SUMB_TERMS given
+# arrays of the angles (radians) by name
+def sum_sin_terms_array(terms, angles):
+    total = 0
+    for amplitude, first, second, sign in terms:
+        arg = angles[first] if second is None else angles[first] + sign * angles[second]
+        total = total + amplitude * np.sin(arg)
+    return total
+
+
+# Calculate Moon's right ascension and declination for an array of Julian Dates
+# memo is passed through to nutate_array(), precision is a tier of calc_moon_pos()
+def calc_moon_pos_array(jd_array, memo=False, precision=DEFAULT_PRECISION):
+    suml_terms, sumb_terms, nutation = get_precision_terms(precision)
+    jd = np.asarray(jd_array, dtype=float)
+
+    # find time t from julian date
+    t = (jd - 2451545.0) / 36525
+
+    # lprime, d, m, mprime, f stacked along the first axis
+    fund = np.mod(np.multiply.outer(MOON_RATES, t), 360) * RD
+    lprime, _, _, mprime, f = fund
+
+    # find a1-a3
+    a1 = (119.75 + 131.849 * t) * RD
+    a2 = (53.09 + 479264.290 * t) * RD
+    a3 = (313.45 + 481266.484 * t) * RD
+
+    # find suml and sumb
+    angles = {"lprime": lprime, "mprime": mprime, "f": f, "a1": a1, "a2": a2, "a3": a3}
+    suml = sum_sin_terms_array(suml_terms, angles)
+    sumb = sum_sin_terms_array(sumb_terms, angles)
+
+    # find e, then the eccentricity-scaled sin_lng and sin_lat sums
+    e = 1 - 0.002516*t - 0.0000074*(t**2)
+    sinlng, sinlat = np.tensordot(MOON_AMPLITUDES, np.stack([np.ones_like(e), e, e**2]), axes=1)
+
+    # find arg, geolong, geolat
+    arg_lng, arg_lat = np.tensordot(MOON_ARGS, fund[1:], axes=1)
+    geolong = MOON_RATES[0] * t + (sinlng * np.sin(arg_lng) + suml) / 1000000
+    geolat = (sinlat * np.sin(arg_lat) + sumb) / 1000000
+
+    # nutate julian date to correct longitude
+    nut_long, nut_oblique = nutate_array(jd, memo=memo) if nutation else (0, 0)
+    geolong = np.mod(geolong + nut_long / 3600, 360)
+
+    # find lambda, beta, epsilon
+    lmda = geolong * RD
+    beta = geolat * RD
+    epsilon = (((23 + 26/60)/360 + MOON_OBLIQUITY_RATE * t/3600) + nut_oblique/3600) * RD
+
+    # find right ascension and declination
+    ra = np.arctan2(np.sin(lmda) * np.cos(epsilon) - np.tan(beta) * np.sin(epsilon), np.cos(lmda))
+    ra = np.mod(ra, 2 * np.pi) / RD
+    dec = np.arcsin(np.sin(beta) * np.cos(epsilon) + np.cos(beta) * np.sin(epsilon) * np.sin(lmda)) / RD
+
+    return ra, dec
+
+
+# Calculate Moon's distance (km) for an array of Julian Dates, as dis in calc_moon_pos()
+def calc_moon_distance_array(jd_array):
+    jd = np.asarray(jd_array, dtype=float)
+    t = (jd - 2451545.0) / 36525
+
+    # d, m, mprime, f stacked along the first axis
+    fund = np.mod(np.multiply.outer(MOON_RATES[1:], t), 360) * RD
+    e = 1 - 0.002516*t - 0.0000074*(t**2)
+    coslng = np.tensordot(MOON_DISTANCE_AMPLITUDES, np.stack([np.ones_like(e), e, e**2]), axes=1)
+    return 385000.56 + coslng * np.cos(np.tensordot(MOON_ARGS[0], fund, axes=1)) / 1000
+
+
+# Days passed by the end of each month, as accumulated by calc_float_years()
+MONTH_END_DAYS = np.cumsum([31, 28.25, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Upper bounds of the phase fraction for each phase name in str_phase_from_k()
+PHASE_BOUNDS = np.array([
+    0.5/29.53059, 0.25 - 0.5/29.53059, 0.25 + 0.5/29.53059, 0.5 - 0.5/29.53059,
+    0.5 + 0.5/29.53059, 0.75 - 0.5/29.53059, 0.75 + 0.5/29.53059, 1 - 0.5/29.53059,
+])
+PHASE_NAMES = np.array(["New Moon", "Waxing Crescent", "First Quarter", "Waxing Gibbous", "Full Moon",
+                        "Waning Gibbous", "Last Quarter", "Waning Crescent", "New Moon"])
+PHASE_NAMES_NEGATIVE = np.array(["New Moon", "Waning Crescent", "Last Quarter", "Waning Gibbous", "Full Moon",
+                                 "Waxing Gibbous", "First Quarter", "Waxing Crescent", "New Moon"])
+
+# Results of check_eclipse_from_k() by index
+ECLIPSE_TYPES = np.array(["No eclipse", "Lunar eclipse", "Lunar possible"])
+
+# Phase names of the lunation index by quarter
+EVENT_NAMES = np.array(lunations.EVENT_NAMES)
+BETWEEN_NAMES = np.array(lunations.BETWEEN_NAMES)
+
+
+# Julian Date of J2000.0 (1 January 2000, 12h UTC)
+J2000 = 2451545.0
+
+
+# Split an array of datetime64 dates into day, month, year integer arrays
+def split_dates(dates):
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    day = (dates - months).astype(int) + 1
+    month = months.astype(int) % 12 + 1
+    year = dates.astype('datetime64[Y]').astype(int) + 1970
+    return day, month, year
+
+
+# Split an array of datetime64 times (UTC, any unit) into day (with the time of day as a fraction), month, year
+# arrays, like split_datetime()
+def split_datetimes(times):
+    times = np.asarray(times)
+    if not np.issubdtype(times.dtype, np.datetime64):
+        times = times.astype('datetime64[us]')
+    dates = times.astype('datetime64[D]')
+    day, month, year = split_dates(dates)
+    return day + (times - dates) / np.timedelta64(1, 'D'), month, year
+
+
+# Get the dates start + i * step (days) for i in [first, first + count)
+def date_range_array(start, step, first, count):
+    return np.datetime64(start, 'D') + np.arange(first, first + count) * step
+
+
+# Check day, month, year arrays against the ranges of calc_jd(), returns a boolean array (True where valid)
+def valid_date_array(day, month, year):
+    d = np.asarray(day)
+    m = np.asarray(month)
+    y = np.asarray(year)
+    return (d >= 1) & (d < 32) & (m >= 1) & (m <= 12) & (y >= 1900)
+
+
+# Calculate Julian Dates given day, month, year arrays, NaN where calc_jd() raises (see valid_date_array())
+def calc_jd_array(day, month, year):
+    d = np.asarray(day, dtype=float)
+    m = np.asarray(month, dtype=int)
+    y = np.asarray(year, dtype=int)
+    valid = valid_date_array(d, m, y)
+
+    # adjustment for jan + feb
+    jan_feb = m <= 2
+    y = np.where(jan_feb, y - 1, y)
+    m = np.where(jan_feb, m + 12, m)
+
+    # calculate a+b in gregorian calendar
+    a = y // 100
+    b = 2 - a + a // 4
+
+    # int(365.25*x) and int(30.6001*x) in integer arithmetic
+    jd = (1461 * (y + 4716)) // 4 + (306001 * (m + 1)) // 10000 + d + b - 1524.5
+    return np.where(valid, jd, np.nan)
+
+
+# Calculate Julian Dates given an array of datetime64 times (UTC), NaN where calc_jd() raises
+def calc_jd_from_datetime64_array(times):
+    return calc_jd_array(*split_datetimes(times))
+
+
+# Check Julian Dates against the range of calc_date(), returns a boolean array (True where valid, False for NaN)
+def valid_jd_array(jd):
+    return np.asarray(jd, dtype=float) >= 0
+
+
+# Calculate calendar dates (and times) given an array of Julian Dates, like calc_date()
+# Returns day, month, year, hour, minute integer arrays, 0 in every array where calc_date() raises
+# (see valid_jd_array())
+def calc_date_array(jd):
+    jd = np.asarray(jd, dtype=float)
+    valid = valid_jd_array(jd)
+
+    # adjust jd and separate into int and decimal
+    jd2 = np.where(valid, jd, 0) + 0.5
+    z = np.floor(jd2).astype(np.int64)
+    f = jd2 - z
+
+    # calculate a depending on z (Gregorian from 15 October 1582), int((z - 1867216.25) / 36524.25) in integers
+    alpha = (4 * z - 7468865) // 146097
+    a = np.where(z >= 2299161, z + 1 + alpha - alpha // 4, z)
+
+    # calculate b-e, int((b - 122.1) / 365.25), int(365.25 * c), int((b - d) / 30.6001) in integers
+    b = a + 1524
+    c = (20 * b - 2442) // 7305
+    d = (1461 * c) // 4
+    e = (10000 * (b - d)) // 306001
+
+    # calculate day of month, month, year
+    day = (b - d - (306001 * e) // 10000) + f
+    month = np.where(e >= 14, e - 13, e - 1)
+    year = np.where(month <= 2, c - 4715, c - 4716)
+
+    # calculate time
+    hour = (day - np.floor(day)) * 24
+    minute = (hour - np.floor(hour)) * 60
+
+    fields = (day, month, year, hour, minute)
+    return tuple(np.where(valid, field, 0).astype(np.int64) for field in fields)
+
+
+# Calculate UTC datetime64 times (unit microseconds by default) given an array of Julian Dates, like calc_datetime()
+# NaT where the Julian Date is NaN
+def calc_datetime64_array(jd, unit='us'):
+    jd = np.asarray(jd, dtype=float)
+    valid = ~np.isnan(jd)
+
+    # whole days, whole seconds, and rounded microseconds, as timedelta(days=...) splits them
+    days = np.where(valid, jd - J2000, 0)
+    whole_days = np.trunc(days)
+    seconds = (days - whole_days) * 86400
+    whole_seconds = np.trunc(seconds)
+    microseconds = (whole_days.astype(np.int64) * 86400 + whole_seconds.astype(np.int64)) * 1000000 \
+        + np.round((seconds - whole_seconds) * 1000000).astype(np.int64)
+
+    times = np.datetime64('2000-01-01T12:00', 'us') + microseconds.astype('timedelta64[us]')
+    return np.where(valid, times, np.datetime64('NaT')).astype(f'datetime64[{unit}]')
+
+
+# Convert day, month, year arrays to floating-point years
+def calc_float_years_array(day, month, year):
+    return np.asarray(year) + (np.asarray(day) + MONTH_END_DAYS[np.asarray(month) - 1]) / 365.25
+
+
+# Get decimal moon phase k given day, month, year arrays
+def calc_moon_phase_array(day, month, year):
+    return (calc_float_years_array(day, month, year) - 2000) * 12.3685 - 0.25
+
+
+# Get string moon phases given an array of decimal moon phases k
+def str_phase_from_k_array(k):
+    k = np.asarray(k, dtype=float)
+    index = np.searchsorted(PHASE_BOUNDS, k - np.trunc(k), side='right')
+    return np.where(k >= 0, PHASE_NAMES[index], PHASE_NAMES_NEGATIVE[index])
+
+
+# Get string moon phases given arrays of Julian Dates and decimal moon phases k
+# Looks the dates up in the lunation index, k is only used outside of it (see str_phase_from_jd())
+def str_phase_from_jd_array(jd, k):
+    first, jdes = lunations.get_index()
+    events = np.frombuffer(jdes, dtype=float)
+    if len(events) < 2:
+        return str_phase_from_k_array(k)
+
+    i = np.searchsorted(events, jd, side='right') - 1
+    inside = (i >= 0) & (i + 1 < len(events))
+    i = np.clip(i, 0, len(events) - 2)
+    quarter = (first + i) % 4
+    phase = np.where(jd - events[i] < lunations.EVENT_WINDOW, EVENT_NAMES[quarter],
+                     np.where(events[i + 1] - jd <= lunations.EVENT_WINDOW, EVENT_NAMES[(quarter + 1) % 4],
+                              BETWEEN_NAMES[quarter]))
+    return np.where(inside, phase, str_phase_from_k_array(k))
+
+
+# Get the fractions of the lunation given arrays of Julian Dates and decimal moon phases k
+# Interpolated between the events of the lunation index like calc_fraction_from_jd(), k - trunc(k) outside of it
+def calc_fraction_from_jd_array(jd, k):
+    first, jdes = lunations.get_index()
+    events = np.frombuffer(jdes, dtype=float)
+    k = np.asarray(k, dtype=float)
+    if len(events) < 2:
+        return k - np.trunc(k)
+
+    i = np.searchsorted(events, jd, side='right') - 1
+    inside = (i >= 0) & (i + 1 < len(events))
+    i = np.clip(i, 0, len(events) - 2)
+    fraction = ((first + i) % 4 + (jd - events[i]) / (events[i + 1] - events[i])) / 4
+    return np.where(inside, fraction, k - np.trunc(k))
+
+
+# Get illumination fractions given an array of decimal moon phases k (or fractions of the lunation)
+def calc_illumination_from_k_array(k):
+    return 0.5 - np.cos(2 * np.pi * (k - np.trunc(k))) / 2
+
+
+# Get phase angles (degrees) given an array of decimal moon phases k (or fractions of the lunation), NaN where the
+# fraction is negative (k < 0)
+def calc_phase_angle_from_k_array(k):
+    with np.errstate(invalid='ignore'):
+        return np.degrees(np.arccos(2 * (k - np.trunc(k)) - 1))
+
+
+# Check for solar/lunar eclipses given day, month, year and Julian Date arrays, returns an array of strings
+# Uses the new and full moons of the lunation index, and check_eclipse_from_k_array() outside of it
+def check_eclipse_array(day, month, year, jd):
+    first, jdes = lunations.get_index()
+    events = np.frombuffer(jdes, dtype=float)
+    if len(events) < 2:
+        return check_eclipse_from_k_array(day, month, year)
+
+    # first event from the start of each day
+    i = np.searchsorted(events, jd, side='left')
+    inside = (i > 0) & (i < len(events))
+    i = np.clip(i, 0, len(events) - 1)
+    quarter = (first + i) % 4
+    syzygy = (events[i] < jd + 1) & (quarter % 2 == 0)
+
+    # distance between f and nearest multiple of 180
+    f = lunations.calc_f((first + i) / 4)
+    dist = np.abs(f - np.round(f / 180) * 180)
+    certain = syzygy & (dist < 13.9)
+    possible = syzygy & ~certain & ~((dist > 21) | (np.abs(np.sin(f * RD)) > 0.36))
+
+    eclipse_type = np.where(quarter == 0, "Solar", "Lunar").astype(object)
+    eclipse = np.where(certain, eclipse_type + " eclipse",
+                       np.where(possible, eclipse_type + " possible", "No eclipse"))
+    if inside.all():
+        return eclipse.astype(str)
+    return np.where(inside, eclipse, check_eclipse_from_k_array(day, month, year)).astype(str)
+
+
+# Check for lunar eclipses from the k estimate given day, month, year arrays, returns an array of
+# check_eclipse_from_k() strings
+# Evaluates all ten fractions of the day at once and keeps the first one that settles the result
+def check_eclipse_from_k_array(day, month, year):
+    offsets = np.arange(10) / 10
+    k = calc_moon_phase_array(np.add.outer(np.asarray(day, dtype=float), offsets),
+                              np.asarray(month)[..., None], np.asarray(year)[..., None])
+    frac = k - np.trunc(k)
+    lunar = (0.5 + 1 / 29.53059 > frac) & (frac > 0.5 - 1 / 29.5309)
+
+    # calculate t and f (Meeus Chapter 49)
+    t = k / 1236.85
+    f = 160.7108 + 390.67050284 * k - 0.0016118 * t**2 - 0.00000227 * t**3 + 0.000000011 * t**4
+
+    # distance between f and nearest multiple of 180
+    dist = f - np.trunc(f / 180) * 180
+    certain = lunar & (dist < 13.9)
+    possible = lunar & ~certain & ~((dist > 21) | (np.abs(np.sin(f * RD)) > 0.36))
+
+    result = np.where(certain, 1, np.where(possible, 2, 0))
+    first = np.argmax(result > 0, axis=-1)
+    return ECLIPSE_TYPES[np.take_along_axis(result, first[..., None], axis=-1)[..., 0]]
+
+
+# Calculate hour angles (degrees) given declination, altitude, and observer latitude arrays
+# NaN where the Moon never reaches the altitude (calc_ha() raises there)
+def calc_ha_array(dec, alt, lat):
+    cos_ha = (np.sin(np.radians(alt)) - np.sin(np.radians(dec)) * np.sin(np.radians(lat))) \
+             / (np.cos(np.radians(dec)) * np.cos(np.radians(lat)))
+    with np.errstate(invalid='ignore'):
+        return np.degrees(np.arccos(cos_ha))
+
+
+# Calculate Greenwich mean sidereal time (degrees) for an array of Julian Dates (Meeus Chapter 12)
+def calc_gmst_array(jd):
+    t = (jd - 2451545.0) / 36525
+    return np.mod(280.46061837 + 360.98564736629 * (jd - 2451545.0) + 0.000387933 * t**2 - t**3 / 38710000, 360)
+
+
+# Calculate the Moon's altitude, local hour angle, and declination (degrees) at Julian Dates jd for observers at
+# latitude and east longitude (degrees); all arguments broadcast together
+# The Moon's position only depends on jd, so it is computed at the shape of jd before broadcasting
+def calc_moon_altitude_array(jd, latitude, longitude, precision=DEFAULT_PRECISION):
+    ra, dec = calc_moon_pos_array(jd, precision=precision)
+    ha = (calc_gmst_array(jd) + longitude - ra) * RD
+    lat, dec = np.asarray(latitude) * RD, dec * RD
+    sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha)
+    return np.arcsin(np.clip(sin_alt, -1, 1)) / RD, ha / RD, np.broadcast_to(dec / RD, np.shape(sin_alt))
+
+
+# Calculate Moon rise and set times for the local dates starting at Julian Dates jd (0h, as from calc_jd())
+# at latitude in time zone gmt; jd, latitude, and gmt broadcast together
+# The observer is placed at the middle of the time zone (longitude 15 * gmt), as the form has no longitude
+# The Moon's altitude is sampled on a grid of samples times across the day in one call, the first horizon crossing
+# in each direction is bracketed between samples and refined with iterations Newton steps on the moving Moon
+# A set and rise closer together than the sample spacing (grazing the horizon near the poles) can be missed
+# precision is a tier of calc_moon_pos()
+# Returns (rise, set) arrays of local time in hours, NaN on days without that event (or at polar latitudes)
+def calc_rise_set_array(jd, latitude, gmt, samples=49, iterations=4, precision=DEFAULT_PRECISION):
+    jd, latitude, gmt = np.asarray(jd, dtype=float), np.asarray(latitude, dtype=float), np.asarray(gmt, dtype=float)
+    shape = np.broadcast_shapes(jd.shape, latitude.shape, gmt.shape)
+    longitude = 15 * gmt
+    hours = np.linspace(0, 24, samples)
+
+    # altitude above the rise altitude at every sample time, along the last axis
+    start = jd - gmt / 24
+    altitude = calc_moon_altitude_array(start[..., None] + hours / 24, latitude[..., None],
+                                        longitude[..., None], precision)[0] - MOON_RISE_ALTITUDE
+    altitude = np.broadcast_to(altitude, shape + (samples,))
+    start, latitude, longitude = (np.broadcast_to(a, shape) for a in (start, latitude, longitude))
+
+    events = []
+    for rising in (True, False):
+        # first sample interval in which the altitude crosses the horizon in this direction
+        above = altitude >= 0
+        crossing = (above[..., 1:] & ~above[..., :-1]) if rising else (above[..., :-1] & ~above[..., 1:])
+        found = crossing.any(axis=-1)
+        i = np.argmax(crossing, axis=-1)[..., None]
+
+        # linear interpolation inside the bracketing interval
+        before = np.take_along_axis(altitude, i, axis=-1)[..., 0]
+        after = np.take_along_axis(altitude, i + 1, axis=-1)[..., 0]
+        low, high = hours[i[..., 0]], hours[i[..., 0] + 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hour = low + (high - low) * before / (before - after)
+
+        # Newton steps on the moving Moon, kept inside the bracket (bisecting when a step leaves it)
+        # d(altitude)/d(hour) is taken over one minute, so the Moon's own motion is included
+        for _ in range(iterations):
+            alt = calc_moon_altitude_array(start + np.stack([hour, hour + 1 / 60]) / 24, latitude,
+                                           longitude, precision)[0] - MOON_RISE_ALTITUDE
+            below = alt[0] < 0
+            low = np.where(below == rising, hour, low)
+            high = np.where(below == rising, high, hour)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                hour = hour - alt[0] / (60 * (alt[1] - alt[0]))
+            hour = np.where((hour > low) & (hour < high), hour, (low + high) / 2)
+
+        events.append(np.where(found, hour, np.nan))
+
+    return events[0], events[1]
+
+
+# Calculate the phase results (which don't depend on the observer) for arrays of dates
+# Returns a dict of arrays keyed like the result.html context
+def calc_phase_data_array(day, month, year):
+    k = calc_moon_phase_array(day, month, year)
+    julian_date = calc_jd_array(day, month, year)
+    fraction = calc_fraction_from_jd_array(julian_date, k)
+
+    return {
+        "moon_phase": str_phase_from_jd_array(julian_date, k),
+        "illumination": calc_illumination_from_k_array(fraction),
+        "phase_angle": calc_phase_angle_from_k_array(fraction),
+        "julian_date": julian_date,
+        "eclipse": check_eclipse_array(day, month, year, julian_date),
+    }
+
+
+# Calculate everything on the results page for arrays of dates given latitude and time zone gmt
+# precision is a tier of calc_moon_pos(), returns a dict of arrays keyed like the result.html context
+def calc_moon_data_array(day, month, year, latitude, gmt, precision=DEFAULT_PRECISION):
+    data = calc_phase_data_array(day, month, year)
+    right_ascension, declination = calc_moon_pos_array(data["julian_date"], precision=precision)
+    rise_time, set_time = calc_rise_set_array(data["julian_date"], latitude, gmt, precision=precision)
+
+    data.update({
+        "right_ascension": right_ascension,
+        "declination": declination,
+        "hour_angle": calc_ha_array(declination, 0, latitude),
+        "rise_time": rise_time,
+        "set_time": set_time,
+    })
+    return data
@@ -0,0 +1,854 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from calculator.astro import draw_moon_img, draw_system_img, calc_moon_state, str_moon_phase, calc_illumination, \
+    calc_phase_angle, calc_jd, calc_moon_pos, calc_ha, check_eclipse, calc_system_angles, calc_date, calc_moon_phase, \
+    str_phase_from_k, check_eclipse_from_k, nutate, get_moon_img, get_system_img, calc_rise_set, PRECISION_TIERS
+from calculator import imgcache, lunations, moonkernel
+from calculator.svg import draw_moon_svg
+
+# Standalone performance checks for the calculator
+# Run with: python -m calculator.bench <check> [options]
+
+
+# Get resident set size of this process in MB
+def get_rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        # peak RSS (KB on Linux) where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+# Render count images across threads while sampling RSS, returns (rss at start, rss at end, max rss) in MB
+# Alternates Moon and system images with changing inputs so every render draws new patches
+def soak_render(count=100000, threads=4, warmup=200):
+    def render(n, offset):
+        for i in range(n):
+            j = offset + i
+            if j % 2:
+                draw_moon_img("Waxing Gibbous", 0.5 + (j % 50) / 100)
+            else:
+                draw_system_img(j % 628 / 100, (j * 7) % 628 / 100)
+
+    # let each thread build its renderer before the baseline
+    workers = [threading.Thread(target=render, args=(warmup, i * warmup)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    start = peak = get_rss()
+
+    per_thread = count // threads
+    workers = [threading.Thread(target=render, args=(per_thread, i * per_thread)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        time.sleep(0.5)
+        peak = max(peak, get_rss())
+    for worker in workers:
+        worker.join()
+
+    return start, get_rss(), peak
+
+
+# Time the numeric path of count /calc requests (everything but the image rendering), with the calls of
+# views.compute_calculation_data()
+# Returns seconds per request for the Moon position and hour angle and for the rise and set times, which don't
+# depend on k, and for the phase-dependent calls with each one recomputing k and with all of them sharing one
+# MoonState
+def time_numeric(count=10000, latitude=40.0, timezone=-5):
+    # dates from 2000 on, where every function in the path is defined
+    dates = [(1 + i % 28, 1 + i % 12, 2000 + i % 50) for i in range(count)]
+
+    def phase_calls(day, month, year, state):
+        str_moon_phase(day, month, year, state=state)
+        calc_illumination(day, month, year, state=state)
+        calc_phase_angle(day, month, year, state=state)
+        check_eclipse(day, month, year, state=state)
+        # the image cache keys need the phase, illumination, and system angles
+        str_moon_phase(day, month, year, state=state)
+        calc_illumination(day, month, year, state=state)
+        calc_system_angles(day, month, year, state=state)
+
+    begin = time.perf_counter()
+    for day, month, year in dates:
+        right_ascension, declination = moonkernel.calc_moon_pos(calc_jd(day, month, year))
+        try:
+            calc_ha(declination, 0, latitude)
+        except ValueError:
+            pass
+    position = (time.perf_counter() - begin) / count
+
+    begin = time.perf_counter()
+    for day, month, year in dates:
+        calc_rise_set(calc_jd(day, month, year), latitude, timezone, moon_pos=moonkernel.calc_moon_pos)
+    rise_set = (time.perf_counter() - begin) / count
+
+    begin = time.perf_counter()
+    for day, month, year in dates:
+        phase_calls(day, month, year, None)
+    separate = (time.perf_counter() - begin) / count
+
+    begin = time.perf_counter()
+    for day, month, year in dates:
+        phase_calls(day, month, year, calc_moon_state(day, month, year))
+    shared = (time.perf_counter() - begin) / count
+
+    return position, rise_set, separate, shared
+
+
+# Time the phase name lookups of every day of the lunation index's years (index and k estimate) and compare them
+# Returns (seconds per index lookup, seconds per k estimate, fraction of days whose phase name matches the k
+# estimate, fraction of days whose eclipse result matches the k estimate)
+def time_lunations():
+    dates = [(day, month, year) for year in range(lunations.FIRST_YEAR, lunations.LAST_YEAR + 1)
+             for month in range(1, 13) for day in range(1, 29)]
+    jds = [calc_jd(day, month, year) for day, month, year in dates]
+    ks = [calc_moon_phase(day, month, year) for day, month, year in dates]
+    lunations.get_index()
+
+    begin = time.perf_counter()
+    indexed = [lunations.str_phase_from_jd(jd) for jd in jds]
+    index_seconds = (time.perf_counter() - begin) / len(dates)
+    begin = time.perf_counter()
+    estimated = [str_phase_from_k(k) for k in ks]
+    estimate_seconds = (time.perf_counter() - begin) / len(dates)
+
+    phase_matches = sum(a == b for a, b in zip(indexed, estimated))
+    eclipse_matches = sum(lunations.check_eclipse_from_jd(jd) == check_eclipse_from_k(*date)
+                          for jd, date in zip(jds, dates))
+    return index_seconds, estimate_seconds, phase_matches / len(dates), eclipse_matches / len(dates)
+
+
+# Compute Moon rise and set times for a grid of days x latitudes starting on 1 January of year, and time the scalar
+# version of /calc on the kernel for the first scalar_days days
+# Returns (seconds taken, fraction of days x latitudes without a rise, largest altitude at the found times in degrees,
+# seconds per scalar rise/set pair)
+def time_rise_set(days=365, latitudes=180, year=2024, scalar_days=10):
+    import numpy as np
+    from calculator.astro_array import calc_jd_array, calc_rise_set_array, calc_moon_altitude_array, \
+        MOON_RISE_ALTITUDE
+
+    jd = calc_jd_array(1, 1, year) + np.arange(days)
+    latitude = np.linspace(-90, 90, latitudes + 2)[1:-1]
+    begin = time.perf_counter()
+    rise, set_time = calc_rise_set_array(jd[:, None], latitude, 0)
+    elapsed = time.perf_counter() - begin
+
+    # the altitude at every found time should be the rise altitude
+    residual = 0.0
+    for hours in (rise, set_time):
+        found = ~np.isnan(hours)
+        times = (jd[:, None] + hours / 24)[found]
+        alt = calc_moon_altitude_array(times, np.broadcast_to(latitude, hours.shape)[found], 0)[0]
+        residual = max(residual, float(np.abs(alt - MOON_RISE_ALTITUDE).max()))
+
+    pairs = [(day, lat) for day in jd[:scalar_days].tolist() for lat in latitude.tolist()]
+    begin = time.perf_counter()
+    for day, lat in pairs:
+        calc_rise_set(day, lat, 0, moon_pos=moonkernel.calc_moon_pos)
+    scalar = (time.perf_counter() - begin) / len(pairs)
+    return elapsed, float(np.isnan(rise).mean()), residual, scalar
+
+
+# Search 1900-2100 for eclipses
+# Returns (list of failures, number of eclipses found in 1900-2100, seconds taken by the search)
+def time_eclipses(budget=1.0):
+    from calculator.eclipses import find_eclipses
+
+    failures = []
+    begin = time.perf_counter()
+    eclipses = find_eclipses(calc_jd(1, 1, 1900), calc_jd(1, 1, 2101))
+    elapsed = time.perf_counter() - begin
+    if elapsed > budget:
+        failures.append(f"searching 1900-2100 took {elapsed:.3f} s (budget {budget} s)")
+    return failures, len(eclipses), elapsed
+
+
+# Time finding count full moons and count rising crossings of threshold illumination from 2000 on
+# Returns (seconds per full moon, seconds per crossing, illumination evaluations per crossing)
+def time_events(count=1000, threshold=0.9):
+    from calculator import events
+
+    start = calc_jd(1, 1, 2000)
+    begin = time.perf_counter()
+    events.find_events("full_moon", start, count)
+    phase_seconds = (time.perf_counter() - begin) / count
+
+    evaluations = 0
+    illuminated_fraction = events.calc_illuminated_fraction
+
+    def counted(jd):
+        nonlocal evaluations
+        evaluations += 1
+        return illuminated_fraction(jd)
+
+    events.calc_illuminated_fraction = counted
+    try:
+        begin = time.perf_counter()
+        events.find_events("illumination_above", start, count, threshold)
+        crossing_seconds = (time.perf_counter() - begin) / count
+    finally:
+        events.calc_illuminated_fraction = illuminated_fraction
+    return phase_seconds, crossing_seconds, evaluations / count
+
+
+# Time the array date conversions at count random inputs against calc_date()
+# Returns a dict of seconds per element of each array conversion and of calc_date()
+def time_dates(count=100000, seed=1):
+    import numpy as np
+    from calculator import astro_array
+
+    rng = np.random.default_rng(seed)
+    day = rng.uniform(0.5, 32.5, count)
+    month = rng.integers(0, 14, count)
+    year = rng.integers(1850, 2300, count)
+    begin = time.perf_counter()
+    astro_array.calc_jd_array(day, month, year)
+    jd_seconds = (time.perf_counter() - begin) / count
+
+    jd = rng.uniform(-10, 5e6, count)
+    begin = time.perf_counter()
+    astro_array.calc_date_array(jd)
+    date_seconds = (time.perf_counter() - begin) / count
+    jd_list = jd[:count // 10].tolist()
+    begin = time.perf_counter()
+    for value in jd_list:
+        calc_date(value)
+    scalar_seconds = (time.perf_counter() - begin) / len(jd_list)
+
+    times = np.datetime64('1900-01-01', 'us') + rng.integers(0, 400 * 365 * 86400 * 10**6, count).astype('m8[us]')
+    begin = time.perf_counter()
+    astro_array.calc_datetime64_array(astro_array.calc_jd_from_datetime64_array(times))
+    round_trip_seconds = (time.perf_counter() - begin) / count
+    return {"calc_jd_array": jd_seconds, "calc_date_array": date_seconds,
+            "datetime64 round trip": round_trip_seconds, "calc_date": scalar_seconds}
+
+
+# Time moonkernel.calc_moon_pos() against astro's at count random dates
+# Returns (list of failures, seconds per call of astro's, seconds per kernel call)
+def time_kernel(count=20000, min_speedup=5.0, seed=1):
+    import random
+
+    rng = random.Random(seed)
+    jds = [rng.uniform(calc_jd(1, 1, 1900), calc_jd(1, 1, 2100)) for _ in range(count)]
+
+    # best of three single-call loops
+    seconds = []
+    for func in (calc_moon_pos, moonkernel.calc_moon_pos):
+        best = math.inf
+        for _ in range(3):
+            begin = time.perf_counter()
+            for jd in jds:
+                func(jd)
+            best = min(best, (time.perf_counter() - begin) / count)
+        seconds.append(best)
+    failures = []
+    if seconds[0] / seconds[1] < min_speedup:
+        failures.append(f"kernel is only {seconds[0] / seconds[1]:.1f}x faster (at least {min_speedup:g}x expected)")
+    return failures, seconds[0], seconds[1]
+
+
+# Time every precision tier at count random dates of 1900-2100, through calc_moon_pos_array(), the kernel, and
+# astro's calc_moon_pos()
+# Returns a dict of (seconds per date of the array version, per call of the kernel, per call of astro's) by tier
+def time_precision(count=20000, seed=1):
+    import random
+    import numpy as np
+    from calculator import astro_array
+
+    rng = random.Random(seed)
+    jds = [rng.uniform(calc_jd(1, 1, 1900), calc_jd(1, 1, 2100)) for _ in range(count)]
+    jd = np.array(jds)
+    timings = {}
+    for precision in PRECISION_TIERS:
+        # best of three
+        seconds = []
+        for call in (lambda: astro_array.calc_moon_pos_array(jd, precision=precision),
+                     lambda: [moonkernel.calc_moon_pos(value, precision) for value in jds],
+                     lambda: [calc_moon_pos(value, precision) for value in jds]):
+            best = math.inf
+            for _ in range(3):
+                begin = time.perf_counter()
+                call()
+                best = min(best, (time.perf_counter() - begin) / count)
+            seconds.append(best)
+        timings[precision] = tuple(seconds)
+    return timings
+
+
+# Time the frame lookup of every 10th day of 1900-2100 against rendering the Moon image
+# Returns (seconds per lookup, seconds per SVG render)
+def time_sprites():
+    from calculator import sprites
+
+    states = []
+    for year in range(1900, 2100):
+        for month in range(1, 13):
+            for day in range(1, 29, 10):
+                states.append(calc_moon_state(day, month, year))
+
+    sprites.get_sprites()
+    begin = time.perf_counter()
+    for state in states:
+        sprites.get_frame_name(state.phase, state.illumination)
+    lookup_seconds = (time.perf_counter() - begin) / len(states)
+    begin = time.perf_counter()
+    for state in states[:1000]:
+        draw_moon_svg(state.phase, state.illumination)
+    render_seconds = (time.perf_counter() - begin) / 1000
+    return lookup_seconds, render_seconds
+
+
+# Time the lookups of the memory-mapped ephemeris at count random times within it
+# Returns a dict of seconds per call of the scalar lookups and per element of the array lookup
+def time_ephemeris(count=20000, seed=1):
+    import random
+    import numpy as np
+    from calculator.ephemeris import Ephemeris
+
+    table = Ephemeris()
+    rng = random.Random(seed)
+    jd_list = [rng.uniform(table.start + 1, table.end - 1) for _ in range(count)]
+    jd = np.array(jd_list)
+
+    begin = time.perf_counter()
+    for value in jd_list:
+        table.lookup(value)
+    scalar = (time.perf_counter() - begin) / count
+    begin = time.perf_counter()
+    table.lookup_array(jd)
+    array = (time.perf_counter() - begin) / count
+    begin = time.perf_counter()
+    for value in jd_list:
+        table.position(value)
+    position = (time.perf_counter() - begin) / count
+    begin = time.perf_counter()
+    for value in jd_list:
+        calc_moon_pos(value)
+    direct = (time.perf_counter() - begin) / count
+
+    return {"lookup": scalar, "position": position, "lookup_array": array, "calc_moon_pos": direct}
+
+
+# Time stepping a MoonStepper count times from start every step_minutes against calc_moon_pos()
+# Returns (seconds per step, seconds per direct evaluation)
+def time_stepper(count=100000, step_minutes=1, start=2460000.5):
+    from calculator.stepper import MoonStepper
+
+    stepper = MoonStepper(start, step_minutes / 1440)
+    begin = time.perf_counter()
+    positions = [position for _, position in zip(range(count), stepper)]
+    stepped = (time.perf_counter() - begin) / count
+
+    begin = time.perf_counter()
+    for jd, _, _ in positions[::97]:
+        calc_moon_pos(jd)
+    direct = (time.perf_counter() - begin) / len(positions[::97])
+    return stepped, direct
+
+
+# Get the value at fraction (0 to 1) of sorted values, nearest rank
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+# Time func over the argument tuples in inputs (cycled), one call at a time
+# Calls func until duration seconds have been timed or max_iterations calls (at least min_iterations), after
+# warmup untimed calls; setup (if given) runs before every call outside the timing. Allocations are traced in a
+# separate pass of alloc_iterations calls so tracemalloc doesn't slow the timed calls
+# Returns a dict of iterations, ops/sec, mean/p50/p99 latency (us), and mean bytes allocated (peak) and retained
+# per call
+def run_benchmark(func, inputs, duration=1.0, min_iterations=10, max_iterations=100000, warmup=10,
+                  alloc_iterations=100, setup=None):
+    def call(i):
+        args = inputs[i % len(inputs)]
+        if setup is not None:
+            setup()
+        return args
+
+    for i in range(warmup):
+        func(*call(i))
+
+    timings = []
+    elapsed = 0.0
+    while len(timings) < max_iterations and (elapsed < duration or len(timings) < min_iterations):
+        args = call(len(timings))
+        begin = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - begin)
+        elapsed += timings[-1]
+
+    allocated = retained = 0
+    tracemalloc.start()
+    try:
+        for i in range(alloc_iterations):
+            args = call(i)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(*args)
+            current, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+            retained += current - before
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "ops_per_sec": len(timings) / elapsed,
+        "mean_us": elapsed / len(timings) * 1e6,
+        "p50_us": percentile(timings, 0.5) * 1e6,
+        "p99_us": percentile(timings, 0.99) * 1e6,
+        "alloc_bytes": allocated / max(alloc_iterations, 1),
+        "retained_bytes": retained / max(alloc_iterations, 1),
+    }
+
+
+# Configure Django for the view benchmarks when run outside manage.py
+# Uses DJANGO_SETTINGS_MODULE if it is set, otherwise minimal settings with just the calculator app
+def setup_django():
+    import django
+    from django.conf import settings
+
+    if not settings.configured and "DJANGO_SETTINGS_MODULE" not in os.environ:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        settings.configure(
+            SECRET_KEY="calculator-bench",
+            INSTALLED_APPS=["calculator"],
+            ROOT_URLCONF="calculator.urls",
+            TEMPLATES=[{"BACKEND": "django.template.backends.django.DjangoTemplates",
+                        "DIRS": [os.path.join(root, "public")]}],
+        )
+    django.setup()
+
+
+# Get the benchmark cases as a list of (name, function, list of argument tuples, setup or None, warmup calls)
+# Dates run from 2000 on, where every function in the path is defined. The images are timed both rendered
+# (calculator.astro) and through the warmed image cache, the calculation view both with and without a cached page
+def benchmark_cases(count=1000, latitude=40.0, timezone=-5):
+    from django.core.cache import caches
+    from django.test import Client
+
+    dates = [(1 + i % 28, 1 + i % 12, 2000 + i % 50) for i in range(count)]
+    jds = [(calc_jd(day, month, year),) for day, month, year in dates]
+    client = Client()
+    queries = [{"day": day, "month": month, "year": year, "latitude": f"{latitude:g}", "timezone": f"{timezone:g}"}
+               for day, month, year in dates]
+
+    # every request must render the page, so the calculation cache is emptied before each one
+    def clear_calc_cache():
+        caches["default"].clear()
+
+    def calculation(query):
+        response = client.get("/calc", query)
+        if response.status_code != 200:
+            raise RuntimeError(f"/calc returned {response.status_code} for {query}")
+
+    return [
+        ("calc_jd", calc_jd, dates, None, 10),
+        ("calc_date", calc_date, jds, None, 10),
+        ("nutate", nutate, jds, None, 10),
+        ("calc_moon_pos", calc_moon_pos, jds, None, 10),
+        ("moonkernel.calc_moon_pos", moonkernel.calc_moon_pos, jds, None, 10),
+        ("check_eclipse", check_eclipse, dates, None, 10),
+        ("get_moon_img", get_moon_img, dates, None, 10),
+        ("get_system_img", get_system_img, dates, None, 10),
+        ("imgcache.get_moon_img", imgcache.get_moon_img, dates, None, count),
+        ("imgcache.get_system_img", imgcache.get_system_img, dates, None, count),
+        ("views.calculation", calculation, [(query,) for query in queries], clear_calc_cache, 10),
+        ("views.calculation cached", calculation, [(queries[0],)], None, 10),
+    ]
+
+
+# Run the benchmark cases whose names contain one of names (all if names is empty)
+# The views run against a private local-memory cache and the test client's host, so the project's cache and
+# ALLOWED_HOSTS are left alone. Returns a JSON-serializable dict of the environment and results by case name
+def run_suite(names=(), duration=1.0, alloc_iterations=100, log=print):
+    from django.test.utils import override_settings
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=["testserver"], MOON_CALC_CACHE="default",
+                           CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                               "LOCATION": "calculator-bench"}}):
+        for name, func, inputs, setup, warmup in benchmark_cases():
+            if names and not any(pattern in name for pattern in names):
+                continue
+            results[name] = run_benchmark(func, inputs, duration=duration, warmup=warmup,
+                                          alloc_iterations=alloc_iterations, setup=setup)
+            log(format_result(name, results[name]))
+
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = ""
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "image_backend": imgcache.backend,
+        "results": results,
+    }
+
+
+# Format one benchmark result as a table row
+def format_result(name, result):
+    return f"{name:26} {result['ops_per_sec']:12.1f} ops/s  p50 {result['p50_us']:10.1f} us  " \
+           f"p99 {result['p99_us']:10.1f} us  alloc {result['alloc_bytes'] / 1024:9.1f} KiB  " \
+           f"retained {result['retained_bytes'] / 1024:7.1f} KiB"
+
+
+# Compare suite results with baseline results (both as returned by run_suite())
+# Returns a list of failures for cases whose p50 latency grew by more than max_slowdown times
+def compare_suite(results, baseline, max_slowdown=1.25):
+    failures = []
+    for name, result in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is not None and result["p50_us"] > previous["p50_us"] * max_slowdown:
+            failures.append(f"{name} p50 {result['p50_us']:.1f} us, was {previous['p50_us']:.1f} us "
+                            f"({result['p50_us'] / previous['p50_us']:.2f}x)")
+    return failures
+
+
+# Run the suite, save the results as JSON to output and compare them with the JSON results in baseline
+# (either may be None), returns a list of failures
+def benchmark_suite(names=(), duration=1.0, alloc_iterations=100, output=None, baseline=None, max_slowdown=1.25,
+                    log=print):
+    results = run_suite(names, duration, alloc_iterations, log)
+    if output is not None:
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        log(f"saved results to {output}")
+    if baseline is None:
+        return []
+    with open(baseline) as baseline_file:
+        return compare_suite(results, json.load(baseline_file), max_slowdown)
+
+
+# Send a GET request for path?query straight to ASGI application app, returns the response status
+async def asgi_get(app, path, query=""):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+    }
+    body = [{"type": "http.request", "body": b"", "more_body": False}]
+    status = []
+
+    async def receive():
+        if body:
+            return body.pop()
+        # the client stays connected until the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+# Run mixed traffic through Django's ASGI handler for duration seconds with /calc served by view
+# calc_clients keep requesting /calc for new dates (uncached pages and images), page_clients keep requesting the
+# static index page. Returns a dict of sorted latencies (seconds) by "calc" and "page", and the number of 503s
+def run_mixed_load(view, duration=10.0, calc_clients=8, page_clients=8):
+    import random
+    from types import ModuleType
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test.utils import override_settings
+    from django.urls import path
+    from calculator import urls, views
+
+    # the calculator's URLs with /calc served by view, and no calculation cache so every page is computed
+    urlconf = ModuleType("calculator.bench.urls")
+    urlconf.urlpatterns = [path("calc", view, name="calc")] + [pattern for pattern in urls.urlpatterns
+                                                                 if pattern.name != "calc"]
+    latencies = {"calc": [], "page": []}
+    overloaded = 0
+    rng = random.Random(1)
+
+    async def client(kind):
+        nonlocal overloaded
+        while time.perf_counter() < end:
+            if kind == "calc":
+                day = round(1 + rng.random() * 27, views.CALC_DAY_DECIMALS)
+                query = f"day={views.format_number(day)}&month={rng.randint(1, 12)}&year={rng.randint(2000, 2099)}" \
+                        f"&latitude=40&timezone=-5"
+                begin = time.perf_counter()
+                status = await asgi_get(app, "/calc", query)
+            else:
+                begin = time.perf_counter()
+                status = await asgi_get(app, "/")
+            if status == 503:
+                overloaded += 1
+                await asyncio.sleep(views.CALC_RETRY_AFTER / 100)
+                continue
+            if status != 200:
+                raise RuntimeError(f"{kind} request returned {status}")
+            latencies[kind].append(time.perf_counter() - begin)
+
+    async def run():
+        await asyncio.gather(*([client("calc") for _ in range(calc_clients)] +
+                               [client("page") for _ in range(page_clients)]))
+
+    with override_settings(ROOT_URLCONF=urlconf, ALLOWED_HOSTS=["testserver"],
+                           CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+        app = ASGIHandler()
+        imgcache.configure(imgcache.moon_cache.size, imgcache.step, imgcache.backend)
+        end = time.perf_counter() + duration
+        # the 503s are expected, don't log every one
+        logging.disable(logging.ERROR)
+        try:
+            asyncio.run(run())
+        finally:
+            logging.disable(logging.NOTSET)
+    return {kind: sorted(values) for kind, values in latencies.items()}, overloaded
+
+
+# Compare the sync and async /calc views under the same mixed traffic
+# Returns a list of (view name, latencies by kind, number of 503s)
+def compare_mixed_load(duration=10.0, calc_clients=8, page_clients=8):
+    from calculator import renderpool, views
+
+    renderpool.prewarm()
+    results = []
+    for name, view in (("sync", views.calculation), ("async", views.calculation_async)):
+        latencies, overloaded = run_mixed_load(view, duration, calc_clients, page_clients)
+        results.append((name, latencies, overloaded))
+    renderpool.shutdown()
+    return results
+
+
+# Import module in a fresh interpreter with -X importtime
+# Returns (cumulative import time of module in ms, set of top-level packages loaded by the import)
+def measure_import(module):
+    probe = f"import sys; before = set(sys.modules); import {module}; " \
+            f"print(' '.join({{name.split('.')[0] for name in set(sys.modules) - before}}))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S+)$", line)
+        if match and match.group(2) == module:
+            cumulative = int(match.group(1))
+    return cumulative / 1000, set(result.stdout.split())
+
+
+# Check the cold import cost of the numeric core and the views, returns a list of failures
+# The numeric core must import with only the stdlib, the views must not load the plotting or array libraries
+def check_imports(budget_ms=50.0, repeat=5):
+    failures = []
+    for module, allowed in (("calculator.astro", {"calculator"}), ("calculator.views", None)):
+        runs = [measure_import(module) for _ in range(repeat)]
+        best = min(ms for ms, _ in runs)
+        loaded = set.union(*(packages for _, packages in runs))
+        print(f"{module}: {best:.1f} ms (best of {repeat})")
+
+        if allowed is not None:
+            extra = loaded - set(sys.stdlib_module_names) - allowed
+            if extra:
+                failures.append(f"{module} imports non-stdlib packages: {', '.join(sorted(extra))}")
+            if best > budget_ms:
+                failures.append(f"{module} took {best:.1f} ms to import (budget {budget_ms} ms)")
+        heavy = loaded & {"matplotlib", "numpy"}
+        if heavy:
+            failures.append(f"{module} imports {', '.join(sorted(heavy))}")
+    return failures
+
+
+# Add the options of the benchmark suite to parser (shared with the benchmark management command)
+def add_suite_arguments(parser):
+    parser.add_argument("--case", action="append", default=[],
+                        help="only run cases whose name contains this (repeatable)")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds of timed calls per case")
+    parser.add_argument("--alloc-iterations", type=int, default=100, help="calls traced for allocations per case")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--max-slowdown", type=float, default=1.25,
+                        help="allowed p50 latency growth against the baseline")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calculator.bench")
+    checks = parser.add_subparsers(dest="check", required=True)
+
+    soak = checks.add_parser("soak", help="time rendering many images on threads and report RSS")
+    soak.add_argument("--count", type=int, default=100000)
+    soak.add_argument("--threads", type=int, default=4)
+
+    imports = checks.add_parser("imports", help="check the cold import cost of the numeric core and the views")
+    imports.add_argument("--budget-ms", type=float, default=50.0, help="import time budget of calculator.astro")
+    imports.add_argument("--repeat", type=int, default=5)
+
+    numeric = checks.add_parser("numeric", help="time the numeric path of a /calc request")
+    numeric.add_argument("--count", type=int, default=10000)
+
+    riseset = checks.add_parser("riseset", help="time Moon rise and set times for a grid of days x latitudes")
+    riseset.add_argument("--days", type=int, default=365)
+    riseset.add_argument("--latitudes", type=int, default=180)
+
+    ephemeris = checks.add_parser("ephemeris", help="time the ephemeris table lookups against the direct series")
+    ephemeris.add_argument("--count", type=int, default=20000)
+
+    stepper = checks.add_parser("stepper", help="time the incremental Moon stepper against the direct series")
+    stepper.add_argument("--count", type=int, default=100000)
+    stepper.add_argument("--step-minutes", type=float, default=1)
+
+    eclipses = checks.add_parser("eclipses", help="time the eclipse search over 1900-2100")
+    eclipses.add_argument("--budget", type=float, default=1.0, help="seconds allowed for the search")
+
+    events = checks.add_parser("events", help="time the next full moon and illumination searches")
+    events.add_argument("--count", type=int, default=1000)
+
+    dates = checks.add_parser("dates", help="time the array date conversions")
+    dates.add_argument("--count", type=int, default=100000)
+
+    kernel = checks.add_parser("kernel", help="time the generated calc_moon_pos() kernel against astro's")
+    kernel.add_argument("--count", type=int, default=20000)
+    kernel.add_argument("--min-speedup", type=float, default=5.0)
+
+    precision = checks.add_parser("precision", help="time the precision tiers")
+    precision.add_argument("--count", type=int, default=20000)
+
+    checks.add_parser("sprites", help="time the pre-rendered Moon image lookup against rendering")
+
+    checks.add_parser("lunations", help="time the lunation index lookups and compare them with the k estimate")
+
+    mixedload = checks.add_parser("mixedload", help="compare the sync and async /calc views under mixed traffic")
+    mixedload.add_argument("--duration", type=float, default=10.0, help="seconds of traffic per view")
+    mixedload.add_argument("--calc-clients", type=int, default=8)
+    mixedload.add_argument("--page-clients", type=int, default=8)
+
+    suite = checks.add_parser("suite", help="benchmark the astro hot paths, the images, and the calculation view")
+    add_suite_arguments(suite)
+
+    args = parser.parse_args(argv)
+
+    if args.check == "soak":
+        begin = time.perf_counter()
+        start, end, peak = soak_render(args.count, args.threads)
+        elapsed = time.perf_counter() - begin
+        print(f"rendered {args.count} images on {args.threads} threads in {elapsed:.1f} s "
+              f"({args.count / elapsed:.0f} images/s)")
+        print(f"RSS start {start:.1f} MB, end {end:.1f} MB, peak {peak:.1f} MB")
+
+    if args.check == "numeric":
+        position, rise_set, separate, shared = time_numeric(args.count)
+        print(f"position and hour angle:           {position * 1e6:.1f} us per request")
+        print(f"rise and set times:                {rise_set * 1e6:.1f} us per request")
+        print(f"phase calls recomputing k:         {separate * 1e6:.1f} us per request")
+        print(f"phase calls sharing one MoonState: {shared * 1e6:.1f} us per request ({separate / shared:.1f}x)")
+        print(f"numeric path: {(position + rise_set + separate) * 1e6:.1f} us -> "
+              f"{(position + rise_set + shared) * 1e6:.1f} us per request")
+
+    if args.check == "riseset":
+        elapsed, no_rise, residual, scalar = time_rise_set(args.days, args.latitudes)
+        print(f"{args.days} days x {args.latitudes} latitudes in {elapsed:.2f} s "
+              f"({elapsed / (args.days * args.latitudes) * 1e6:.1f} us per rise/set pair)")
+        print(f"scalar calc_rise_set() on the kernel: {scalar * 1e6:.1f} us per rise/set pair")
+        print(f"no rise on {no_rise:.1%} of them, largest altitude error at the found times {residual:.2g} degrees")
+
+    if args.check == "ephemeris":
+        for name, seconds in time_ephemeris(args.count).items():
+            print(f"{name:13} {seconds * 1e6:.3f} us per call")
+
+    if args.check == "stepper":
+        stepped, direct = time_stepper(args.count, args.step_minutes)
+        print(f"{args.count} steps of {args.step_minutes:g} min: {stepped * 1e6:.2f} us per step, "
+              f"{direct * 1e6:.2f} us per direct evaluation ({direct / stepped:.1f}x)")
+
+    if args.check == "eclipses":
+        failures, count, elapsed = time_eclipses(args.budget)
+        print(f"found {count} eclipses in 1900-2100 in {elapsed * 1000:.1f} ms")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            return 1
+        print("OK")
+
+    if args.check == "events":
+        phase_seconds, crossing_seconds, evaluations = time_events(args.count)
+        print(f"full moons:              {phase_seconds * 1e6:.1f} us per event")
+        print(f"illumination crossings:  {crossing_seconds * 1e6:.1f} us per event, "
+              f"{evaluations:.1f} evaluations per event")
+
+    if args.check == "dates":
+        for name, seconds in time_dates(args.count).items():
+            print(f"{name:22} {seconds * 1e9:8.1f} ns per date")
+
+    if args.check == "kernel":
+        failures, reference, kernel_seconds = time_kernel(args.count, args.min_speedup)
+        print(f"astro.calc_moon_pos:      {reference * 1e6:.2f} us per call")
+        print(f"moonkernel.calc_moon_pos: {kernel_seconds * 1e6:.2f} us per call ({reference / kernel_seconds:.1f}x)")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            return 1
+        print("OK")
+
+    if args.check == "precision":
+        for name, (array_seconds, kernel_seconds, scalar_seconds) in time_precision(args.count).items():
+            print(f"{name:8} array {array_seconds * 1e9:6.1f} ns, kernel {kernel_seconds * 1e6:5.2f} us, "
+                  f"astro {scalar_seconds * 1e6:5.2f} us per date")
+
+    if args.check == "sprites":
+        lookup_seconds, render_seconds = time_sprites()
+        print(f"frame lookup {lookup_seconds * 1e6:.2f} us, SVG render {render_seconds * 1e6:.2f} us per image")
+
+    if args.check == "lunations":
+        index_seconds, estimate_seconds, phase_agreement, eclipse_agreement = time_lunations()
+        print(f"phase name from the index:  {index_seconds * 1e6:.2f} us per date")
+        print(f"phase name from k:          {estimate_seconds * 1e6:.2f} us per date")
+        print(f"phase names matching the k estimate:     {phase_agreement:.1%} of days")
+        print(f"eclipse results matching the k estimate: {eclipse_agreement:.1%} of days")
+
+    if args.check == "suite":
+        setup_django()
+        failures = benchmark_suite(args.case, args.duration, args.alloc_iterations, args.output, args.baseline,
+                                   args.max_slowdown)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            return 1
+        if args.baseline is not None:
+            print("OK")
+
+    if args.check == "mixedload":
+        setup_django()
+        for name, latencies, overloaded in compare_mixed_load(args.duration, args.calc_clients, args.page_clients):
+            for kind, values in latencies.items():
+                if values:
+                    print(f"{name:5} {kind:4} {len(values) / args.duration:8.1f} req/s  "
+                          f"p50 {percentile(values, 0.5) * 1000:8.1f} ms  "
+                          f"p99 {percentile(values, 0.99) * 1000:8.1f} ms")
+            print(f"{name:5} 503s {overloaded}")
+
+    if args.check == "imports":
+        failures = check_imports(args.budget_ms, args.repeat)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            return 1
+        print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
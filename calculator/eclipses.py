@@ -0,0 +1,117 @@
+import math
+from calculator.lunations import calc_arguments, calc_mean_phase
+
+# Solar and lunar eclipse search (Meeus Chapter 54)
+# Walks the new moons (integer k) and full moons (k + 0.5) between two dates. Most are rejected by the argument of
+# latitude F alone (the Moon is too far from a node when |sin F| > 0.36); only the rest get the time of maximum
+# eclipse, gamma (least distance of the shadow axis from Earth's centre, in Earth radii), and the magnitude
+
+# largest |sin F| at which an eclipse is possible
+SIN_F_LIMIT = 0.36
+
+# types of eclipses by kind
+SOLAR_TYPES = ("total", "annular", "hybrid", "partial")
+LUNAR_TYPES = ("total", "partial", "penumbral")
+
+
+# One eclipse found by find_eclipses()
+# kind is "solar" or "lunar", eclipse_type one of SOLAR_TYPES or LUNAR_TYPES, jde the time of maximum eclipse
+# magnitude is the solar magnitude of partial eclipses (None for central ones), or the umbral magnitude of lunar
+# eclipses (the penumbral one for penumbral eclipses); central tells solar eclipses whose axis meets Earth
+class Eclipse:
+    __slots__ = ("k", "kind", "eclipse_type", "jde", "gamma", "magnitude", "central")
+
+    def __init__(self, k, kind, eclipse_type, jde, gamma, magnitude, central):
+        self.k = k
+        self.kind = kind
+        self.eclipse_type = eclipse_type
+        self.jde = jde
+        self.gamma = gamma
+        self.magnitude = magnitude
+        self.central = central
+
+    def __repr__(self):
+        return f"Eclipse({self.kind} {self.eclipse_type}, jde={self.jde:.4f}, gamma={self.gamma:.4f})"
+
+
+# Calculate the eclipse at syzygy k (integer: new moon, + 0.5: full moon), returns Eclipse or None
+def calc_eclipse(k):
+    e, m, mprime, f, omega = calc_arguments(k)
+    if abs(math.sin(f)) > SIN_F_LIMIT:
+        return None
+    solar = k == math.floor(k)
+    t = k / 1236.85
+
+    # time of maximum eclipse
+    f1 = f - math.radians(0.02665) * math.sin(omega)
+    a1 = math.radians(299.77 + 0.107408 * k - 0.009173 * t**2)
+    if solar:
+        jde = calc_mean_phase(k) - 0.4075 * math.sin(mprime) + 0.1721 * e * math.sin(m)
+    else:
+        jde = calc_mean_phase(k) - 0.4065 * math.sin(mprime) + 0.1727 * e * math.sin(m)
+    jde += 0.0161 * math.sin(2 * mprime) - 0.0097 * math.sin(2 * f1) + 0.0073 * e * math.sin(mprime - m) \
+        - 0.0050 * e * math.sin(mprime + m) - 0.0023 * math.sin(mprime - 2 * f1) + 0.0021 * e * math.sin(2 * m) \
+        + 0.0012 * math.sin(mprime + 2 * f1) + 0.0006 * e * math.sin(2 * mprime + m) - 0.0004 * math.sin(3 * mprime) \
+        - 0.0003 * e * math.sin(m + 2 * f1) + 0.0003 * math.sin(a1) - 0.0002 * e * math.sin(m - 2 * f1) \
+        - 0.0002 * e * math.sin(2 * mprime - m) - 0.0002 * math.sin(omega)
+
+    # gamma, and u, the radius of the umbral cone in the fundamental plane
+    p = 0.2070 * e * math.sin(m) + 0.0024 * e * math.sin(2 * m) - 0.0392 * math.sin(mprime) \
+        + 0.0116 * math.sin(2 * mprime) - 0.0073 * e * math.sin(mprime + m) + 0.0067 * e * math.sin(mprime - m) \
+        + 0.0118 * math.sin(2 * f1)
+    q = 5.2207 - 0.0048 * e * math.cos(m) + 0.0020 * e * math.cos(2 * m) - 0.3299 * math.cos(mprime) \
+        - 0.0060 * e * math.cos(mprime + m) + 0.0041 * e * math.cos(mprime - m)
+    gamma = (p * math.cos(f1) + q * math.sin(f1)) * (1 - 0.0048 * abs(math.cos(f1)))
+    u = 0.0059 + 0.0046 * e * math.cos(m) - 0.0182 * math.cos(mprime) + 0.0004 * math.cos(2 * mprime) \
+        - 0.0005 * math.cos(m + mprime)
+
+    if solar:
+        return calc_solar_type(k, jde, gamma, u)
+    return calc_lunar_type(k, jde, gamma, u)
+
+
+# Classify a solar eclipse from gamma and u, returns Eclipse or None
+def calc_solar_type(k, jde, gamma, u):
+    if abs(gamma) > 1.5433 + u:
+        return None
+
+    # central eclipses: total, annular, or annular-total (hybrid) when u is small
+    if abs(gamma) < 0.9972:
+        if u < 0:
+            eclipse_type = "total"
+        elif u > 0.0047 or u >= 0.00464 * math.sqrt(1 - gamma**2):
+            eclipse_type = "annular"
+        else:
+            eclipse_type = "hybrid"
+        return Eclipse(k, "solar", eclipse_type, jde, gamma, None, True)
+
+    # non-central total or annular eclipses, where the shadow axis misses Earth but the umbra touches it
+    if abs(gamma) < 0.9972 + abs(u):
+        return Eclipse(k, "solar", "total" if u < 0 else "annular", jde, gamma, None, False)
+    magnitude = (1.5433 + u - abs(gamma)) / (0.5461 + 2 * u)
+    return Eclipse(k, "solar", "partial", jde, gamma, magnitude, False)
+
+
+# Classify a lunar eclipse from gamma and u, returns Eclipse or None
+def calc_lunar_type(k, jde, gamma, u):
+    penumbral = (1.5573 + u - abs(gamma)) / 0.5450
+    if penumbral < 0:
+        return None
+    umbral = (1.0128 - u - abs(gamma)) / 0.5450
+    if umbral < 0:
+        return Eclipse(k, "lunar", "penumbral", jde, gamma, penumbral, False)
+    return Eclipse(k, "lunar", "total" if umbral >= 1 else "partial", jde, gamma, umbral, False)
+
+
+# Find every solar and lunar eclipse with maximum between Julian Dates start and end, returns a list of Eclipse
+# in order (JDE is dynamical time, within a minute or two of UT in 1900-2100)
+def find_eclipses(start, end):
+    # the mean phase runs at most about 0.6 days from the JDE of the eclipse
+    first = math.floor((start - 1 - calc_mean_phase(0)) / 29.530588861 * 2)
+    last = math.ceil((end + 1 - calc_mean_phase(0)) / 29.530588861 * 2)
+    eclipses = []
+    for half in range(first, last + 1):
+        eclipse = calc_eclipse(half / 2)
+        if eclipse is not None and start <= eclipse.jde < end:
+            eclipses.append(eclipse)
+    return eclipses
@@ -0,0 +1,197 @@
+import math
+import mmap
+import os
+import struct
+
+# Precomputed Moon ephemeris, read through mmap
+# The table samples the Moon's position and phase on a fixed grid (every 15 minutes by default) and stores each
+# quantity as its own contiguous column (struct of arrays), so every worker maps the same file pages instead of
+# holding a copy
+# Positions are interpolated with cubic Hermite splines whose tangents are central differences (Catmull-Rom)
+
+# table file: header (magic, version, column count, sample count, first Julian Date, step in days), padded to
+# HEADER_SIZE bytes, then one little-endian column per entry of COLUMNS, each padded to a multiple of 8 bytes
+EPHEMERIS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ephemeris.bin")
+EPHEMERIS_MAGIC = b"EPHM"
+EPHEMERIS_VERSION = 1
+HEADER = struct.Struct("<4sHHQdd")
+HEADER_SIZE = 64
+
+# column name, struct/array type code
+# ra is unwrapped (continuous past 360 degrees), k is the decimal moon phase of calc_moon_phase()
+COLUMNS = (
+    ("ra", "d"),
+    ("dec", "d"),
+    ("distance", "f"),
+    ("illumination", "f"),
+    ("k", "d"),
+)
+
+# default grid
+# the positions have a term of 8 degrees with a period of about 7 hours (dot_product() sums the Meeus tables into
+# one argument), so the spline needs samples every 15 minutes to stay within 0.001 degrees
+FIRST_YEAR = 1900
+LAST_YEAR = 2100
+STEP_MINUTES = 15
+
+# calc_moon_phase() grows linearly at this rate (lunations per day) within each month
+K_RATE = 12.3685 / 365.25
+
+
+# Get the byte offset and length of each column given the sample count
+def column_layout(count):
+    layout = {}
+    offset = HEADER_SIZE
+    for name, code in COLUMNS:
+        length = count * struct.calcsize(code)
+        layout[name] = offset, length
+        offset += (length + 7) // 8 * 8
+    return layout
+
+
+# Calculate the table columns for the grid of samples every step_minutes covering first_year through last_year
+# Uses the array versions of calc_moon_pos(), nutate(), and the phase functions, returns (first jd, step, columns)
+# One sample of margin is added before the first and two after the last day for the interpolation
+def build_columns(first_year=FIRST_YEAR, last_year=LAST_YEAR, step_minutes=STEP_MINUTES):
+    import numpy as np
+    from calculator import astro_array
+
+    if step_minutes <= 0 or 24 * 60 % step_minutes:
+        raise ValueError("Step must divide a day into whole minutes")
+
+    start = np.datetime64(f"{first_year:04d}-01-01T00:00", 'm') - step_minutes
+    end = np.datetime64(f"{last_year + 1:04d}-01-01T00:00", 'm') + 2 * step_minutes
+    times = np.arange(start, end, step_minutes)
+
+    # days (with the time of day as a fraction) and months and years of every sample
+    day, month, year = astro_array.split_datetimes(times)
+
+    jd = astro_array.calc_jd_array(day, month, year)
+    ra, dec = astro_array.calc_moon_pos_array(jd)
+    k = astro_array.calc_moon_phase_array(day, month, year)
+    columns = {
+        "ra": np.rad2deg(np.unwrap(np.deg2rad(ra))),
+        "dec": dec,
+        "distance": astro_array.calc_moon_distance_array(jd),
+        "illumination": astro_array.calc_illumination_from_k_array(k),
+        "k": k,
+    }
+    return float(jd[0]), step_minutes / (24 * 60), columns
+
+
+# Write table columns to path
+def write_table(first_jd, step, columns, path=EPHEMERIS_PATH):
+    import numpy as np
+
+    count = len(columns["k"])
+    layout = column_layout(count)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as table_file:
+        table_file.write(HEADER.pack(EPHEMERIS_MAGIC, EPHEMERIS_VERSION, len(COLUMNS), count, first_jd, step)
+                         .ljust(HEADER_SIZE, b"\0"))
+        for name, code in COLUMNS:
+            offset, length = layout[name]
+            table_file.seek(offset)
+            table_file.write(np.asarray(columns[name], dtype="<" + code).tobytes())
+        table_file.truncate(max(offset + length for offset, length in layout.values()))
+
+
+# Memory-mapped ephemeris table
+class Ephemeris:
+    def __init__(self, path=EPHEMERIS_PATH):
+        with open(path, "rb") as table_file:
+            self.map = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, column_count, self.count, self.first_jd, self.step = HEADER.unpack_from(self.map)
+        if magic != EPHEMERIS_MAGIC or version != EPHEMERIS_VERSION or column_count != len(COLUMNS):
+            raise ValueError(f"{path} is not a version {EPHEMERIS_VERSION} ephemeris table")
+        layout = column_layout(self.count)
+        if len(self.map) < max(offset + length for offset, length in layout.values()):
+            raise ValueError(f"{path} is truncated")
+
+        # typed views of the mapped columns (no copies); the file is little-endian like the hosts we deploy on
+        view = memoryview(self.map)
+        self.columns = {name: view[layout[name][0]:sum(layout[name])].cast(code) for name, code in COLUMNS}
+        self.ra, self.dec, self.distance, self.k = (self.columns[name] for name in ("ra", "dec", "distance", "k"))
+
+        # Julian Dates that can be interpolated (one sample is needed on either side of the interval)
+        self.start = self.first_jd + self.step
+        self.end = self.first_jd + (self.count - 2) * self.step
+
+    # Get (sample index, fraction of the step) of Julian Date jd
+    def locate(self, jd):
+        if not self.start <= jd < self.end:
+            raise ValueError(f"Julian Date {jd} is outside the ephemeris ({self.start} to {self.end})")
+        position = (jd - self.first_jd) / self.step
+        i = int(position)
+        return i, position - i
+
+    # Interpolate column (a typed view) at sample i + u with a Catmull-Rom spline
+    @staticmethod
+    def hermite(column, i, u):
+        p0, p1, p2, p3 = column[i - 1], column[i], column[i + 1], column[i + 2]
+        return p1 + 0.5 * u * (p2 - p0 + u * (2 * p0 - 5 * p1 + 4 * p2 - p3 + u * (3 * (p1 - p2) + p3 - p0)))
+
+    # Get Moon's right ascension and declination (degrees) at Julian Date jd, like calc_moon_pos()
+    def position(self, jd):
+        i, u = self.locate(jd)
+        return self.hermite(self.ra, i, u) % 360, self.hermite(self.dec, i, u)
+
+    # Get Moon's distance (km) at Julian Date jd
+    def moon_distance(self, jd):
+        i, u = self.locate(jd)
+        return self.hermite(self.distance, i, u)
+
+    # Get decimal moon phase k at Julian Date jd, like calc_moon_phase()
+    # k grows linearly between samples (months start on a sample), so it is extended from the sample before jd
+    def moon_phase(self, jd):
+        i, u = self.locate(jd)
+        return self.k[i] + u * self.step * K_RATE
+
+    # Get (right ascension, declination, distance, illumination, phase fraction) at Julian Date jd
+    def lookup(self, jd):
+        i, u = self.locate(jd)
+        k = self.k[i] + u * self.step * K_RATE
+        return (self.hermite(self.ra, i, u) % 360, self.hermite(self.dec, i, u), self.hermite(self.distance, i, u),
+                0.5 - math.cos(2 * math.pi * (k - int(k))) / 2, k - int(k))
+
+    # Get arrays of (right ascension, declination, distance, illumination, phase fraction) at an array of Julian
+    # Dates, NaN outside the table
+    def lookup_array(self, jd_array):
+        import numpy as np
+
+        jd = np.asarray(jd_array, dtype=float)
+        inside = (jd >= self.start) & (jd < self.end)
+        position = (np.where(inside, jd, self.start) - self.first_jd) / self.step
+        i = position.astype(np.int64)
+        u = position - i
+
+        def hermite(name):
+            column = np.frombuffer(self.columns[name], dtype=self.columns[name].format)
+            p0, p1, p2, p3 = (column[i + offset].astype(float) for offset in (-1, 0, 1, 2))
+            return p1 + 0.5 * u * (p2 - p0 + u * (2 * p0 - 5 * p1 + 4 * p2 - p3 + u * (3 * (p1 - p2) + p3 - p0)))
+
+        k = np.frombuffer(self.columns["k"], dtype=float)[i] + u * self.step * K_RATE
+        fraction = k - np.trunc(k)
+        results = (np.mod(hermite("ra"), 360), hermite("dec"), hermite("distance"),
+                   0.5 - np.cos(2 * np.pi * fraction) / 2, fraction)
+        return tuple(np.where(inside, result, np.nan) for result in results)
+
+    def close(self):
+        self.columns = self.ra = self.dec = self.distance = self.k = None
+        self.map.close()
+
+
+# opened table, mapped on first use
+ephemeris = None
+
+
+# Get the shared memory-mapped ephemeris, or None if the table hasn't been built
+def get_ephemeris():
+    global ephemeris
+    if ephemeris is None:
+        try:
+            ephemeris = Ephemeris()
+        except FileNotFoundError:
+            return None
+    return ephemeris
@@ -0,0 +1,186 @@
+import math
+from calculator.lunations import calc_mean_phase, calc_true_phase
+
+# Search for the next instants of a Moon phase or of an illumination crossing after a Julian Date
+# Phases are the true phase instants of the lunation index (Meeus Chapter 49), one evaluation each. The
+# illuminated fraction rises from each new moon to the next full moon and falls back to the next new moon, so those
+# instants bracket every crossing of a threshold, which Brent's method then refines in a few evaluations instead
+# of scanning day by day
+
+# mean length of a lunation (days)
+SYNODIC_MONTH = 29.530588861
+
+# phase events by name, as a quarter of a lunation (the fraction of k)
+PHASE_EVENTS = {"new_moon": 0, "first_quarter": 0.25, "full_moon": 0.5, "last_quarter": 0.75}
+
+# illumination events by name: whether the crossing is rising (above the threshold after it)
+ILLUMINATION_EVENTS = {"illumination_above": True, "illumination_below": False}
+
+# crossings are found to within this many days (about 0.01 s)
+TOLERANCE = 1e-7
+
+# lunations without a crossing scanned before a search gives up (about a century); thresholds very close to 0 or 1
+# are only crossed in lunations near an eclipse
+MAX_MISSED_LUNATIONS = 1237
+
+
+# Calculate delta T (TT - UT, seconds) at Julian Date jd, with the polynomials of Espenak and Meeus for 1900-2150
+# and their long-term parabola outside of them
+# The instants found here are in dynamical time (JDE), UT is about a minute earlier
+def calc_delta_t(jd):
+    y = 2000 + (jd - 2451545) / 365.25
+    if y < 1900 or y >= 2150:
+        return -20 + 32 * ((y - 1820) / 100)**2
+    if y < 1920:
+        t = y - 1900
+        return -2.79 + 1.494119 * t - 0.0598939 * t**2 + 0.0061966 * t**3 - 0.000197 * t**4
+    if y < 1941:
+        t = y - 1920
+        return 21.20 + 0.84493 * t - 0.076100 * t**2 + 0.0020936 * t**3
+    if y < 1961:
+        t = y - 1950
+        return 29.07 + 0.407 * t - t**2 / 233 + t**3 / 2547
+    if y < 1986:
+        t = y - 1975
+        return 45.45 + 1.067 * t - t**2 / 260 - t**3 / 718
+    if y < 2005:
+        t = y - 2000
+        return 63.86 + 0.3345 * t - 0.060374 * t**2 + 0.0017275 * t**3 + 0.000651814 * t**4 + 0.00002373599 * t**5
+    if y < 2050:
+        t = y - 2000
+        return 62.92 + 0.32217 * t + 0.005589 * t**2
+    return -20 + 32 * ((y - 1820) / 100)**2 - 0.5628 * (2150 - y)
+
+
+# Convert a Julian Date in UT to dynamical time (JDE)
+def calc_jde(jd):
+    return jd + calc_delta_t(jd) / 86400
+
+
+# Convert a JDE (dynamical time) to a Julian Date in UT
+def calc_jd_from_jde(jde):
+    return jde - calc_delta_t(jde) / 86400
+
+
+# Find a root of func between a and b, where func(a) and func(b) have opposite signs (Brent's method)
+# Returns (root, number of func evaluations)
+def brent(func, a, b, tolerance=TOLERANCE, max_iterations=100):
+    fa, fb = func(a), func(b)
+    evaluations = 2
+    if fa * fb > 0:
+        raise ValueError("Root is not bracketed")
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(max_iterations):
+        # keep b the best estimate and c on the other side of the root
+        if fb * fc > 0:
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+
+        tol = 2 * 2.2e-16 * abs(b) + tolerance / 2
+        m = (c - b) / 2
+        if abs(m) <= tol or fb == 0:
+            return b, evaluations
+
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            # secant step, or inverse quadratic interpolation when three points are known
+            s = fb / fa
+            if a == c:
+                p = 2 * m * s
+                q = 1 - s
+            else:
+                q = fa / fc
+                r = fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            # accept the interpolation only if it falls well within the bracket, otherwise bisect
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+
+        a, fa = b, fb
+        b += d if abs(d) > tol else math.copysign(tol, m)
+        fb = func(b)
+        evaluations += 1
+    return b, evaluations
+
+
+# Calculate the Moon's illuminated fraction (0 to 1) at Julian Date jd (Meeus Chapter 48, low precision)
+def calc_illuminated_fraction(jd):
+    t = (jd - 2451545) / 36525
+
+    # mean elongation D, Sun's mean anomaly M, Moon's mean anomaly M' (Meeus Chapter 47)
+    d = math.radians(297.8501921 + 445267.1114034 * t - 0.0018819 * t**2 + t**3 / 545868 - t**4 / 113065000)
+    m = math.radians(357.5291092 + 35999.0502909 * t - 0.0001536 * t**2 + t**3 / 24490000)
+    mprime = math.radians(134.9633964 + 477198.8675055 * t + 0.0087414 * t**2 + t**3 / 69699
+                          - t**4 / 14712000)
+
+    # phase angle
+    i = math.pi - d - math.radians(6.289 * math.sin(mprime) - 2.100 * math.sin(m) + 1.274 * math.sin(2 * d - mprime)
+                                   + 0.658 * math.sin(2 * d) + 0.214 * math.sin(2 * mprime) + 0.110 * math.sin(d))
+    return (1 + math.cos(i)) / 2
+
+
+# Get k of the first true phase with fraction quarter (0, 0.25, 0.5, 0.75) at or after Julian Date start
+def first_phase(start, quarter):
+    # the true phase is within a day of the mean phase, so start one lunation early
+    k = math.floor((start - calc_mean_phase(0)) / SYNODIC_MONTH) - 1 + quarter
+    while calc_true_phase(k) < start:
+        k += 1
+    return k
+
+
+# Find the next count true instants (JDE) of phase quarter (0, 0.25, 0.5, 0.75) at or after Julian Date start
+def find_phases(start, quarter, count=1):
+    k = first_phase(start, quarter)
+    return [calc_true_phase(k + i) for i in range(count)]
+
+
+# Find the next count instants at or after Julian Date start when the illuminated fraction crosses threshold,
+# rising (from below to above) or falling; returns a list of Julian Dates
+# Lunations whose illumination never reaches the threshold have no crossing and are skipped, up to max_missed of
+# them in all, so the list is shorter than count if the threshold is crossed too rarely
+def find_illumination_crossings(start, threshold, rising=True, count=1, tolerance=TOLERANCE,
+                                max_missed=MAX_MISSED_LUNATIONS):
+    if not 0 < threshold < 1:
+        raise ValueError("Threshold must be between 0 and 1")
+
+    def func(jd):
+        return calc_illuminated_fraction(jd) - threshold
+
+    # rising crossings lie between a new moon and the next full moon, falling ones between a full and a new moon
+    k = first_phase(start, 0 if rising else 0.5) - 1
+    crossings = []
+    misses = 0
+    while len(crossings) < count and misses < max_missed:
+        begin, end = calc_true_phase(k), calc_true_phase(k + 0.5)
+        k += 1
+        if func(begin) * func(end) > 0:
+            misses += 1
+            continue
+        crossing, _ = brent(func, begin, end, tolerance)
+        if crossing >= start:
+            crossings.append(crossing)
+    return crossings
+
+
+# Find the next count instants of event (a name in PHASE_EVENTS or ILLUMINATION_EVENTS) at or after Julian Date
+# start, threshold is the illuminated fraction for illumination events; start and the instants are JDEs
+# Illumination events may return fewer than count instants, see find_illumination_crossings()
+def find_events(event, start, count=1, threshold=None):
+    if event in PHASE_EVENTS:
+        return find_phases(start, PHASE_EVENTS[event], count)
+    if event in ILLUMINATION_EVENTS:
+        if threshold is None:
+            raise ValueError("Illumination events need a threshold")
+        return find_illumination_crossings(start, threshold, ILLUMINATION_EVENTS[event], count)
+    raise ValueError(f"Event must be one of {', '.join(list(PHASE_EVENTS) + list(ILLUMINATION_EVENTS))}")
@@ -0,0 +1,135 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from calculator.astro import DEFAULT_PRECISION, PRECISION_TIERS
+
+# Bulk export of Moon data over a grid of dates x latitudes
+# The grid is split into chunks of consecutive dates (each with every latitude) that worker processes compute with
+# the array functions and write to their own part files. A part is renamed into place once it is complete, so the
+# finished parts are the checkpoints: rerunning an interrupted export only computes the missing ones
+
+# output formats: one CSV file, or one numpy .npz archive holding an array per column, per chunk
+FORMATS = ("csv", "npz")
+
+# export parameters, checked when an export is resumed
+MANIFEST_NAME = "manifest.json"
+
+# columns of every row, rise_time and set_time are local hours (empty/NaN on days without the event)
+COLUMNS = ("date", "latitude", "moon_phase", "illumination", "phase_angle", "julian_date", "right_ascension",
+           "declination", "hour_angle", "rise_time", "set_time", "eclipse")
+
+
+# Get the path of part index of an export in directory
+def part_path(directory, index, file_format):
+    return os.path.join(directory, f"part-{index:05d}.{file_format}")
+
+
+# Calculate the rows for count dates start + i * step (days), i from first, at every latitude in time zone
+# timezone at precision tier precision, returns a dict of flat arrays by column, dates major and latitudes minor
+def calc_chunk(start, step, first, count, latitudes, timezone, precision=DEFAULT_PRECISION):
+    import numpy as np
+    from calculator import astro_array
+
+    dates = astro_array.date_range_array(start, step, first, count)
+    day, month, year = astro_array.split_dates(dates)
+    latitude = np.asarray(latitudes, dtype=float)
+
+    # the phase and position don't depend on the latitude, so they are computed once per date
+    data = astro_array.calc_phase_data_array(day, month, year)
+    data["right_ascension"], data["declination"] = astro_array.calc_moon_pos_array(data["julian_date"],
+                                                                                   precision=precision)
+    columns = {name: np.repeat(value, len(latitude)) for name, value in data.items()}
+    columns["date"] = np.repeat(np.datetime_as_string(dates, unit='D'), len(latitude))
+    columns["latitude"] = np.tile(latitude, count)
+
+    rise_time, set_time = astro_array.calc_rise_set_array(data["julian_date"][:, None], latitude, timezone,
+                                                          precision=precision)
+    columns["rise_time"], columns["set_time"] = rise_time.ravel(), set_time.ravel()
+    columns["hour_angle"] = astro_array.calc_ha_array(data["declination"][:, None], 0, latitude).ravel()
+    return {name: columns[name] for name in COLUMNS}
+
+
+# Write columns to path in file_format, through a temporary file renamed into place
+def write_part(path, columns, file_format):
+    import numpy as np
+
+    temporary = path + ".tmp"
+    if file_format == "csv":
+        with open(temporary, "w", newline="") as part_file:
+            writer = csv.writer(part_file)
+            writer.writerow(COLUMNS)
+            # NaN (no value on this date) is written as an empty field, like None
+            values = [np.where(np.isnan(column), None, column).tolist() if column.dtype.kind == "f"
+                      else column.tolist() for column in (columns[name] for name in COLUMNS)]
+            writer.writerows(zip(*values))
+    else:
+        with open(temporary, "wb") as part_file:
+            np.savez(part_file, **columns)
+    os.replace(temporary, path)
+
+
+# Calculate and write one chunk (runs in a worker process), returns (part index, number of rows)
+def export_chunk(directory, index, file_format, start, step, first, count, latitudes, timezone, precision):
+    columns = calc_chunk(start, step, first, count, latitudes, timezone, precision)
+    write_part(part_path(directory, index, file_format), columns, file_format)
+    return index, len(columns["date"])
+
+
+# Export the dates start through end every step days, at every latitude, in time zone timezone at precision tier
+# precision to directory
+# Chunks of chunk_days dates run on workers processes (in this process if workers is 1); parts already in
+# directory from an interrupted export with the same parameters are skipped
+# Raises ValueError if directory holds an export with other parameters, returns (parts written, parts skipped)
+def export(directory, start, end, step, latitudes, timezone, chunk_days=100, workers=None, file_format="csv",
+           log=print, precision=DEFAULT_PRECISION):
+    if file_format not in FORMATS:
+        raise ValueError(f"Format must be one of {', '.join(FORMATS)}")
+    if precision not in PRECISION_TIERS:
+        raise ValueError(f"Precision must be one of {', '.join(PRECISION_TIERS)}")
+    count = (end - start).days // step + 1
+    chunks = [(index, first, min(chunk_days, count - first))
+              for index, first in enumerate(range(0, count, chunk_days))]
+
+    manifest = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "step": step,
+        "latitudes": list(latitudes),
+        "timezone": timezone,
+        "precision": precision,
+        "chunk_days": chunk_days,
+        "format": file_format,
+        "columns": list(COLUMNS),
+        "parts": len(chunks),
+    }
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            if json.load(manifest_file) != manifest:
+                raise ValueError(f"{directory} holds an export with different parameters")
+    else:
+        with open(manifest_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    pending = [chunk for chunk in chunks if not os.path.exists(part_path(directory, chunk[0], file_format))]
+    skipped = len(chunks) - len(pending)
+    if skipped:
+        log(f"resuming: {skipped} of {len(chunks)} parts already written")
+
+    def arguments(chunk):
+        index, first, days = chunk
+        return directory, index, file_format, start, step, first, days, list(latitudes), timezone, precision
+
+    if workers == 1:
+        for done, chunk in enumerate(pending, 1):
+            index, rows = export_chunk(*arguments(chunk))
+            log(f"part {index} ({rows} rows), {done} of {len(pending)}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(export_chunk, *arguments(chunk)) for chunk in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                index, rows = future.result()
+                log(f"part {index} ({rows} rows), {done} of {len(pending)}")
+    return len(pending), skipped
@@ -0,0 +1,179 @@
+import math
+import threading
+from collections import OrderedDict
+from calculator import lunations
+from calculator.astro import calc_moon_state, calc_system_angles, draw_moon_img, draw_system_img
+from calculator.svg import draw_moon_svg, draw_system_svg
+
+# Server-side cache for the Moon and Sun-Earth-Moon SVGs
+# The Moon image only depends on the phase string and illumination, and the system image only depends on the
+# Earth and Moon angles, so both are keyed on those inputs quantized to a fraction (step) of a full cycle
+
+# default settings, overridden by configure()
+DEFAULT_SIZE = 1024
+DEFAULT_STEP = 1 / 360
+DEFAULT_BACKEND = 'matplotlib'
+
+# Moon and system drawing functions by backend name
+BACKENDS = {
+    'matplotlib': (draw_moon_img, draw_system_img),
+    'svg': (draw_moon_svg, draw_system_svg),
+}
+
+
+# Bounded LRU cache of rendered images with hit/miss counters
+class RenderCache:
+    def __init__(self, render, size=DEFAULT_SIZE):
+        self.render = render
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Get the image for key, rendering it on a miss
+    def get(self, key):
+        img = self.lookup(key)
+        if img is None:
+            # render outside the lock so a slow render doesn't block hits
+            img = self.render(*key)
+            self.store(key, img)
+        return img
+
+    # Get the cached image for key, or None on a miss (to be rendered elsewhere and passed to store())
+    def lookup(self, key):
+        with self.lock:
+            img = self.items.get(key)
+            if img is not None:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+        return None
+
+    # Add the image for key, evicting the least recently used images over size
+    def store(self, key, img):
+        with self.lock:
+            self.items[key] = img
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    # Empty the cache and reset counters
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    # Get hit/miss metrics as a dict
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self.items),
+                "max_size": self.size,
+            }
+
+
+moon_cache = RenderCache(draw_moon_img)
+system_cache = RenderCache(draw_system_img)
+step = DEFAULT_STEP
+backend = DEFAULT_BACKEND
+
+
+# Set cache size, quantization step (fraction of a full cycle), and drawing backend, clearing both caches
+def configure(size=DEFAULT_SIZE, quantization_step=DEFAULT_STEP, backend_name=DEFAULT_BACKEND):
+    global step, backend
+    if size < 1:
+        raise ValueError("Cache size must be at least 1")
+    if not 0 < quantization_step <= 1:
+        raise ValueError("Quantization step must be in the range (0, 1]")
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Image backend must be one of {', '.join(BACKENDS)}")
+    step = quantization_step
+    backend = backend_name
+    moon_cache.render, system_cache.render = BACKENDS[backend_name]
+    for cache in (moon_cache, system_cache):
+        cache.size = size
+        cache.clear()
+
+
+# Round value to the nearest multiple of step
+def quantize(value, quantum):
+    return round(value / quantum) * quantum
+
+
+# Get the cache key of the Moon image given string phase and illumination
+def moon_key(phase, illumination):
+    return phase, quantize(illumination, step)
+
+
+# Get the cache key of the system image given Earth and Moon angles (radians)
+def system_key(earth_angle, moon_angle):
+    quantum = 2 * math.pi * step
+    return quantize(earth_angle, quantum) % (2 * math.pi), quantize(moon_angle, quantum) % (2 * math.pi)
+
+
+# Get (possibly cached) illuminated Moon image given day, month, year
+def get_moon_img(day, month, year, state=None):
+    if state is None:
+        state = calc_moon_state(day, month, year)
+    return moon_cache.get(moon_key(state.phase, state.illumination))
+
+
+# Get (possibly cached) image of Sun-Earth-Moon system given day, month, year
+def get_system_img(day, month, year, state=None):
+    return system_cache.get(system_key(*calc_system_angles(day, month, year, state=state)))
+
+
+# Render the Moon image for every key a date can have ahead of time, returns the number of images rendered
+# Every illumination bin gets the crescent or gibbous names on its side of 1/2, and the bins near 0, 1/2, and 1
+# the new moon, quarter, and full moon names (a date is named after an event within lunations.EVENT_WINDOW of it)
+def prewarm():
+    # the widest event window as an angle of the lunation, on the shortest interval between events in the index
+    _, jdes = lunations.get_index()
+    shortest = min((b - a for a, b in zip(jdes, jdes[1:])), default=29.53059 / 4)
+    window = math.pi / 2 * lunations.EVENT_WINDOW / shortest
+    near_event = (1 - math.cos(window)) / 2 + step
+    near_quarter = math.sin(window) / 2 + step
+
+    keys = set()
+    for i in range(int(round(1 / step)) + 1):
+        illumination = min(i * step, 1)
+        phases = []
+        if illumination <= 0.5 + step:
+            phases += ["Waxing Crescent", "Waning Crescent"]
+        if illumination >= 0.5 - step:
+            phases += ["Waxing Gibbous", "Waning Gibbous"]
+        if illumination <= near_event:
+            phases.append("New Moon")
+        if abs(illumination - 0.5) <= near_quarter:
+            phases += ["First Quarter", "Last Quarter"]
+        if illumination >= 1 - near_event:
+            phases.append("Full Moon")
+        keys.update(moon_key(phase, illumination) for phase in phases)
+    for key in keys:
+        moon_cache.get(key)
+    return len(keys)
+
+
+# Get hit/miss metrics for both caches
+def stats():
+    return {"moon": moon_cache.stats(), "system": system_cache.stats()}
+
+
+# Get the hit and miss counters and sizes of both caches in the Prometheus text format as a list of lines
+def export_metrics():
+    caches = stats()
+    lines = []
+    for name, kind, key, description in (
+            ("moon_image_cache_hits_total", "counter", "hits", "Image cache lookups found in the cache"),
+            ("moon_image_cache_misses_total", "counter", "misses", "Image cache lookups that had to render"),
+            ("moon_image_cache_size", "gauge", "size", "Images held in the image cache")):
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{cache="{cache}"}} {values[key]}' for cache, values in caches.items()]
+    return lines
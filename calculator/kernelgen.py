@@ -0,0 +1,206 @@
+import os
+from calculator import astro
+
+# Code generator for calculator/moonkernel.py, a straight-line version of astro.calc_moon_pos()
+# dot_product() scales every entry of a table by the same scalar, so the generator folds each table (and the
+# eccentricity factors of the longitude and latitude terms) into one constant; the kernel is then a few dozen
+# float operations on literals. sin and cos of each angle are computed once and shared, and the sines of sums and
+# differences of two angles are built from them by angle addition instead of calling math.sin again
+# One function is generated per precision tier of astro.PRECISION_TIERS, computing only the angles its terms use
+# Regenerate with python manage.py build_kernel after changing the tables in astro.py
+
+KERNEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "moonkernel.py")
+
+# base angles of the kernel as (name, expression in t), reduced to [0, 360) and converted to radians
+# lprime, d, m, mprime, f fold MOON_COEFF0-4, nd, nm, nmp, nf, nom fold the nutation rates, a1-a3 are Meeus' A1-A3
+BASE_ANGLES = [
+    ("lprime", f"{sum(astro.MOON_COEFF0)!r} * t"),
+    ("d", f"{sum(astro.MOON_COEFF1)!r} * t"),
+    ("m", f"{sum(astro.MOON_COEFF2)!r} * t"),
+    ("mprime", f"{sum(astro.MOON_COEFF3)!r} * t"),
+    ("f", f"{sum(astro.MOON_COEFF4)!r} * t"),
+    ("a1", "119.75 + 131.849 * t"),
+    ("a2", "53.09 + 479264.29 * t"),
+    ("a3", "313.45 + 481266.484 * t"),
+    ("nd", f"{astro.NUT_RATES[0]!r} * t"),
+    ("nm", f"{astro.NUT_RATES[1]!r} * t"),
+    ("nmp", f"{astro.NUT_RATES[2]!r} * t"),
+    ("nf", f"{astro.NUT_RATES[3]!r} * t"),
+    ("nom", f"{astro.NUT_RATES[4]!r} * t"),
+]
+
+
+# Sum amplitudes by the power of the eccentricity factor applied to each term (|M| = 0, 1, 2)
+def split_by_eccentricity(amplitudes, m_multipliers):
+    sums = [0.0, 0.0, 0.0]
+    for amplitude, m in zip(amplitudes, m_multipliers):
+        sums[abs(m)] += amplitude
+    return sums
+
+
+# Format an integer combination of angles, e.g. {"d": 97, "m": 8, "f": -4} -> "97 * d + 8 * m - 4 * f"
+def format_combination(combination):
+    terms = [name if multiplier == 1 else f"{multiplier} * {name}"
+             for name, multiplier in combination.items() if multiplier]
+    return " + ".join(terms).replace("+ -", "- ")
+
+
+# Weighted sines of terms of astro.MOON_SUML_TERMS or MOON_SUMB_TERMS as a list of products
+# sin(a +- b) is expanded to sin a cos b +- cos a sin b over the sines and cosines in shared, so terms on the same
+# angles combine; single angles use their shared sine if there is one
+def expand_sines(terms, shared):
+    coefficients = {}
+    for amplitude, first, second, sign in terms:
+        if second is None:
+            key = (f"sin_{first}",) if first in shared else (f"math.sin({first})",)
+            coefficients[key] = coefficients.get(key, 0) + amplitude
+        else:
+            # sin(a + b) = sin a cos b + cos a sin b, sin(a - b) = sin a cos b - cos a sin b
+            key = (f"sin_{first}", f"cos_{second}")
+            coefficients[key] = coefficients.get(key, 0) + amplitude
+            key = (f"cos_{first}", f"sin_{second}")
+            coefficients[key] = coefficients.get(key, 0) + sign * amplitude
+    return [" * ".join((repr(amplitude),) + factors) for factors, amplitude in coefficients.items() if amplitude]
+
+
+# Lines assigning the sum of products to name, continued with += where a line would be too long
+def format_sum(name, products, width=120):
+    lines = [f"    {name} = " + (products[0] if products else "0")]
+    for product in products[1:]:
+        term = f" - {product[1:]}" if product.startswith("-") else f" + {product}"
+        if len(lines[-1]) + len(term) > width:
+            lines.append(f"    {name} {term[1]}= {term[3:]}")
+        else:
+            lines[-1] += term
+    return lines
+
+
+# Generate the source of the kernel function calc_moon_pos_<precision>
+def generate_function(precision):
+    suml_terms, sumb_terms, nutation = astro.get_precision_terms(precision)
+    sin_lng = split_by_eccentricity(astro.MOON_SIN_LNG, astro.MOON_M_LNG)
+    sin_lat = split_by_eccentricity(astro.MOON_SIN_LAT, astro.MOON_M_LAT)
+    arg_lng = format_combination({"d": sum(astro.MOON_D_LNG), "m": sum(astro.MOON_M_LNG),
+                                  "mprime": sum(astro.MOON_MP_LNG), "f": sum(astro.MOON_F_LNG)})
+    arg_lat = format_combination({"d": sum(astro.MOON_D_LAT), "m": sum(astro.MOON_M_LAT),
+                                  "mprime": sum(astro.MOON_MP_LAT), "f": sum(astro.MOON_F_LAT)})
+    arg_nut = format_combination(dict(zip(("nd", "nm", "nmp", "nf", "nom"), astro.NUT_ARGS)))
+
+    # angles of sums and differences get a shared sine and cosine, only the angles used are computed
+    terms = suml_terms + sumb_terms
+    shared = [name for name, _ in BASE_ANGLES
+              if any(name == second or name == first and second is not None for _, first, second, _ in terms)]
+    used = {"d", "m", "mprime", "f"} | {first for _, first, _, _ in terms} | set(shared)
+    if nutation:
+        used |= {"nd", "nm", "nmp", "nf", "nom"}
+    # a cosine is only computed if a product still uses it, cos a sin b terms of equal and opposite amplitude cancel
+    suml_products = expand_sines(suml_terms, shared)
+    sumb_products = expand_sines(sumb_terms, shared)
+    factors = {factor for product in suml_products + sumb_products for factor in product.split(" * ")}
+
+    lines = [
+        f"# Calculate Moon's right ascension and declination given Julian Date at precision {precision}",
+        f"def calc_moon_pos_{precision}(jd):",
+        "    t = (jd - 2451545.0) / 36525",
+        "",
+        "    # angles reduced to [0, 360) degrees, in radians",
+    ]
+    lines += [f"    {name} = ({expression}) % 360 * RD" for name, expression in BASE_ANGLES if name in used]
+    if shared:
+        lines += ["", "    # shared sines and cosines"]
+        lines += [f"    sin_{name}, cos_{name} = math.sin({name}), math.cos({name})" if f"cos_{name}" in factors
+                  else f"    sin_{name} = math.sin({name})" for name in shared]
+    lines += [
+        "",
+        "    # periodic terms, the series amplitudes are split by the power of e applied to them",
+        "    e = 1 - 0.002516 * t - 0.0000074 * t**2",
+    ]
+    lines += format_sum("suml", suml_products)
+    lines += format_sum("sumb", sumb_products)
+    lines += [
+        f"    arg_lng = {arg_lng}",
+        f"    arg_lat = {arg_lat}",
+        f"    geolong = {sum(astro.MOON_COEFF0)!r} * t \\",
+        f"        + (({sin_lng[0]!r} + e * ({sin_lng[1]!r} + e * {sin_lng[2]!r})) * math.sin(arg_lng) + suml)"
+        " / 1000000",
+        f"    geolat = (({sin_lat[0]!r} + e * ({sin_lat[1]!r} + e * {sin_lat[2]!r})) * math.sin(arg_lat) + sumb)"
+        " / 1000000",
+        "",
+    ]
+    obliquity = f"{(23 + 26 / 60) / 360!r} + {sum(astro.MOON_COEFF5)!r} * t / 3600"
+    if nutation:
+        lines += [
+            "    # nutation in longitude and obliquity",
+            f"    arg = {arg_nut}",
+            f"    nut_long = 0.0001 * ({astro.NUT_LONG[0]!r} + {astro.NUT_LONG[1]!r} * t) * t * math.sin(arg)",
+            f"    nut_oblique = 0.0001 * ({astro.NUT_OBLIQUE[0]!r} + {astro.NUT_OBLIQUE[1]!r} * t) * t"
+            " * math.cos(arg)",
+            "",
+            "    # find lambda, beta, epsilon",
+            "    lmda = (geolong + nut_long / 3600) % 360 * RD",
+            f"    epsilon = ({obliquity} + nut_oblique / 3600) * RD",
+        ]
+    else:
+        lines += [
+            "    # find lambda, beta, epsilon (without nutation)",
+            "    lmda = geolong % 360 * RD",
+            f"    epsilon = ({obliquity}) * RD",
+        ]
+    lines += [
+        "    beta = geolat * RD",
+        "    sin_lmda, sin_epsilon, cos_epsilon = math.sin(lmda), math.sin(epsilon), math.cos(epsilon)",
+        "",
+        "    # find right ascension and declination",
+        "    ra = math.atan2(sin_lmda * cos_epsilon - math.tan(beta) * sin_epsilon, math.cos(lmda)) % (2 * math.pi)",
+        "    dec = math.asin(math.sin(beta) * cos_epsilon + math.cos(beta) * sin_epsilon * sin_lmda)",
+        "    return ra / RD, dec / RD",
+    ]
+    return lines
+
+
+# Generate the source of the kernel module
+def generate_kernel():
+    lines = [
+        "import math",
+        "",
+        "# Generated by python manage.py build_kernel (calculator/kernelgen.py) from the tables in",
+        "# calculator/astro.py, do not edit",
+        "# Straight-line calc_moon_pos() for each precision tier with every table folded into constants, agrees with",
+        "# astro.calc_moon_pos() to float rounding",
+        "",
+        "# radians/degrees constant",
+        "RD = math.pi / 180",
+    ]
+    for precision in astro.PRECISION_TIERS:
+        lines += ["", ""] + generate_function(precision)
+    lines += [
+        "",
+        "",
+        "KERNELS = {" + ", ".join(f'"{precision}": calc_moon_pos_{precision}'
+                                  for precision in astro.PRECISION_TIERS) + "}",
+        "",
+        "",
+        "# Calculate Moon's right ascension and declination given Julian Date, precision is a tier of",
+        "# astro.calc_moon_pos()",
+        f'def calc_moon_pos(jd, precision="{astro.DEFAULT_PRECISION}"):',
+        "    kernel = KERNELS.get(precision)",
+        "    if kernel is None:",
+        "        raise ValueError(f\"Precision must be one of {', '.join(KERNELS)}\")",
+        "    return kernel(jd)",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+# Write the kernel module to path
+def write_kernel(path=KERNEL_PATH):
+    with open(path, "w") as kernel_file:
+        kernel_file.write(generate_kernel())
+
+
+# Whether the kernel module at path was generated from the current tables
+def kernel_is_current(path=KERNEL_PATH):
+    try:
+        with open(path) as kernel_file:
+            return kernel_file.read() == generate_kernel()
+    except FileNotFoundError:
+        return False
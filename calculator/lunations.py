@@ -0,0 +1,215 @@
+import array
+import bisect
+import math
+import os
+import struct
+import sys
+
+# Precomputed index of true Moon phase instants (Meeus Chapter 49)
+# The index holds the JDE of every new moon, first quarter, full moon, and last quarter from 1900 through 2200 in
+# order, so the phase around any date in that range is found by binary search instead of the linear k estimate
+
+# index file: header (magic, version, k of the first event in quarters, event count), then little-endian doubles
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lunations.bin")
+INDEX_MAGIC = b"LUNA"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sHiI")
+
+# years covered by the index
+FIRST_YEAR = 1900
+LAST_YEAR = 2200
+
+# phase names by quarter (k mod 1 = 0, 0.25, 0.5, 0.75), and of the time between one quarter and the next
+EVENT_NAMES = ("New Moon", "First Quarter", "Full Moon", "Last Quarter")
+BETWEEN_NAMES = ("Waxing Crescent", "Waxing Gibbous", "Waning Gibbous", "Waning Crescent")
+
+# a date is named after a quarter within half a day of it, like the 0.5/29.53059 window in str_phase_from_k()
+EVENT_WINDOW = 0.5
+
+# Periodic terms of the new and full moon (Meeus Chapter 49)
+# columns: amplitude, power of E, multipliers of M, M', F, omega
+NEW_MOON_TERMS = [
+    (-0.40720, 0, 0, 1, 0, 0), (0.17241, 1, 1, 0, 0, 0), (0.01608, 0, 0, 2, 0, 0), (0.01039, 0, 0, 0, 2, 0),
+    (0.00739, 1, -1, 1, 0, 0), (-0.00514, 1, 1, 1, 0, 0), (0.00208, 2, 2, 0, 0, 0), (-0.00111, 0, 0, 1, -2, 0),
+    (-0.00057, 0, 0, 1, 2, 0), (0.00056, 1, 1, 2, 0, 0), (-0.00042, 0, 0, 3, 0, 0), (0.00042, 1, 1, 0, 2, 0),
+    (0.00038, 1, 1, 0, -2, 0), (-0.00024, 1, -1, 2, 0, 0), (-0.00017, 0, 0, 0, 0, 1), (-0.00007, 0, 2, 1, 0, 0),
+    (0.00004, 0, 0, 2, -2, 0), (0.00004, 0, 3, 0, 0, 0), (0.00003, 0, 1, 1, -2, 0), (0.00003, 0, 0, 2, 2, 0),
+    (-0.00003, 0, 1, 1, 2, 0), (0.00003, 0, -1, 1, 2, 0), (-0.00002, 0, -1, 1, -2, 0), (-0.00002, 0, 1, 3, 0, 0),
+    (0.00002, 0, 0, 4, 0, 0),
+]
+FULL_MOON_TERMS = [
+    (-0.40614, 0, 0, 1, 0, 0), (0.17302, 1, 1, 0, 0, 0), (0.01614, 0, 0, 2, 0, 0), (0.01043, 0, 0, 0, 2, 0),
+    (0.00734, 1, -1, 1, 0, 0), (-0.00515, 1, 1, 1, 0, 0), (0.00209, 2, 2, 0, 0, 0), (-0.00111, 0, 0, 1, -2, 0),
+    (-0.00057, 0, 0, 1, 2, 0), (0.00056, 1, 1, 2, 0, 0), (-0.00042, 0, 0, 3, 0, 0), (0.00042, 1, 1, 0, 2, 0),
+    (0.00038, 1, 1, 0, -2, 0), (-0.00024, 1, -1, 2, 0, 0), (-0.00017, 0, 0, 0, 0, 1), (-0.00007, 0, 2, 1, 0, 0),
+    (0.00004, 0, 0, 2, -2, 0), (0.00004, 0, 3, 0, 0, 0), (0.00003, 0, 1, 1, -2, 0), (0.00003, 0, 0, 2, 2, 0),
+    (-0.00003, 0, 1, 1, 2, 0), (0.00003, 0, -1, 1, 2, 0), (-0.00002, 0, -1, 1, -2, 0), (-0.00002, 0, 1, 3, 0, 0),
+    (0.00002, 0, 0, 4, 0, 0),
+]
+QUARTER_TERMS = [
+    (-0.62801, 0, 0, 1, 0, 0), (0.17172, 1, 1, 0, 0, 0), (-0.01183, 1, 1, 1, 0, 0), (0.00862, 0, 0, 2, 0, 0),
+    (0.00804, 0, 0, 0, 2, 0), (0.00454, 1, -1, 1, 0, 0), (0.00204, 2, 2, 0, 0, 0), (-0.00180, 0, 0, 1, -2, 0),
+    (-0.00070, 0, 0, 1, 2, 0), (-0.00040, 0, 0, 3, 0, 0), (-0.00034, 1, -1, 2, 0, 0), (0.00032, 1, 1, 0, 2, 0),
+    (0.00032, 1, 1, 0, -2, 0), (-0.00028, 2, 2, 1, 0, 0), (0.00027, 1, 1, 2, 0, 0), (-0.00017, 0, 0, 0, 0, 1),
+    (-0.00005, 0, -1, 1, -2, 0), (0.00004, 0, 0, 2, 2, 0), (-0.00004, 0, 1, 1, 2, 0), (0.00004, 0, -2, 1, 0, 0),
+    (0.00003, 0, 1, 1, -2, 0), (0.00003, 0, 3, 0, 0, 0), (0.00002, 0, 0, 2, -2, 0), (0.00002, 0, -1, 1, 2, 0),
+    (-0.00002, 0, 1, 3, 0, 0),
+]
+
+# Additional corrections for all phases: amplitude, constant and rate per lunation of the argument (degrees)
+PLANETARY_TERMS = [
+    (0.000325, 299.77, 0.107408), (0.000165, 251.88, 0.016321), (0.000164, 251.83, 26.651886),
+    (0.000126, 349.42, 36.412478), (0.000110, 84.66, 18.206239), (0.000062, 141.74, 53.303771),
+    (0.000060, 207.14, 2.453732), (0.000056, 154.84, 7.306860), (0.000047, 34.52, 27.261239),
+    (0.000042, 207.19, 0.121824), (0.000040, 291.34, 1.844379), (0.000037, 161.72, 24.198154),
+    (0.000035, 239.56, 25.513099), (0.000023, 331.55, 3.592518),
+]
+
+
+# Calculate the Moon's argument of latitude F (degrees) at phase k (Meeus Chapter 49)
+def calc_f(k):
+    t = k / 1236.85
+    return 160.7108 + 390.67050284 * k - 0.0016118 * t**2 - 0.00000227 * t**3 + 0.000000011 * t**4
+
+
+# Calculate the JDE of the mean phase k
+def calc_mean_phase(k):
+    t = k / 1236.85
+    return 2451550.09766 + 29.530588861 * k + 0.00015437 * t**2 - 0.000000150 * t**3 + 0.00000000073 * t**4
+
+
+# Calculate the eccentricity factor E and the arguments M, M', F, omega (radians) at phase k (Meeus Chapter 49)
+def calc_arguments(k):
+    t = k / 1236.85
+    e = 1 - 0.002516 * t - 0.0000074 * t**2
+    m = math.radians(2.5534 + 29.10535670 * k - 0.0000014 * t**2 - 0.00000011 * t**3)
+    mprime = math.radians(201.5643 + 385.81693528 * k + 0.0107582 * t**2 + 0.00001238 * t**3
+                          - 0.000000058 * t**4)
+    f = math.radians(calc_f(k))
+    omega = math.radians(124.7746 - 1.56375588 * k + 0.0020672 * t**2 + 0.00000215 * t**3)
+    return e, m, mprime, f, omega
+
+
+# Calculate the JDE of the true phase k (integer k: new moon, +0.25: first quarter, +0.5: full, +0.75: last quarter)
+def calc_true_phase(k):
+    t = k / 1236.85
+    jde = calc_mean_phase(k)
+    e, m, mprime, f, omega = calc_arguments(k)
+
+    # periodic terms for the quarter
+    quarter = round(4 * (k - math.floor(k))) % 4
+    terms = (NEW_MOON_TERMS, QUARTER_TERMS, FULL_MOON_TERMS, QUARTER_TERMS)[quarter]
+    for amplitude, e_power, m_mult, mprime_mult, f_mult, omega_mult in terms:
+        jde += amplitude * e**e_power * math.sin(m_mult * m + mprime_mult * mprime + f_mult * f + omega_mult * omega)
+
+    # quarter correction W
+    if quarter % 2:
+        w = 0.00306 - 0.00038 * e * math.cos(m) + 0.00026 * math.cos(mprime) - 0.00002 * math.cos(mprime - m) \
+            + 0.00002 * math.cos(mprime + m) + 0.00002 * math.cos(2 * f)
+        jde += w if quarter == 1 else -w
+
+    # additional corrections (the first argument also has a T**2 term)
+    for i, (amplitude, constant, rate) in enumerate(PLANETARY_TERMS):
+        arg = constant + rate * k - (0.009173 * t**2 if i == 0 else 0)
+        jde += amplitude * math.sin(math.radians(arg))
+
+    return jde
+
+
+# Calculate (k of the first event in quarters, list of JDEs) of every quarter from first_year through last_year
+# One lunation of margin is added at each end so every date in the range lies between two events
+def build_index(first_year=FIRST_YEAR, last_year=LAST_YEAR):
+    first = 4 * (math.floor((first_year - 2000) * 12.3685) - 1)
+    last = 4 * (math.ceil((last_year + 1 - 2000) * 12.3685) + 1)
+    return first, [calc_true_phase(quarter / 4) for quarter in range(first, last)]
+
+
+# Write an index to path
+def write_index(first, jdes, path=INDEX_PATH):
+    data = array.array("d", jdes)
+    if sys.byteorder != "little":
+        data.byteswap()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as index_file:
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, first, len(data)))
+        index_file.write(data.tobytes())
+
+
+# Read an index from path, returns (k of the first event in quarters, array of JDEs)
+def read_index(path=INDEX_PATH):
+    with open(path, "rb") as index_file:
+        magic, version, first, count = INDEX_HEADER.unpack(index_file.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{path} is not a version {INDEX_VERSION} lunation index")
+        data = array.array("d")
+        data.frombytes(index_file.read(8 * count))
+    if len(data) != count:
+        raise ValueError(f"{path} is truncated")
+    if sys.byteorder != "little":
+        data.byteswap()
+    return first, data
+
+
+# loaded index, read on first use
+index = None
+
+
+# Get the loaded index, returns (k of the first event in quarters, array of JDEs), or (0, empty array) when the
+# index file is missing so that every lookup falls back to the k estimate
+def get_index():
+    global index
+    if index is None:
+        try:
+            index = read_index()
+        except FileNotFoundError:
+            index = 0, array.array("d")
+    return index
+
+
+# Get string moon phase at Julian Date jd, or None outside the index
+def str_phase_from_jd(jd):
+    first, jdes = get_index()
+    i = bisect.bisect_right(jdes, jd) - 1
+    if i < 0 or i + 1 >= len(jdes):
+        return None
+
+    quarter = (first + i) % 4
+    if jd - jdes[i] < EVENT_WINDOW:
+        return EVENT_NAMES[quarter]
+    if jdes[i + 1] - jd <= EVENT_WINDOW:
+        return EVENT_NAMES[(quarter + 1) % 4]
+    return BETWEEN_NAMES[quarter]
+
+
+# Get the fraction of the lunation (0 at the new moon, 0.25 at the first quarter, ...) at Julian Date jd,
+# interpolated between the events around it like the phase name of str_phase_from_jd(), or None outside the index
+def calc_fraction_from_jd(jd):
+    first, jdes = get_index()
+    i = bisect.bisect_right(jdes, jd) - 1
+    if i < 0 or i + 1 >= len(jdes):
+        return None
+    return ((first + i) % 4 + (jd - jdes[i]) / (jdes[i + 1] - jdes[i])) / 4
+
+
+# Check for a solar (new moon) or lunar (full moon) eclipse in the day starting at Julian Date jd
+# Screens the argument of latitude F of the syzygy in that day like check_eclipse(), returns string or None
+# outside the index
+def check_eclipse_from_jd(jd):
+    first, jdes = get_index()
+    i = bisect.bisect_left(jdes, jd)
+    if i == 0 or i >= len(jdes):
+        return None
+
+    quarter = (first + i) % 4
+    if jdes[i] >= jd + 1 or quarter % 2:
+        return "No eclipse"
+    eclipse_type = "Solar" if quarter == 0 else "Lunar"
+
+    # distance between f and nearest multiple of 180
+    f = calc_f((first + i) / 4)
+    dist = abs(f - round(f / 180) * 180)
+    if dist < 13.9:
+        return f"{eclipse_type} eclipse"
+    if dist > 21 or abs(math.sin(math.radians(f))) > 0.36:
+        return "No eclipse"
+    return f"{eclipse_type} possible"
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from calculator import bench
+
+
+class Command(BaseCommand):
+    help = "Benchmark the astro hot paths, the images, and the calculation view, optionally saving JSON results"
+
+    def add_arguments(self, parser):
+        bench.add_suite_arguments(parser)
+
+    def handle(self, *args, **options):
+        failures = bench.benchmark_suite(options["case"], options["duration"], options["alloc_iterations"],
+                                         options["output"], options["baseline"], options["max_slowdown"],
+                                         log=self.stdout.write)
+        if failures:
+            raise CommandError("p50 latency regressed:\n" + "\n".join(failures))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from calculator import ephemeris
+
+
+class Command(BaseCommand):
+    help = "Build the memory-mapped Moon ephemeris table (position, distance, and phase on a fixed grid)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--first-year", type=int, default=ephemeris.FIRST_YEAR)
+        parser.add_argument("--last-year", type=int, default=ephemeris.LAST_YEAR)
+        parser.add_argument("--step-minutes", type=int, default=ephemeris.STEP_MINUTES)
+        parser.add_argument("--output", default=ephemeris.EPHEMERIS_PATH)
+
+    def handle(self, *args, **options):
+        if options["last_year"] < options["first_year"]:
+            raise CommandError("Last year must not be before first year")
+        if options["first_year"] < 1900:
+            raise CommandError("First year must be at least 1900")
+
+        try:
+            first_jd, step, columns = ephemeris.build_columns(options["first_year"], options["last_year"],
+                                                              options["step_minutes"])
+        except ValueError as error:
+            raise CommandError(error)
+        ephemeris.write_table(first_jd, step, columns, options["output"])
+        self.stdout.write(f"Wrote {len(columns['k'])} samples ({options['first_year']}-{options['last_year']}, "
+                          f"every {options['step_minutes']} min) to {options['output']}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from calculator import kernelgen
+
+
+class Command(BaseCommand):
+    help = "Regenerate calculator/moonkernel.py, the straight-line calc_moon_pos() used by the results page"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=kernelgen.KERNEL_PATH)
+        parser.add_argument("--check", action="store_true", help="only check that the kernel is current")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            if not kernelgen.kernel_is_current(options["output"]):
+                raise CommandError(f"{options['output']} is out of date, run build_kernel")
+            self.stdout.write(f"{options['output']} is current")
+            return
+
+        kernelgen.write_kernel(options["output"])
+        self.stdout.write(f"Wrote {options['output']}")
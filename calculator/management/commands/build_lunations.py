@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from calculator import lunations
+
+
+class Command(BaseCommand):
+    help = "Regenerate the lunation index (true new moon, quarter, and full moon instants) used for phase lookups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--first-year", type=int, default=lunations.FIRST_YEAR)
+        parser.add_argument("--last-year", type=int, default=lunations.LAST_YEAR)
+        parser.add_argument("--output", default=lunations.INDEX_PATH)
+
+    def handle(self, *args, **options):
+        if options["last_year"] < options["first_year"]:
+            raise CommandError("Last year must not be before first year")
+
+        first, jdes = lunations.build_index(options["first_year"], options["last_year"])
+        lunations.write_index(first, jdes, options["output"])
+        self.stdout.write(f"Wrote {len(jdes)} phases ({options['first_year']}-{options['last_year']}) "
+                          f"to {options['output']}")
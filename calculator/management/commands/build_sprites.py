@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from calculator import sprites
+
+
+class Command(BaseCommand):
+    help = "Pre-render the Moon image of the results page for every degree of the lunation into static files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=sprites.SPRITE_DIR)
+        parser.add_argument("--check", action="store_true", help="only check that the sprites are current")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            if not sprites.sprites_are_current(options["output"]):
+                raise CommandError(f"The sprites in {options['output']} are out of date, run build_sprites")
+            self.stdout.write(f"The sprites in {options['output']} are current")
+            return
+
+        manifest = sprites.build_sprites(options["output"])
+        self.stdout.write(f"Wrote {len(manifest['frames'])} frames (version {manifest['version']}) "
+                          f"to {options['output']}")
@@ -0,0 +1,58 @@
+import datetime
+import os
+from django.core.management.base import BaseCommand, CommandError
+from calculator import astro, export
+
+
+class Command(BaseCommand):
+    help = "Export Moon data for a grid of dates x latitudes to part files, in parallel and resumably"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="directory for the part files (rerun with the same arguments to resume)")
+        parser.add_argument("--start", required=True, help="first date, YYYY-MM-DD")
+        parser.add_argument("--end", required=True, help="last date, YYYY-MM-DD")
+        parser.add_argument("--step", type=int, default=1, help="days between dates")
+        parser.add_argument("--lat-min", type=float, default=-80.0)
+        parser.add_argument("--lat-max", type=float, default=80.0)
+        parser.add_argument("--lat-step", type=float, default=1.0)
+        parser.add_argument("--timezone", type=float, default=0.0)
+        parser.add_argument("--format", choices=export.FORMATS, default="csv")
+        parser.add_argument("--precision", choices=list(astro.PRECISION_TIERS), default=astro.DEFAULT_PRECISION,
+                            help="precision tier of the Moon's position")
+        parser.add_argument("--chunk-days", type=int, default=100, help="dates per part")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+
+    def handle(self, *args, **options):
+        # same defensive checks as the JSON API
+        try:
+            start = datetime.date.fromisoformat(options["start"])
+            end = datetime.date.fromisoformat(options["end"])
+        except ValueError:
+            raise CommandError("Start and end dates must be formatted as YYYY-MM-DD")
+        if start.year < 1900:
+            raise CommandError("Start year must be at least 1900")
+        if end < start:
+            raise CommandError("End date must not be before start date")
+        if options["step"] < 1:
+            raise CommandError("Step must be at least 1 day")
+
+        if options["lat_step"] <= 0 or options["lat_max"] < options["lat_min"]:
+            raise CommandError("Latitudes must run from --lat-min up to --lat-max in positive steps")
+        count = int((options["lat_max"] - options["lat_min"]) / options["lat_step"] + 1e-9) + 1
+        latitudes = [round(options["lat_min"] + i * options["lat_step"], 6) for i in range(count)]
+        if max(abs(latitudes[0]), abs(latitudes[-1])) >= 83.5:
+            raise CommandError("Latitudes must be in the range (-83.5, 83.5)")
+        if abs(options["timezone"]) > 12:
+            raise CommandError("Timezone must be in the range [-12.0, 12.0]")
+        if options["chunk_days"] < 1 or options["workers"] < 1:
+            raise CommandError("Chunk days and workers must be at least 1")
+
+        try:
+            written, skipped = export.export(options["output"], start, end, options["step"], latitudes,
+                                             options["timezone"], options["chunk_days"], options["workers"],
+                                             options["format"], log=self.stdout.write,
+                                             precision=options["precision"])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(f"Wrote {written} parts ({skipped} already done) for {len(latitudes)} latitudes "
+                          f"to {options['output']}")
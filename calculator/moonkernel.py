@@ -0,0 +1,156 @@
+import math
+
+# Generated by python manage.py build_kernel (calculator/kernelgen.py) from the tables in
+# calculator/astro.py, do not edit
+# Straight-line calc_moon_pos() for each precision tier with every table folded into constants, agrees with
+# astro.calc_moon_pos() to float rounding
+
+# radians/degrees constant
+RD = math.pi / 180
+
+
+# Calculate Moon's right ascension and declination given Julian Date at precision fast
+def calc_moon_pos_fast(jd):
+    t = (jd - 2451545.0) / 36525
+
+    # angles reduced to [0, 360) degrees, in radians
+    d = (445564.9597154231 * t) % 360 * RD
+    m = (36356.57924654083 * t) % 360 * RD
+    mprime = (477333.8396575794 * t) % 360 * RD
+    f = (483295.28596437286 * t) % 360 * RD
+
+    # periodic terms, the series amplitudes are split by the power of e applied to them
+    e = 1 - 0.002516 * t - 0.0000074 * t**2
+    suml = 0
+    sumb = 0
+    arg_lng = 97 * d + 8 * m - 2 * mprime - 4 * f
+    arg_lat = 95 * d + 2 * m + 3 * mprime - 6 * f
+    geolong = 481486.1961051505 * t \
+        + ((8437371.0 + e * (-158099.0 + e * 479.0)) * math.sin(arg_lng) + suml) / 1000000
+    geolat = ((6041305.0 + e * (2289.0 + e * 409.0)) * math.sin(arg_lat) + sumb) / 1000000
+
+    # find lambda, beta, epsilon (without nutation)
+    lmda = geolong % 360 * RD
+    epsilon = (0.06509259259259259 + -2958.652000000001 * t / 3600) * RD
+    beta = geolat * RD
+    sin_lmda, sin_epsilon, cos_epsilon = math.sin(lmda), math.sin(epsilon), math.cos(epsilon)
+
+    # find right ascension and declination
+    ra = math.atan2(sin_lmda * cos_epsilon - math.tan(beta) * sin_epsilon, math.cos(lmda)) % (2 * math.pi)
+    dec = math.asin(math.sin(beta) * cos_epsilon + math.cos(beta) * sin_epsilon * sin_lmda)
+    return ra / RD, dec / RD
+
+
+# Calculate Moon's right ascension and declination given Julian Date at precision standard
+def calc_moon_pos_standard(jd):
+    t = (jd - 2451545.0) / 36525
+
+    # angles reduced to [0, 360) degrees, in radians
+    lprime = (481486.1961051505 * t) % 360 * RD
+    d = (445564.9597154231 * t) % 360 * RD
+    m = (36356.57924654083 * t) % 360 * RD
+    mprime = (477333.8396575794 * t) % 360 * RD
+    f = (483295.28596437286 * t) % 360 * RD
+    a1 = (119.75 + 131.849 * t) % 360 * RD
+    a2 = (53.09 + 479264.29 * t) % 360 * RD
+    a3 = (313.45 + 481266.484 * t) % 360 * RD
+    nd = (445564.9599310777 * t) % 360 * RD
+    nm = (36356.57789636667 * t) % 360 * RD
+    nmp = (477333.83909297775 * t) % 360 * RD
+    nf = (483295.2857624445 * t) % 360 * RD
+    nom = (-1809.089667977778 * t) % 360 * RD
+
+    # shared sines and cosines
+    sin_lprime, cos_lprime = math.sin(lprime), math.cos(lprime)
+    sin_f, cos_f = math.sin(f), math.cos(f)
+
+    # periodic terms, the series amplitudes are split by the power of e applied to them
+    e = 1 - 0.002516 * t - 0.0000074 * t**2
+    suml = 3958 * math.sin(a1) + 1962 * sin_lprime * cos_f - 1962 * cos_lprime * sin_f + 318 * math.sin(a2)
+    sumb = -2235 * sin_lprime + 382 * math.sin(a3)
+    arg_lng = 97 * d + 8 * m - 2 * mprime - 4 * f
+    arg_lat = 95 * d + 2 * m + 3 * mprime - 6 * f
+    geolong = 481486.1961051505 * t \
+        + ((8437371.0 + e * (-158099.0 + e * 479.0)) * math.sin(arg_lng) + suml) / 1000000
+    geolat = ((6041305.0 + e * (2289.0 + e * 409.0)) * math.sin(arg_lat) + sumb) / 1000000
+
+    # nutation in longitude and obliquity
+    arg = -13 * nd + 20 * nm + 22 * nmp + 64 * nf + 64 * nom
+    nut_long = 0.0001 * (-184167 + -135.70000000000002 * t) * t * math.sin(arg)
+    nut_oblique = 0.0001 * (98348 + 58.300000000000004 * t) * t * math.cos(arg)
+
+    # find lambda, beta, epsilon
+    lmda = (geolong + nut_long / 3600) % 360 * RD
+    epsilon = (0.06509259259259259 + -2958.652000000001 * t / 3600 + nut_oblique / 3600) * RD
+    beta = geolat * RD
+    sin_lmda, sin_epsilon, cos_epsilon = math.sin(lmda), math.sin(epsilon), math.cos(epsilon)
+
+    # find right ascension and declination
+    ra = math.atan2(sin_lmda * cos_epsilon - math.tan(beta) * sin_epsilon, math.cos(lmda)) % (2 * math.pi)
+    dec = math.asin(math.sin(beta) * cos_epsilon + math.cos(beta) * sin_epsilon * sin_lmda)
+    return ra / RD, dec / RD
+
+
+# Calculate Moon's right ascension and declination given Julian Date at precision full
+def calc_moon_pos_full(jd):
+    t = (jd - 2451545.0) / 36525
+
+    # angles reduced to [0, 360) degrees, in radians
+    lprime = (481486.1961051505 * t) % 360 * RD
+    d = (445564.9597154231 * t) % 360 * RD
+    m = (36356.57924654083 * t) % 360 * RD
+    mprime = (477333.8396575794 * t) % 360 * RD
+    f = (483295.28596437286 * t) % 360 * RD
+    a1 = (119.75 + 131.849 * t) % 360 * RD
+    a2 = (53.09 + 479264.29 * t) % 360 * RD
+    a3 = (313.45 + 481266.484 * t) % 360 * RD
+    nd = (445564.9599310777 * t) % 360 * RD
+    nm = (36356.57789636667 * t) % 360 * RD
+    nmp = (477333.83909297775 * t) % 360 * RD
+    nf = (483295.2857624445 * t) % 360 * RD
+    nom = (-1809.089667977778 * t) % 360 * RD
+
+    # shared sines and cosines
+    sin_lprime, cos_lprime = math.sin(lprime), math.cos(lprime)
+    sin_mprime, cos_mprime = math.sin(mprime), math.cos(mprime)
+    sin_f, cos_f = math.sin(f), math.cos(f)
+    sin_a1 = math.sin(a1)
+
+    # periodic terms, the series amplitudes are split by the power of e applied to them
+    e = 1 - 0.002516 * t - 0.0000074 * t**2
+    suml = 3958 * sin_a1 + 1962 * sin_lprime * cos_f - 1962 * cos_lprime * sin_f + 318 * math.sin(a2)
+    sumb = -2235 * sin_lprime + 382 * math.sin(a3) + 350 * sin_a1 * cos_f + 12 * sin_lprime * cos_mprime
+    sumb -= 242 * cos_lprime * sin_mprime
+    arg_lng = 97 * d + 8 * m - 2 * mprime - 4 * f
+    arg_lat = 95 * d + 2 * m + 3 * mprime - 6 * f
+    geolong = 481486.1961051505 * t \
+        + ((8437371.0 + e * (-158099.0 + e * 479.0)) * math.sin(arg_lng) + suml) / 1000000
+    geolat = ((6041305.0 + e * (2289.0 + e * 409.0)) * math.sin(arg_lat) + sumb) / 1000000
+
+    # nutation in longitude and obliquity
+    arg = -13 * nd + 20 * nm + 22 * nmp + 64 * nf + 64 * nom
+    nut_long = 0.0001 * (-184167 + -135.70000000000002 * t) * t * math.sin(arg)
+    nut_oblique = 0.0001 * (98348 + 58.300000000000004 * t) * t * math.cos(arg)
+
+    # find lambda, beta, epsilon
+    lmda = (geolong + nut_long / 3600) % 360 * RD
+    epsilon = (0.06509259259259259 + -2958.652000000001 * t / 3600 + nut_oblique / 3600) * RD
+    beta = geolat * RD
+    sin_lmda, sin_epsilon, cos_epsilon = math.sin(lmda), math.sin(epsilon), math.cos(epsilon)
+
+    # find right ascension and declination
+    ra = math.atan2(sin_lmda * cos_epsilon - math.tan(beta) * sin_epsilon, math.cos(lmda)) % (2 * math.pi)
+    dec = math.asin(math.sin(beta) * cos_epsilon + math.cos(beta) * sin_epsilon * sin_lmda)
+    return ra / RD, dec / RD
+
+
+KERNELS = {"fast": calc_moon_pos_fast, "standard": calc_moon_pos_standard, "full": calc_moon_pos_full}
+
+
+# Calculate Moon's right ascension and declination given Julian Date, precision is a tier of
+# astro.calc_moon_pos()
+def calc_moon_pos(jd, precision="full"):
+    kernel = KERNELS.get(precision)
+    if kernel is None:
+        raise ValueError(f"Precision must be one of {', '.join(KERNELS)}")
+    return kernel(jd)
@@ -0,0 +1,105 @@
+import math
+import threading
+from io import StringIO
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle, Ellipse, Rectangle
+
+# Matplotlib drawing for the Moon and Sun-Earth-Moon images
+# Only imported on the first render (see draw_moon_img() and draw_system_img() in astro.py), so workers that never
+# render an image with this backend never load matplotlib
+
+
+# Reusable matplotlib figure for the Moon and system images
+# Each renderer owns one preallocated figure and axes, created without pyplot so that no figure is retained
+# globally, and removes the previous patches before every render instead of opening a new figure
+# Renderers are not thread-safe, use get_renderer() to get the one owned by the calling thread
+class FigureRenderer:
+    def __init__(self):
+        self.fig = Figure()
+        self.ax = self.fig.add_subplot()
+        self.ax.axis('off')
+        self.ax.set_aspect('equal', adjustable='box')
+        self.ax.set_facecolor('black')
+        self.ax.set_xlim(0, 1)
+        self.ax.set_ylim(0, 1)
+
+    # Draw patches on the cleared axes and return the figure as an SVG string
+    def render(self, patches, facecolor='white'):
+        for patch in list(self.ax.patches):
+            patch.remove()
+        self.fig.patch.set_facecolor(facecolor)
+        for patch in patches:
+            self.ax.add_patch(patch)
+
+        img = StringIO()
+        self.fig.savefig(img, format='svg')
+        return img.getvalue()
+
+
+renderers = threading.local()
+
+
+# Get the renderer owned by the calling thread, creating it on first use
+def get_renderer():
+    renderer = getattr(renderers, 'renderer', None)
+    if renderer is None:
+        renderer = renderers.renderer = FigureRenderer()
+    return renderer
+
+
+# Draw illuminated Moon image given string phase and illumination
+def draw_moon_img(phase, illumination):
+    patches = []
+
+    # handle new moon
+    if phase == "New Moon":
+        moon_backdrop = Circle(xy=(0.5, 0.5), radius=0.5, edgecolor=(0.8, 0.8, 0.8, 0.1), fc=(0.8, 0.8, 0.8, 0.1))
+        patches.append(moon_backdrop)
+    else:
+        # add moon to plot
+        moon = Circle(xy=(0.5, 0.5), radius=0.5, edgecolor='lightgrey', fc='lightgrey')
+        patches.append(moon)
+
+        # add vertical bar over moon
+        if phase == "First Quarter" or phase == "Waxing Crescent" or phase == "Waxing Gibbous":
+            rect = Rectangle(xy=(0, 0), width=0.5, height=1, edgecolor='k', fc='k')
+            patches.append(rect)
+        elif phase == "Last Quarter" or phase == "Waning Crescent" or phase == "Waning Gibbous":
+            rect = Rectangle(xy=(0.5, 0), width=0.5, height=1, edgecolor='k', fc='k')
+            patches.append(rect)
+
+        # draw ellipses for crescents and gibbouses
+        if phase == "Waxing Crescent" or phase == "Waning Crescent":
+            ellipse = Ellipse(xy=(0.5, 0.5), width=(1-2*illumination), height=1, edgecolor='k', fc='k')
+            patches.append(ellipse)
+        elif phase == "Waxing Gibbous" or phase == "Waning Gibbous":
+            ellipse = Ellipse(xy=(0.5, 0.5), width=(2*illumination-1), height=1, edgecolor='lightgrey', fc='lightgrey')
+            patches.append(ellipse)
+
+    return get_renderer().render(patches, facecolor='black')
+
+
+# Draw image of Sun-Earth-Moon system given Earth and Moon angles (radians)
+def draw_system_img(earth_angle, moon_angle):
+    # add sun
+    sun = Circle(xy=(0.5, 0.5), radius=0.1, edgecolor='orange', fc='orange')
+
+    # add earth's orbit
+    earth_orbit_radius = 0.32
+    earth_orbit = Circle(xy=(0.5, 0.5), radius=earth_orbit_radius, edgecolor='k', fill=False)
+
+    # add earth at proper position
+    earth_x = 0.5 + earth_orbit_radius * math.cos(earth_angle)
+    earth_y = 0.5 + earth_orbit_radius * math.sin(earth_angle)
+    earth = Circle(xy=(earth_x, earth_y), radius=0.05, edgecolor='b', fc='b')
+
+    # add moon's orbit
+    moon_orbit_radius = 0.12
+    moon_orbit = Circle(xy=(earth_x, earth_y), radius=moon_orbit_radius, edgecolor='k', fill=False)
+
+    # add moon at proper position
+    moon_x = earth_x + moon_orbit_radius * math.cos(moon_angle)
+    moon_y = earth_y + moon_orbit_radius * math.sin(moon_angle)
+    moon = Circle(xy=(moon_x, moon_y), radius=0.035, edgecolor='grey', fc='grey')
+
+    return get_renderer().render([sun, earth_orbit, earth, moon_orbit, moon])
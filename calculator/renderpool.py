@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from django.conf import settings
+from calculator import imgcache, timing
+from calculator.astro import calc_system_angles
+
+# Bounded process pool rendering the Moon and system images for the async calculation view
+# Images are looked up in the image cache first, only misses are rendered (both at once) in the pool, so the
+# event loop never runs matplotlib. At most MOON_RENDER_CONCURRENCY requests render at a time, further ones
+# are turned away with Overloaded instead of queueing without bound
+
+# Moon and system images in imgcache.BACKENDS
+MOON, SYSTEM = 0, 1
+
+# default number of worker processes, at most twice as many requests render at a time
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# pool, its number of workers, and request slots, created on first use
+pool = None
+workers = 0
+slots = None
+pool_lock = threading.Lock()
+
+
+# All render slots are taken
+class Overloaded(Exception):
+    pass
+
+
+# Render image kind (MOON or SYSTEM) for cache key with backend_name (runs in a worker process)
+def render_image(backend_name, kind, key):
+    return imgcache.BACKENDS[backend_name][kind](*key)
+
+
+# Get the render pool and request slots, starting the pool on first use
+# Workers are spawned rather than forked so they don't inherit the server's threads
+def get_pool():
+    global pool, workers, slots
+    with pool_lock:
+        if pool is None:
+            workers = getattr(settings, 'MOON_RENDER_WORKERS', DEFAULT_WORKERS)
+            slots = threading.BoundedSemaphore(getattr(settings, 'MOON_RENDER_CONCURRENCY', 2 * workers))
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        return pool, slots
+
+
+# Render the images for keys ((kind, key) pairs) in the pool at once, and store them in the image cache
+# Raises Overloaded if every request slot is taken, returns the list of images
+async def render_images(keys):
+    executor, request_slots = get_pool()
+    if not request_slots.acquire(blocking=False):
+        raise Overloaded("Too many images are being rendered")
+    try:
+        loop = asyncio.get_running_loop()
+        backend = imgcache.backend
+        imgs = await asyncio.gather(*(loop.run_in_executor(executor, render_image, backend, kind, key)
+                                      for kind, key in keys))
+    finally:
+        request_slots.release()
+
+    for (kind, key), img in zip(keys, imgs):
+        (imgcache.moon_cache, imgcache.system_cache)[kind].store(key, img)
+    return imgs
+
+
+# Get the (moon image, system image) given day, month, year and their MoonState, like imgcache.get_moon_img()
+# and imgcache.get_system_img() but rendering misses in the pool; raises Overloaded if it is busy
+# The moon image is None unless moon is set (e.g. when the page links a pre-rendered one)
+async def get_images(day, month, year, state, moon=True):
+    keys = [(MOON, imgcache.moon_key(state.phase, state.illumination)),
+            (SYSTEM, imgcache.system_key(*calc_system_angles(day, month, year, state=state)))]
+    if not moon:
+        keys = keys[1:]
+    imgs = [(imgcache.moon_cache, imgcache.system_cache)[kind].lookup(key) for kind, key in keys]
+
+    missing = [i for i, img in enumerate(imgs) if img is None]
+    if missing:
+        with timing.stage("render_pool"):
+            rendered = await render_images([keys[i] for i in missing])
+        for i, img in zip(missing, rendered):
+            imgs[i] = img
+    return tuple(imgs) if moon else (None, imgs[0])
+
+
+# Render an image in every worker so they have imported the plotting library before the first request
+# (tasks submitted together start a worker each)
+def prewarm():
+    executor, _ = get_pool()
+    list(executor.map(render_image, [imgcache.backend] * workers, [MOON] * workers,
+                      [imgcache.moon_key("Full Moon", 1.0)] * workers))
+
+
+# Shut the pool down (it is started again on next use)
+def shutdown():
+    global pool, slots
+    with pool_lock:
+        if pool is not None:
+            pool.shutdown()
+        pool = slots = None
+
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import math
+import os
+import re
+from calculator.lunations import BETWEEN_NAMES, EVENT_NAMES
+from calculator.svg import draw_moon_svg
+
+# Pre-rendered Moon images for the results page
+# The Moon image only depends on the phase name and illumination, so python manage.py build_sprites renders it once
+# per degree of the lunation (FRAMES frames, new moon at 0, full moon at 180) into static SVG files named by a hash
+# of their content, and a manifest listing the file of every frame. Results pages link the nearest frame, so
+# nothing is rendered per request and browsers and proxies can cache the files forever
+
+SPRITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "moon")
+MANIFEST_NAME = "frames.json"
+
+# frames per lunation (1 degree each); the quarters fall on frames 0, FRAMES / 4, ...
+FRAMES = 360
+
+# file names of frames, a hash of the SVG
+FRAME_NAME = re.compile(r"moon-[0-9a-f]{16}\.svg")
+
+
+# Get the (phase name, illumination) drawn in frame
+# Frames on a quarter are drawn as that quarter, the others as the crescent or gibbous phase between quarters
+def frame_phase(frame):
+    quarter, offset = divmod(frame, FRAMES // 4)
+    phase = BETWEEN_NAMES[quarter] if offset else EVENT_NAMES[quarter]
+    return phase, (1 - math.cos(2 * math.pi * frame / FRAMES)) / 2
+
+
+# Get the frame nearest to phase name and illumination, within the frames drawn as phase
+def nearest_frame(phase, illumination):
+    if phase in EVENT_NAMES:
+        return EVENT_NAMES.index(phase) * FRAMES // 4
+    if phase not in BETWEEN_NAMES:
+        raise ValueError(f"Phase must be one of {', '.join(EVENT_NAMES + BETWEEN_NAMES)}")
+
+    # the angle from the new moon is below 180 degrees while waxing and above while waning
+    quarter = BETWEEN_NAMES.index(phase)
+    angle = math.acos(min(max(1 - 2 * illumination, -1), 1)) / (2 * math.pi) * FRAMES
+    if quarter >= 2:
+        angle = FRAMES - angle
+    first = quarter * FRAMES // 4 + 1
+    return min(max(int(angle + 0.5), first), first + FRAMES // 4 - 2)
+
+
+# Render every frame to directory as moon-<hash>.svg and write the manifest, returns the manifest
+# Files of earlier builds are kept, as cached pages may still link them
+def build_sprites(directory=SPRITE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for frame in range(FRAMES):
+        svg = draw_moon_svg(*frame_phase(frame)).encode()
+        name = f"moon-{hashlib.sha256(svg).hexdigest()[:16]}.svg"
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as frame_file:
+                frame_file.write(svg)
+        names.append(name)
+
+    manifest = {"version": hashlib.sha256("".join(names).encode()).hexdigest()[:16], "frames": names}
+    temporary = os.path.join(directory, MANIFEST_NAME + ".tmp")
+    with open(temporary, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(temporary, os.path.join(directory, MANIFEST_NAME))
+    return manifest
+
+
+# Whether the sprites in directory were built from the current drawing code
+def sprites_are_current(directory=SPRITE_DIR):
+    atlas = load_sprites(directory)
+    if atlas is None or len(atlas["frames"]) != FRAMES:
+        return False
+    for frame, name in enumerate(atlas["frames"]):
+        svg = draw_moon_svg(*frame_phase(frame)).encode()
+        try:
+            with open(os.path.join(directory, name), "rb") as frame_file:
+                if frame_file.read() != svg:
+                    return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+# Read the manifest in directory, or None if the sprites haven't been built
+def load_sprites(directory=SPRITE_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+
+
+# manifest of SPRITE_DIR, read on first use
+sprites = None
+
+
+# Get the manifest of the built sprites ({"version", "frames"}), or None if they haven't been built
+def get_sprites():
+    global sprites
+    if sprites is None:
+        sprites = load_sprites()
+    return sprites
+
+
+# Get the file name of the frame for phase name and illumination, or None if the sprites haven't been built
+def get_frame_name(phase, illumination):
+    atlas = get_sprites()
+    if atlas is None:
+        return None
+    return atlas["frames"][nearest_frame(phase, illumination)]
+
+
+# Read the file of a frame by name (of this or an earlier build), or None if there is no such frame
+def read_frame(name, directory=SPRITE_DIR):
+    if not FRAME_NAME.fullmatch(name):
+        return None
+    try:
+        with open(os.path.join(directory, name), "rb") as frame_file:
+            return frame_file.read()
+    except FileNotFoundError:
+        return None
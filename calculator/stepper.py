@@ -0,0 +1,144 @@
+import cmath
+import datetime
+import math
+from calculator.astro import MOON_COEFF0, MOON_COEFF1, MOON_COEFF2, MOON_COEFF3, MOON_COEFF4, MOON_COEFF5, \
+    MOON_D_LNG, MOON_M_LNG, MOON_MP_LNG, MOON_F_LNG, MOON_SIN_LNG, MOON_D_LAT, MOON_M_LAT, \
+    MOON_MP_LAT, MOON_F_LAT, MOON_SIN_LAT, NUT_RATES, NUT_ARGS, NUT_LONG, NUT_OBLIQUE, J2000, calc_datetime, \
+    calc_jd_from_datetime, reduce_angle
+
+# Incremental evaluation of calc_moon_pos() along evenly spaced times
+# Every argument of calc_moon_pos() and nutate() grows linearly with time (dot_product() folds each table to its
+# sum), so every periodic term is the sine or cosine of a phase theta0 + omega * t. The stepper keeps each term as
+# the unit complex number exp(i * phase) and advances it by multiplying with exp(i * omega * step), the sin/cos
+# angle-addition recurrence, instead of evaluating the series again. Only the conversion to right ascension and
+# declination is evaluated directly at every step. Rounding makes the rotors drift slowly, so the stepper
+# resynchronizes with a full evaluation every resync_every steps
+
+# radians/degrees constant
+RD = math.pi / 180
+
+# days per Julian century, the unit of t
+CENTURY = 36525
+
+# rates (degrees per century) of L', D, M, M', F
+RATE_LPRIME, RATE_D, RATE_M, RATE_MPRIME, RATE_F = (sum(MOON_COEFF0), sum(MOON_COEFF1), sum(MOON_COEFF2),
+                                                    sum(MOON_COEFF3), sum(MOON_COEFF4))
+
+
+# Sum amplitudes by the power of the eccentricity factor applied to each term (|M| = 0, 1, 2)
+def split_by_eccentricity(amplitudes, m_multipliers):
+    sums = [0.0, 0.0, 0.0]
+    for amplitude, m in zip(amplitudes, m_multipliers):
+        sums[abs(m)] += amplitude
+    return sums
+
+
+SIN_LNG = split_by_eccentricity(MOON_SIN_LNG, MOON_M_LNG)
+SIN_LAT = split_by_eccentricity(MOON_SIN_LAT, MOON_M_LAT)
+
+# rates of the arguments of the longitude and latitude series (multipliers of D, M, M', F times their rates) and
+# of the nutation argument
+ARG_LNG_RATE = sum(MOON_D_LNG) * RATE_D + sum(MOON_M_LNG) * RATE_M + sum(MOON_MP_LNG) * RATE_MPRIME \
+    + sum(MOON_F_LNG) * RATE_F
+ARG_LAT_RATE = sum(MOON_D_LAT) * RATE_D + sum(MOON_M_LAT) * RATE_M + sum(MOON_MP_LAT) * RATE_MPRIME \
+    + sum(MOON_F_LAT) * RATE_F
+NUT_ARG_RATE = sum(rate * multiplier for rate, multiplier in zip(NUT_RATES, NUT_ARGS))
+
+# phases of the periodic terms as (constant in degrees, rate in degrees per century), in the order position() uses
+TERMS = {
+    "a1": (119.75, 131.849),
+    "a2": (53.09, 479264.290),
+    "a3": (313.45, 481266.484),
+    "lprime": (0, RATE_LPRIME),
+    "lprime-f": (0, RATE_LPRIME - RATE_F),
+    "a1-f": (119.75, 131.849 - RATE_F),
+    "a1+f": (119.75, 131.849 + RATE_F),
+    "lprime-mprime": (0, RATE_LPRIME - RATE_MPRIME),
+    "lprime+mprime": (0, RATE_LPRIME + RATE_MPRIME),
+    "lng": (0, ARG_LNG_RATE),
+    "lat": (0, ARG_LAT_RATE),
+    "nut": (0, NUT_ARG_RATE),
+}
+
+# default number of steps between full evaluations
+RESYNC_STEPS = 1000
+
+
+# Moon position stepper starting at start (datetime or Julian Date) and advancing by step (timedelta or days)
+class MoonStepper:
+    def __init__(self, start, step, resync_every=RESYNC_STEPS):
+        if isinstance(start, datetime.datetime):
+            start = calc_jd_from_datetime(start)
+        if isinstance(step, datetime.timedelta):
+            step = step.total_seconds() / 86400
+        if resync_every < 1:
+            raise ValueError("Steps between resynchronizations must be at least 1")
+
+        self.step_days = step
+        self.resync_every = resync_every
+        # rotation of every term per step
+        self.rotations = [cmath.exp(1j * rate * RD * step / CENTURY) for _, rate in TERMS.values()]
+        self.seek(start)
+
+    # Jump to Julian Date jd, evaluating every term directly
+    def seek(self, jd):
+        self.start = jd
+        self.steps = 0
+        self.sync()
+
+    # Evaluate every term directly at the current time
+    def sync(self):
+        self.jd = self.start + self.steps * self.step_days
+        t = (self.jd - J2000) / CENTURY
+        self.terms = [cmath.exp(1j * reduce_angle(constant + rate * t) * RD) for constant, rate in TERMS.values()]
+        self.since_sync = 0
+
+    # Advance by one step
+    def advance(self):
+        self.steps += 1
+        self.since_sync += 1
+        if self.since_sync >= self.resync_every:
+            self.sync()
+        else:
+            self.jd = self.start + self.steps * self.step_days
+            self.terms = [term * rotation for term, rotation in zip(self.terms, self.rotations)]
+
+    # Get the current time as a UTC datetime
+    @property
+    def datetime(self):
+        return calc_datetime(self.jd)
+
+    # Get Moon's right ascension and declination (degrees) at the current time, like calc_moon_pos()
+    def position(self):
+        t = (self.jd - J2000) / CENTURY
+        a1, a2, a3, lprime, lprime_f, a1_f, a1f, lprime_mprime, lprimemprime, lng, lat, nut = self.terms
+
+        # periodic terms, with the eccentricity factor on the terms with M
+        e = 1 - 0.002516 * t - 0.0000074 * t**2
+        suml = 3958 * a1.imag + 1962 * lprime_f.imag + 318 * a2.imag
+        sumb = -2235 * lprime.imag + 382 * a3.imag + 175 * a1_f.imag + 175 * a1f.imag + 127 * lprime_mprime.imag \
+            - 115 * lprimemprime.imag
+        geolong = RATE_LPRIME * t + ((SIN_LNG[0] + e * (SIN_LNG[1] + e * SIN_LNG[2])) * lng.imag + suml) / 1000000
+        geolat = ((SIN_LAT[0] + e * (SIN_LAT[1] + e * SIN_LAT[2])) * lat.imag + sumb) / 1000000
+
+        # nutation in longitude and obliquity, as in nutate()
+        nut_long = 0.0001 * (NUT_LONG[0] + NUT_LONG[1] * t) * t * nut.imag
+        nut_oblique = 0.0001 * (NUT_OBLIQUE[0] + NUT_OBLIQUE[1] * t) * t * nut.real
+        geolong = reduce_angle(geolong + nut_long / 3600)
+
+        # find right ascension and declination
+        lmda = geolong * RD
+        beta = geolat * RD
+        epsilon = (((23 + 26 / 60) / 360 + sum(MOON_COEFF5) * t / 3600) + nut_oblique / 3600) * RD
+        ra = math.atan2(math.sin(lmda) * math.cos(epsilon) - math.tan(beta) * math.sin(epsilon), math.cos(lmda))
+        ra = reduce_angle(ra, radians=True) / RD
+        dec = math.asin(math.sin(beta) * math.cos(epsilon) + math.cos(beta) * math.sin(epsilon) * math.sin(lmda)) \
+            / RD
+        return ra, dec
+
+    # Iterate over (Julian Date, right ascension, declination) from the current time on, one step at a time
+    def __iter__(self):
+        while True:
+            ra, dec = self.position()
+            yield self.jd, ra, dec
+            self.advance()
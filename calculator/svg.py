@@ -0,0 +1,126 @@
+import math
+
+# Lightweight SVG builder for the Moon and Sun-Earth-Moon diagrams
+# Emits the same shapes as draw_moon_img() and draw_system_img() in astro.py, placed where matplotlib places them
+# on its default 6.4" x 4.8" figure at 72 dpi, without going through matplotlib
+
+# figure size in points
+WIDTH = 460.8
+HEIGHT = 345.6
+
+# the (0, 1) x (0, 1) data box, squared by set_aspect('equal') and centred in the default subplot area
+BOX_LEFT = 103.104
+BOX_BOTTOM = 307.584
+BOX_SIDE = 266.112
+
+# matplotlib draws patch edges 1 point wide
+STROKE_WIDTH = 1 / BOX_SIDE
+
+# matplotlib named colors used by the diagrams
+COLORS = {
+    'lightgrey': '#d3d3d3',
+    'k': '#000',
+    'orange': '#ffa500',
+    'b': '#00f',
+    'grey': '#808080',
+}
+
+
+# Format a number compactly for SVG attributes (1e-4 of the data box is well under a pixel)
+def num(value):
+    return f"{value:.4g}"
+
+
+# Get paint attributes given a color name, optional opacity, and whether the shape is filled
+# Shapes are filled and stroked with currentColor (set on the enclosing group), so only color is needed
+def paint(color, opacity=None, fill=True):
+    attrs = f'color="{COLORS.get(color, color)}"'
+    if not fill:
+        attrs += ' fill="none"'
+    if opacity is not None:
+        attrs += f' fill-opacity="{num(opacity)}" stroke-opacity="{num(opacity)}"'
+    return attrs
+
+
+# Get circle element in data coordinates
+def circle(x, y, r, color, opacity=None, fill=True):
+    return f'<circle cx="{num(x)}" cy="{num(y)}" r="{num(r)}" {paint(color, opacity, fill)}/>'
+
+
+# Get ellipse element in data coordinates (width and height are full axes, as in matplotlib)
+def ellipse(x, y, width, height, color):
+    return f'<ellipse cx="{num(x)}" cy="{num(y)}" rx="{num(abs(width) / 2)}" ry="{num(abs(height) / 2)}" ' \
+           f'{paint(color)}/>'
+
+
+# Get rectangle element in data coordinates
+def rectangle(x, y, width, height, color):
+    return f'<rect x="{num(x)}" y="{num(y)}" width="{num(width)}" height="{num(height)}" {paint(color)}/>'
+
+
+# Wrap shapes (in data coordinates) into a full SVG document with the given background color
+def document(shapes, background):
+    return f'<svg xmlns="http://www.w3.org/2000/svg" width="{num(WIDTH)}pt" height="{num(HEIGHT)}pt" ' \
+           f'viewBox="0 0 {num(WIDTH)} {num(HEIGHT)}">' \
+           f'<rect width="100%" height="100%" fill="{background}"/>' \
+           f'<g transform="matrix({BOX_SIDE} 0 0 {-BOX_SIDE} {BOX_LEFT} {BOX_BOTTOM})" ' \
+           f'fill="currentColor" stroke="currentColor" stroke-width="{num(STROKE_WIDTH)}">' \
+           + ''.join(shapes) + '</g></svg>'
+
+
+# Draw illuminated Moon image given string phase and illumination
+def draw_moon_svg(phase, illumination):
+    return document(moon_shapes(phase, illumination), '#000')
+
+
+# Get a reusable <symbol> of the Moon image given id, string phase, and illumination
+# The symbol covers the data box only, on a black square, and is drawn with <use href="#id"/>
+def moon_symbol(symbol_id, phase, illumination):
+    return f'<symbol id="{symbol_id}" viewBox="0 0 1 1">' \
+           f'<rect width="1" height="1" fill="#000"/>' \
+           f'<g transform="matrix(1 0 0 -1 0 1)" fill="currentColor" stroke="currentColor" ' \
+           f'stroke-width="{num(STROKE_WIDTH)}">' + ''.join(moon_shapes(phase, illumination)) + '</g></symbol>'
+
+
+# Get the shapes of the Moon image (in data coordinates) given string phase and illumination
+def moon_shapes(phase, illumination):
+    shapes = []
+
+    # handle new moon
+    if phase == "New Moon":
+        shapes.append(circle(0.5, 0.5, 0.5, '#ccc', opacity=0.1))
+    else:
+        # add moon
+        shapes.append(circle(0.5, 0.5, 0.5, 'lightgrey'))
+
+        # add vertical bar over moon
+        if phase == "First Quarter" or phase == "Waxing Crescent" or phase == "Waxing Gibbous":
+            shapes.append(rectangle(0, 0, 0.5, 1, 'k'))
+        elif phase == "Last Quarter" or phase == "Waning Crescent" or phase == "Waning Gibbous":
+            shapes.append(rectangle(0.5, 0, 0.5, 1, 'k'))
+
+        # draw ellipses for crescents and gibbouses
+        if phase == "Waxing Crescent" or phase == "Waning Crescent":
+            shapes.append(ellipse(0.5, 0.5, 1 - 2 * illumination, 1, 'k'))
+        elif phase == "Waxing Gibbous" or phase == "Waning Gibbous":
+            shapes.append(ellipse(0.5, 0.5, 2 * illumination - 1, 1, 'lightgrey'))
+
+    return shapes
+
+
+# Draw image of Sun-Earth-Moon system given Earth and Moon angles (radians)
+def draw_system_svg(earth_angle, moon_angle):
+    earth_orbit_radius = 0.32
+    moon_orbit_radius = 0.12
+    earth_x = 0.5 + earth_orbit_radius * math.cos(earth_angle)
+    earth_y = 0.5 + earth_orbit_radius * math.sin(earth_angle)
+    moon_x = earth_x + moon_orbit_radius * math.cos(moon_angle)
+    moon_y = earth_y + moon_orbit_radius * math.sin(moon_angle)
+
+    return document([
+        circle(0.5, 0.5, 0.1, 'orange'),
+        circle(0.5, 0.5, earth_orbit_radius, 'k', fill=False),
+        circle(earth_x, earth_y, 0.05, 'b'),
+        circle(earth_x, earth_y, moon_orbit_radius, 'k', fill=False),
+        circle(moon_x, moon_y, 0.035, 'grey'),
+    ], '#fff')
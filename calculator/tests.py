@@ -1,3 +1,587 @@
-from django.test import TestCase
+import calendar
+import datetime
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import unittest
+from unittest import mock
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from calculator import astro_array, events, export, imgcache, kernelgen, lunations, moonkernel, sprites, views
+from calculator.astro import calc_jd, calc_date, calc_moon_state, calc_jd_from_datetime, calc_datetime, calc_moon_pos, \
+    calc_phase_angle, calc_rise_set, PRECISION_TIERS, PRECISION_ERRORS, draw_moon_img, draw_system_img
+from calculator.bench import soak_render
+from calculator.eclipses import find_eclipses, calc_eclipse
+from calculator.ephemeris import Ephemeris, EPHEMERIS_PATH
+from calculator.stepper import MoonStepper
+from calculator.svg import draw_moon_svg, draw_system_svg
 
-# Create your tests here.
+# Correctness tests of the calculator, run with: python manage.py test calculator
+# Timings are in calculator.bench
+
+
+# The lunation index against the Meeus formulae, and the phase values read from it
+class LunationIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.first, self.jdes = lunations.read_index()
+
+    # every entry is the true phase of its k, in order
+    def test_entries_are_true_phases(self):
+        for i, jde in enumerate(self.jdes):
+            self.assertEqual(jde, lunations.calc_true_phase((self.first + i) / 4), f"entry {i}")
+        self.assertTrue(all(a < b for a, b in zip(self.jdes, self.jdes[1:])))
+
+    # Meeus examples 49.a (new moon of February 1977) and 49.b (first last quarter of 2044)
+    def test_meeus_examples(self):
+        self.assertAlmostEqual(lunations.calc_true_phase(-283), 2443192.65118, delta=1e-5)
+        self.assertAlmostEqual(lunations.calc_true_phase(544.75), 2467636.49186, delta=1e-5)
+
+    # the index must cover every day of its years
+    def test_coverage(self):
+        self.assertLess(self.jdes[0], calc_jd(1, 1, lunations.FIRST_YEAR))
+        self.assertLess(calc_jd(31, 12, lunations.LAST_YEAR) + 1, self.jdes[-1])
+
+    # the phase name and illumination of every day come from the same fraction of the lunation: event names
+    # are within the event window of their event, crescents less than half lit and gibbous phases more
+    def test_phase_and_illumination_agree(self):
+        for year in range(lunations.FIRST_YEAR, lunations.LAST_YEAR + 1):
+            for month in range(1, 13):
+                for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                    state = calc_moon_state(day, month, year)
+                    if state.phase in lunations.EVENT_NAMES:
+                        offset = (state.fraction - lunations.EVENT_NAMES.index(state.phase) / 4 + 0.5) % 1 - 0.5
+                        self.assertLess(abs(offset), 1 / 50, f"{day}/{month}/{year}")
+                    else:
+                        quarter = lunations.BETWEEN_NAMES.index(state.phase)
+                        self.assertTrue(quarter / 4 <= state.fraction < (quarter + 1) / 4, f"{day}/{month}/{year}")
+                        self.assertEqual(state.illumination >= 0.5, quarter in (1, 2), f"{day}/{month}/{year}")
+
+
+# Every eclipse of 2017-2026 (date of maximum, kind, type), from published eclipse catalogues
+ECLIPSE_REFERENCE = [
+    ("2017-02-11", "lunar", "penumbral"), ("2017-02-26", "solar", "annular"), ("2017-08-07", "lunar", "partial"),
+    ("2017-08-21", "solar", "total"), ("2018-01-31", "lunar", "total"), ("2018-02-15", "solar", "partial"),
+    ("2018-07-13", "solar", "partial"), ("2018-07-27", "lunar", "total"), ("2018-08-11", "solar", "partial"),
+    ("2019-01-06", "solar", "partial"), ("2019-01-21", "lunar", "total"), ("2019-07-02", "solar", "total"),
+    ("2019-07-16", "lunar", "partial"), ("2019-12-26", "solar", "annular"), ("2020-01-10", "lunar", "penumbral"),
+    ("2020-06-05", "lunar", "penumbral"), ("2020-06-21", "solar", "annular"), ("2020-07-05", "lunar", "penumbral"),
+    ("2020-11-30", "lunar", "penumbral"), ("2020-12-14", "solar", "total"), ("2021-05-26", "lunar", "total"),
+    ("2021-06-10", "solar", "annular"), ("2021-11-19", "lunar", "partial"), ("2021-12-04", "solar", "total"),
+    ("2022-04-30", "solar", "partial"), ("2022-05-16", "lunar", "total"), ("2022-10-25", "solar", "partial"),
+    ("2022-11-08", "lunar", "total"), ("2023-04-20", "solar", "hybrid"), ("2023-05-05", "lunar", "penumbral"),
+    ("2023-10-14", "solar", "annular"), ("2023-10-28", "lunar", "partial"), ("2024-03-25", "lunar", "penumbral"),
+    ("2024-04-08", "solar", "total"), ("2024-09-18", "lunar", "partial"), ("2024-10-02", "solar", "annular"),
+    ("2025-03-14", "lunar", "total"), ("2025-03-29", "solar", "partial"), ("2025-09-07", "lunar", "total"),
+    ("2025-09-21", "solar", "partial"), ("2026-02-17", "solar", "annular"), ("2026-03-03", "lunar", "total"),
+    ("2026-08-12", "solar", "total"), ("2026-08-28", "lunar", "partial"),
+]
+
+
+# The eclipse search against eclipse catalogues and Meeus Chapter 54
+class EclipseTests(SimpleTestCase):
+    def test_reference_eclipses(self):
+        found = []
+        for eclipse in find_eclipses(calc_jd(1, 1, 2017), calc_jd(1, 1, 2027)):
+            day, month, year = calc_date(eclipse.jde)[:3]
+            found.append((f"{year}-{month:02d}-{int(day):02d}", eclipse.kind, eclipse.eclipse_type))
+        self.assertEqual(sorted(found), sorted(ECLIPSE_REFERENCE))
+
+    # Meeus Example 54.a: the partial solar eclipse of 1993 May 21, magnitude 0.740
+    def test_meeus_example(self):
+        eclipse = calc_eclipse(-82)
+        self.assertIsNotNone(eclipse)
+        self.assertEqual(eclipse.eclipse_type, "partial")
+        self.assertAlmostEqual(eclipse.magnitude, 0.740, delta=0.001)
+
+
+# The array date conversions against the scalar ones at random inputs, invalid ones included
+class DateConversionTests(SimpleTestCase):
+    count = 20000
+
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+
+    # calc_jd_array() equals calc_jd(), NaN where it raises
+    def test_jd_array(self):
+        day = self.rng.uniform(0.5, 32.5, self.count)
+        month = self.rng.integers(0, 14, self.count)
+        year = self.rng.integers(1850, 2300, self.count)
+        jd = astro_array.calc_jd_array(day, month, year)
+        for i in range(0, self.count, 13):
+            try:
+                expected = calc_jd(day[i], int(month[i]), int(year[i]))
+            except ValueError:
+                expected = math.nan
+            self.assertTrue(jd[i] == expected or math.isnan(jd[i]) and math.isnan(expected),
+                            f"calc_jd_array({day[i]}, {month[i]}, {year[i]}) = {jd[i]}, expected {expected}")
+
+    # calc_date_array() equals calc_date(), zeros where it raises
+    def test_date_array(self):
+        jd = np.concatenate([self.rng.uniform(-10, 5e6, self.count), [np.nan, 0, 2299160.5, 2299161.5]])
+        dates = astro_array.calc_date_array(jd)
+        for i in list(range(0, self.count, 13)) + list(range(self.count, self.count + 4)):
+            try:
+                expected = calc_date(jd[i])
+            except ValueError:
+                expected = (0, 0, 0, 0, 0)
+            self.assertEqual(tuple(int(field[i]) for field in dates), expected, f"calc_date_array({jd[i]})")
+
+    # datetime64 -> Julian Date -> datetime64 is exact to float precision, and matches calc_jd_from_datetime()
+    # and calc_datetime()
+    def test_datetime64_round_trip(self):
+        times = np.datetime64('1900-01-01', 'us') + \
+            self.rng.integers(0, 400 * 365 * 86400 * 10**6, self.count).astype('m8[us]')
+        jd = astro_array.calc_jd_from_datetime64_array(times)
+        back = astro_array.calc_datetime64_array(jd)
+        self.assertLessEqual(np.abs((back - times).astype(np.int64)).max(), 50)
+        for i in range(0, self.count, 13):
+            self.assertEqual(calc_jd_from_datetime(times[i].astype(datetime.datetime)), jd[i])
+            self.assertEqual(calc_datetime(jd[i]).replace(tzinfo=None), back[i])
+
+
+# The ephemeris table against the direct series at random times within it, if it has been built
+# (python manage.py build_ephemeris)
+@unittest.skipUnless(os.path.exists(EPHEMERIS_PATH), "the ephemeris table hasn't been built")
+class EphemerisTests(SimpleTestCase):
+    count = 2000
+
+    # largest interpolation errors: degrees, km, and fractions
+    tolerances = {"ra": 0.002, "dec": 0.002, "distance": 10, "illumination": 1e-6, "fraction": 1e-6}
+
+    def setUp(self):
+        self.table = Ephemeris()
+        self.addCleanup(self.table.close)
+        rng = random.Random(1)
+        first_year = int(calc_date(self.table.start)[2]) + 1
+        last_year = int(calc_date(self.table.end)[2]) - 1
+        dates = [(rng.randint(1, 28) + rng.random(), rng.randint(1, 12), rng.randint(first_year, last_year))
+                 for _ in range(self.count)]
+        self.day, self.month, self.year = (np.array(column) for column in zip(*dates))
+        self.jd = astro_array.calc_jd_array(self.day, self.month, self.year)
+
+    def assertWithin(self, name, actual, expected, period=None):
+        error = np.abs(np.asarray(actual) - expected)
+        if period is not None:
+            error = np.minimum(error % period, period - error % period)
+        self.assertLessEqual(float(error.max()), self.tolerances[name], name)
+
+    def test_lookup_array(self):
+        k = astro_array.calc_moon_phase_array(self.day, self.month, self.year)
+        ra, dec, distance, illumination, fraction = self.table.lookup_array(self.jd)
+        expected_ra, expected_dec = astro_array.calc_moon_pos_array(self.jd)
+        self.assertWithin("ra", ra, expected_ra, 360)
+        self.assertWithin("dec", dec, expected_dec)
+        self.assertWithin("distance", distance, astro_array.calc_moon_distance_array(self.jd))
+        self.assertWithin("illumination", illumination, astro_array.calc_illumination_from_k_array(k))
+        self.assertWithin("fraction", fraction, k - np.trunc(k), 1)
+
+    # the scalar lookups agree with calc_moon_pos() and with the array lookups
+    def test_lookup(self):
+        fraction = self.table.lookup_array(self.jd)[4]
+        for i in range(0, self.count, 7):
+            ra, dec, _, _, fraction_i = self.table.lookup(self.jd[i])
+            expected_ra, expected_dec = calc_moon_pos(self.jd[i])
+            self.assertWithin("ra", ra, expected_ra, 360)
+            self.assertWithin("dec", dec, expected_dec)
+            self.assertWithin("fraction", fraction_i, fraction[i], 1)
+
+
+# The nutation memo of the array functions
+class NutationMemoTests(SimpleTestCase):
+    # memo=True evaluates each distinct Julian Date once and gives the same values as evaluating all of them
+    def test_memo_is_lossless(self):
+        rng = np.random.default_rng(1)
+        jd = rng.choice(rng.uniform(calc_jd(1, 1, 1900), calc_jd(1, 1, 2100), 50), (20, 30))
+        for memoized, direct in zip(astro_array.nutate_array(jd, memo=True), astro_array.nutate_array(jd)):
+            self.assertEqual(memoized.shape, jd.shape)
+            np.testing.assert_array_equal(memoized, direct)
+        for memoized, direct in zip(astro_array.calc_moon_pos_array(jd, memo=True),
+                                    astro_array.calc_moon_pos_array(jd)):
+            np.testing.assert_array_equal(memoized, direct)
+
+
+# The precision tiers against their documented errors and across the array, scalar, and kernel versions
+class PrecisionTests(SimpleTestCase):
+    # every step days of 1900-2100 (PRECISION_ERRORS was measured every 0.01 days)
+    step = 0.1
+
+    # largest difference between the versions in degrees
+    tolerance = 1e-8
+
+    def test_error_bounds(self):
+        jd = np.arange(calc_jd(1, 1, 1900), calc_jd(1, 1, 2100), self.step)
+        ra_full, dec_full = astro_array.calc_moon_pos_array(jd)
+        for precision, (ra_bound, dec_bound) in PRECISION_ERRORS.items():
+            ra, dec = astro_array.calc_moon_pos_array(jd, precision=precision)
+            self.assertLessEqual(np.abs((ra - ra_full + 180) % 360 - 180).max() * 3600, ra_bound, precision)
+            self.assertLessEqual(np.abs(dec - dec_full).max() * 3600, dec_bound, precision)
+
+    def test_versions_agree(self):
+        rng = random.Random(1)
+        jds = [rng.uniform(calc_jd(1, 1, 1900), calc_jd(1, 1, 2100)) for _ in range(2000)]
+        for precision in PRECISION_TIERS:
+            ra, dec = astro_array.calc_moon_pos_array(np.array(jds), precision=precision)
+            for func in (calc_moon_pos, moonkernel.calc_moon_pos):
+                positions = np.array([func(jd, precision) for jd in jds])
+                self.assertLessEqual(np.abs((positions[:, 0] - ra + 180) % 360 - 180).max(), self.tolerance,
+                                     f"{func.__module__} {precision}")
+                self.assertLessEqual(np.abs(positions[:, 1] - dec).max(), self.tolerance,
+                                     f"{func.__module__} {precision}")
+
+
+# The generated kernel against astro's calc_moon_pos()
+class KernelTests(SimpleTestCase):
+    def test_kernel_is_current(self):
+        self.assertTrue(kernelgen.kernel_is_current(),
+                        "moonkernel.py is out of date, run python manage.py build_kernel")
+
+    def test_kernel_equals_astro(self):
+        rng = random.Random(1)
+        for _ in range(5000):
+            jd = rng.uniform(calc_jd(1, 1, 1900), calc_jd(1, 1, 2100))
+            (ra, dec), (ra_kernel, dec_kernel) = calc_moon_pos(jd), moonkernel.calc_moon_pos(jd)
+            self.assertLessEqual(min(abs(ra - ra_kernel), 360 - abs(ra - ra_kernel)), 1e-8, jd)
+            self.assertLessEqual(abs(dec - dec_kernel), 1e-8, jd)
+
+
+# Rendering many images across threads doesn't grow the process: each thread reuses one figure
+class RenderMemoryTests(SimpleTestCase):
+    def test_rss_stays_flat(self):
+        start, _, peak = soak_render(count=1000, threads=4)
+        self.assertLess(peak - start, 5, f"RSS grew from {start:.1f} MB to {peak:.1f} MB")
+
+
+# Convert an SVG color (#rgb or #rrggbb) to an RGB tuple of floats
+def parse_color(color):
+    color = color.lstrip('#')
+    if len(color) == 3:
+        color = ''.join(c * 2 for c in color)
+    return tuple(int(color[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+# Rasterize an SVG produced by calculator.svg into an RGB array of the given shape
+# Shapes are sampled supersample x supersample times per pixel and painted fill first, then stroke
+def rasterize_svg(svg_text, shape, supersample=2):
+    root = ElementTree.fromstring(svg_text)
+    ns = {'svg': 'http://www.w3.org/2000/svg'}
+    background = root.find('svg:rect', ns)
+    group = root.find('svg:g', ns)
+    scale = shape[1] / float(root.get('viewBox').split()[2])
+    a, _, _, d, e, f = (float(v) for v in re.findall(r'[-\d.e]+', group.get('transform')))
+    half_stroke = float(group.get('stroke-width')) / 2
+
+    # sample points in data coordinates
+    height, width = shape[0] * supersample, shape[1] * supersample
+    y, x = np.mgrid[0:height, 0:width]
+    u = ((x + 0.5) / (scale * supersample) - e) / a
+    v = ((y + 0.5) / (scale * supersample) - f) / d
+
+    img = np.empty((height, width, 3))
+    img[:] = parse_color(background.get('fill'))
+    for element in group:
+        tag = element.tag.split('}')[1]
+        if tag == 'rect':
+            x0, y0 = float(element.get('x')), float(element.get('y'))
+            x1, y1 = x0 + float(element.get('width')), y0 + float(element.get('height'))
+            outside = np.maximum(np.maximum(x0 - u, u - x1), np.maximum(y0 - v, v - y1))
+            inside, edge = outside <= 0, np.abs(outside) <= half_stroke
+        else:
+            cx, cy = float(element.get('cx')), float(element.get('cy'))
+            rx = float(element.get('rx', element.get('r')))
+            ry = float(element.get('ry', element.get('r')))
+            radius = np.hypot((u - cx) / rx, (v - cy) / ry)
+            inside, edge = radius <= 1, np.abs(radius - 1) * min(rx, ry) <= half_stroke
+
+        color = np.array(parse_color(element.get('color')))
+        if element.get('fill') != 'none':
+            alpha = float(element.get('fill-opacity', 1))
+            img[inside] = img[inside] * (1 - alpha) + color * alpha
+        alpha = float(element.get('stroke-opacity', 1))
+        img[edge] = img[edge] * (1 - alpha) + color * alpha
+
+    return img.reshape(shape[0], supersample, shape[1], supersample, 3).mean(axis=(1, 3))
+
+
+# Rasterize the figure of the calling thread's matplotlib renderer into an RGB array
+def rasterize_renderer():
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from calculator.plot import get_renderer
+
+    canvas = FigureCanvasAgg(get_renderer().fig)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[..., :3] / 255
+
+
+# The SVG backend against the matplotlib one, rasterized pixel by pixel
+class BackendComparisonTests(SimpleTestCase):
+    # a pixel differs when any channel is off by more than threshold, and at most tolerance of them may
+    threshold = 0.25
+    tolerance = 0.0015
+
+    def assertSameRaster(self, draw_matplotlib, draw_svg, *args):
+        draw_matplotlib(*args)
+        expected = rasterize_renderer()
+        actual = rasterize_svg(draw_svg(*args), expected.shape[:2])
+        differing = float(np.mean(np.abs(expected - actual).max(axis=2) > self.threshold))
+        self.assertLessEqual(differing, self.tolerance, f"{draw_svg.__name__}{args}: {differing:.3%} of pixels differ")
+
+    def test_moon(self):
+        for phase in lunations.EVENT_NAMES + lunations.BETWEEN_NAMES:
+            for illumination in (0.1, 0.3, 0.7, 0.9):
+                self.assertSameRaster(draw_moon_img, draw_moon_svg, phase, illumination)
+
+    def test_system(self):
+        for earth_angle in (0.0, 1.6, 3.1, 4.7):
+            for moon_angle in (0.5, 2.5, 4.5):
+                self.assertSameRaster(draw_system_img, draw_system_svg, earth_angle, moon_angle)
+
+
+# The next event searches against the lunation index and the illumination they look for
+class EventTests(SimpleTestCase):
+    count = 200
+
+    def setUp(self):
+        self.start = calc_jd(1, 1, 2000)
+
+    # the full moons are the full moon entries of the lunation index
+    def test_full_moons(self):
+        first, jdes = lunations.read_index()
+        indexed = [jde for i, jde in enumerate(jdes) if (first + i) % 4 == 2 and jde >= self.start]
+        self.assertEqual(events.find_events("full_moon", self.start, self.count), indexed[:self.count])
+
+    # every crossing is a crossing of the threshold in its direction, one per lunation
+    def test_illumination_crossings(self):
+        for event, sign in (("illumination_above", 1), ("illumination_below", -1)):
+            crossings = events.find_events(event, self.start, self.count, 0.9)
+            self.assertEqual(len(crossings), self.count)
+            for jd in crossings:
+                self.assertAlmostEqual(events.calc_illuminated_fraction(jd), 0.9, delta=1e-6)
+                self.assertGreater(sign * (events.calc_illuminated_fraction(jd + 0.01) - 0.9), 0)
+            self.assertTrue(all(25 < b - a < 34 for a, b in zip(crossings, crossings[1:])), event)
+
+    # thresholds most lunations miss are still found, and a threshold never crossed ends the search
+    def test_rare_crossings(self):
+        self.assertEqual(len(events.find_events("illumination_above", self.start, 5, 0.999999)), 5)
+        self.assertEqual(events.find_events("illumination_above", self.start, 5, 1 - 1e-13), [])
+
+
+# The next events API
+@override_settings(ROOT_URLCONF="calculator.urls")
+class ApiNextTests(SimpleTestCase):
+    # the events are found in dynamical time and given in UT: the full moon of 25 January 2024 was at 17:54 UTC
+    def test_utc(self):
+        response = self.client.get(reverse("api_next"), {"event": "full_moon", "start": "2024-01-01"})
+        self.assertEqual(response.status_code, 200)
+        utc = datetime.datetime.fromisoformat(response.json()["results"][0]["utc"])
+        expected = datetime.datetime(2024, 1, 25, 17, 54, tzinfo=datetime.timezone.utc)
+        self.assertAlmostEqual(utc, expected, delta=datetime.timedelta(minutes=1))
+
+    def test_missing(self):
+        response = self.client.get(reverse("api_next"), {"event": "illumination_above", "threshold": 1 - 1e-13,
+                                                         "start": "2024-01-01", "count": 3})
+        self.assertEqual(response.json()["missing"], 3)
+
+
+# The incremental stepper against calc_moon_pos(), across its resynchronizations
+class StepperTests(SimpleTestCase):
+    def test_steps_match_direct(self):
+        stepper = MoonStepper(2460000.5, 1 / 1440)
+        for i, (jd, ra, dec) in zip(range(5000), stepper):
+            if i % 7 == 0:
+                ra_direct, dec_direct = calc_moon_pos(jd)
+                self.assertLessEqual(min(abs(ra - ra_direct), 360 - abs(ra - ra_direct)), 1e-6, jd)
+                self.assertLessEqual(abs(dec - dec_direct), 1e-6, jd)
+
+
+# The pre-rendered Moon images against the phase of every day of 1900-2100
+class SpriteTests(SimpleTestCase):
+    def test_sprites_are_current(self):
+        self.assertTrue(sprites.sprites_are_current(),
+                        "the Moon sprites are out of date, run python manage.py build_sprites")
+
+    # the frame of every day is drawn as its phase name, and the crescents and gibbous phases nearly as lit
+    # (the new moon, quarters, and full moon are drawn without an ellipse)
+    def test_frames_match_phase(self):
+        for year in range(1900, 2100):
+            for month in range(1, 13):
+                for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                    state = calc_moon_state(day, month, year)
+                    phase, illumination = sprites.frame_phase(sprites.nearest_frame(state.phase, state.illumination))
+                    self.assertEqual(phase, state.phase, f"{day}/{month}/{year}")
+                    if phase in lunations.BETWEEN_NAMES:
+                        self.assertAlmostEqual(illumination, state.illumination, delta=0.01,
+                                               msg=f"{day}/{month}/{year}")
+
+
+# The results page
+@override_settings(ROOT_URLCONF="calculator.urls")
+@override_settings(ROOT_URLCONF="calculator.urls", CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "calculation-tests"}})
+class CalculationTests(SimpleTestCase):
+    query = "day=16&month=3&year=2024&latitude=40&timezone=-5"
+
+    def setUp(self):
+        caches["default"].clear()
+
+    # equivalent queries are sent to the canonical one
+    def test_canonical_redirect(self):
+        response = self.client.get(reverse("calc"), {"day": "16", "month": 3, "year": 2024, "latitude": "40.0001",
+                                                     "timezone": -5})
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response["Location"], f"{reverse('calc')}?{self.query}")
+        response = self.client.get(reverse("calc"), {"day": "01", "month": 3, "year": 2024, "latitude": 40,
+                                                     "timezone": -5})
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response["Location"], f"{reverse('calc')}?day=1&month=3&year=2024&latitude=40&timezone=-5")
+
+    # the canonical page is cacheable forever and revalidated by its ETag
+    def test_etag(self):
+        response = self.client.get(f"{reverse('calc')}?{self.query}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], views.CALC_CACHE_CONTROL)
+        self.assertRegex(response["ETag"], r'^"[0-9a-f]{32}"$')
+        response = self.client.get(f"{reverse('calc')}?{self.query}", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    # a repeated query is answered from the calculation cache without calculating again
+    def test_result_cache(self):
+        first = self.client.get(f"{reverse('calc')}?{self.query}")
+        with mock.patch.object(views, "compute_calculation", side_effect=AssertionError("calculated again")):
+            second = self.client.get(f"{reverse('calc')}?{self.query}")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.content, first.content)
+
+    # the phase angle is the same with or without a MoonState
+    def test_phase_angle_state(self):
+        for day, month, year in ((11, 2, 2017), (13, 2, 2029), (1, 1, 1900), (31, 12, 2250)):
+            state = calc_moon_state(day, month, year)
+            self.assertEqual(calc_phase_angle(day, month, year), calc_phase_angle(day, month, year, state=state))
+
+    # a phase angle that can't be calculated is shown as unavailable
+    def test_nan_phase_angle(self):
+        with mock.patch.object(views, "calc_phase_angle", return_value=math.nan):
+            _, context = views.compute_calculation_data(15, 3, 2024, 40.0, -5)
+            self.assertIsNone(context["phase_angle"])
+            response = self.client.get(reverse("calc"), {"day": 16, "month": 3, "year": 2024, "latitude": 40,
+                                                         "timezone": -5})
+        self.assertContains(response, "Phase angle: unavailable for this date")
+
+
+# The scalar rise and set times of /calc against the array version of the calendar and the API
+class RiseSetTests(SimpleTestCase):
+    def test_scalar_matches_array(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            jd = calc_jd(rng.randint(1, 28), rng.randint(1, 12), rng.randint(1900, 2100))
+            latitude, timezone = rng.uniform(-89, 89), rng.randint(-12, 12)
+            expected = astro_array.calc_rise_set_array(jd, latitude, timezone)
+            for moon_pos in (calc_moon_pos, moonkernel.calc_moon_pos):
+                for hours, expected_hours in zip(calc_rise_set(jd, latitude, timezone, moon_pos=moon_pos), expected):
+                    if math.isnan(expected_hours):
+                        self.assertTrue(math.isnan(hours), (jd, latitude, timezone))
+                    else:
+                        self.assertAlmostEqual(hours, float(expected_hours), delta=1e-6, msg=(jd, latitude, timezone))
+
+
+# The JSON API
+@override_settings(ROOT_URLCONF="calculator.urls")
+class ApiMoonTests(SimpleTestCase):
+    def test_date_limit(self):
+        query = {"start": "2000-01-01", "end": "2099-12-31", "latitude": 40, "timezone": -5}
+        response = self.client.get(reverse("api_moon"), query)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("at most", response.json()["error"])
+        response = self.client.get(reverse("api_moon"), dict(query, step=30))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(b"".join(response.streaming_content))["results"]), 1218)
+
+
+# The bounded LRU image caches, their keys, and their metrics
+@override_settings(ROOT_URLCONF="calculator.urls")
+class ImageCacheTests(SimpleTestCase):
+    def setUp(self):
+        # configure() clears the shared caches, restore the settings after each test
+        settings = imgcache.moon_cache.size, imgcache.step, imgcache.backend
+        self.addCleanup(imgcache.configure, *settings)
+        self.renders = []
+
+    def render(self, *key):
+        self.renders.append(key)
+        return f"image {key}"
+
+    # the least recently used image is evicted first once size images are cached
+    def test_lru_eviction(self):
+        cache = imgcache.RenderCache(self.render, size=2)
+        cache.get((1,))
+        cache.get((2,))
+        cache.get((1,))
+        cache.get((3,))
+        self.assertEqual(list(cache.items), [(1,), (3,)])
+        cache.get((2,))
+        self.assertEqual(self.renders, [(1,), (2,), (3,), (2,)])
+
+    def test_hits_and_misses(self):
+        cache = imgcache.RenderCache(self.render, size=4)
+        for key in ((1,), (1,), (2,), (1,)):
+            self.assertEqual(cache.get(key), f"image {key}")
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 2, "hit_rate": 0.5, "size": 2, "max_size": 4})
+        cache.clear()
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"], cache.stats()["size"]), (0, 0, 0))
+
+    # keys are rounded to the step, system angles also wrapped into [0, 2 pi)
+    def test_key_quantization(self):
+        imgcache.configure(quantization_step=0.01, backend_name="svg")
+        self.assertEqual(imgcache.moon_key("Waxing Gibbous", 0.7349), imgcache.moon_key("Waxing Gibbous", 0.7251))
+        self.assertNotEqual(imgcache.moon_key("Waxing Gibbous", 0.73), imgcache.moon_key("Waning Gibbous", 0.73))
+        self.assertAlmostEqual(imgcache.moon_key("Waxing Gibbous", 0.7349)[1], 0.73)
+        quantum = 2 * math.pi * 0.01
+        earth, moon = imgcache.system_key(1.02 * quantum, 2 * math.pi + 0.01)
+        self.assertAlmostEqual(earth, quantum)
+        self.assertAlmostEqual(moon, 0)
+
+    def test_configure_validation(self):
+        for arguments in ({"size": 0}, {"quantization_step": 0}, {"quantization_step": 1.5},
+                          {"backend_name": "png"}):
+            with self.assertRaises(ValueError, msg=arguments):
+                imgcache.configure(**arguments)
+
+    def test_metrics(self):
+        imgcache.configure(backend_name="svg")
+        imgcache.get_moon_img(15, 3, 2024)
+        imgcache.get_moon_img(15, 3, 2024)
+        lines = imgcache.export_metrics()
+        self.assertIn('moon_image_cache_hits_total{cache="moon"} 1', lines)
+        self.assertIn('moon_image_cache_misses_total{cache="moon"} 1', lines)
+        self.assertIn('moon_image_cache_size{cache="moon"} 1', lines)
+        self.assertContains(self.client.get(reverse("metrics")), 'moon_image_cache_hits_total{cache="moon"} 1')
+
+
+# Resuming an interrupted bulk export
+class ExportTests(SimpleTestCase):
+    def test_resume(self):
+        arguments = (datetime.date(2024, 1, 1), datetime.date(2024, 3, 31), 1, [0, 40.0], -5)
+        with tempfile.TemporaryDirectory() as directory:
+            written, skipped = export.export(directory, *arguments, chunk_days=20, workers=1, log=lambda message: None)
+            self.assertEqual((written, skipped), (5, 0))
+            missing = export.part_path(directory, 2, "csv")
+            with open(missing) as part_file:
+                expected = part_file.read()
+            os.remove(missing)
+
+            # only the missing part is written again, with the same contents
+            self.assertEqual(export.export(directory, *arguments, chunk_days=20, workers=1, log=lambda message: None),
+                             (1, written - 1))
+            with open(missing) as part_file:
+                self.assertEqual(part_file.read(), expected)
+
+            with self.assertRaises(ValueError):
+                export.export(directory, *arguments, chunk_days=20, workers=1, log=lambda message: None,
+                              precision="fast")
@@ -0,0 +1,126 @@
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage request timings, sent in the Server-Timing header and aggregated into Prometheus histograms
+# Stages are only timed while TimingMiddleware handles the request, otherwise stage() does nothing
+# Histograms are kept per process (each worker exposes its own on /metrics)
+
+# histogram bucket upper bounds (seconds)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# stage timings of the current request as a list of (stage name, seconds), None outside TimingMiddleware
+timings = contextvars.ContextVar("timings", default=None)
+
+
+# Thread-safe histogram with one series per label value
+class Histogram:
+    def __init__(self, name, label, description, buckets=BUCKETS):
+        self.name = name
+        self.label = label
+        self.description = description
+        self.buckets = buckets
+        # label value -> [count per bucket (the last one past every bound), sum of observed values]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    # Add an observation of seconds to the series of label value
+    def observe(self, value, seconds):
+        with self.lock:
+            series = self.series.get(value)
+            if series is None:
+                series = self.series[value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            series[1] += seconds
+
+    # Empty every series
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+    # Get the histogram in the Prometheus text format as a list of lines
+    def export(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((value, list(counts), total) for value, (counts, total) in self.series.items())
+        for value, counts, total in series:
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total!r}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram("moon_stage_seconds", "stage", "Time spent in each stage of a request")
+request_seconds = Histogram("moon_request_seconds", "view", "Time spent handling requests by URL name")
+
+
+# Time the block as stage name of the current request
+@contextmanager
+def stage(name):
+    current = timings.get()
+    if current is None:
+        yield
+        return
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.append((name, time.perf_counter() - begin))
+
+
+# Get every histogram in the Prometheus text format
+def export_metrics():
+    return "\n".join(stage_seconds.export() + request_seconds.export()) + "\n"
+
+
+# Opt-in middleware timing each request and its stages
+# Adds a Server-Timing header (stage durations and the total in ms) and records the durations in the histograms
+# Works in both sync and async middleware chains, so it doesn't move async views to a thread
+class TimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # marks instances as coroutine functions for Django, like MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        current = []
+        token = timings.set(current)
+        begin = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings.reset(token)
+        return self.record(request, response, current, time.perf_counter() - begin)
+
+    async def __acall__(self, request):
+        current = []
+        token = timings.set(current)
+        begin = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings.reset(token)
+        return self.record(request, response, current, time.perf_counter() - begin)
+
+    # Record the request's total and stage durations, and add them to response in the Server-Timing header
+    def record(self, request, response, current, total):
+        match = request.resolver_match
+        request_seconds.observe(match.url_name if match is not None and match.url_name else "other", total)
+        for name, seconds in current:
+            stage_seconds.observe(name, seconds)
+        response["Server-Timing"] = ", ".join([f"{name};dur={seconds * 1000:.3f}" for name, seconds in current]
+                                              + [f"total;dur={total * 1000:.3f}"])
+        return response
@@ -1,11 +1,21 @@
 from django.urls import path
 from django.conf.urls import url
+from django.conf import settings
 
 from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('calc', views.calculation, name='calc'),
+    path('calc', views.calculation_async if getattr(settings, 'MOON_ASYNC_CALC', False) else views.calculation,
+         name='calc'),
+    path('api/moon', views.api_moon, name='api_moon'),
+    path('api/next', views.api_next, name='api_next'),
+    path('calendar', views.moon_calendar, name='calendar'),
+    path('metrics', views.metrics, name='metrics'),
+    path('diagrams.js', views.diagrams_js, name='diagrams_js'),
+    path('img/moon.svg', views.moon_svg, name='moon_svg'),
+    path('img/moon/<str:name>', views.moon_frame, name='moon_frame'),
+    path('img/system.svg', views.system_svg, name='system_svg'),
     url(r'references', views.references, name='references'),
     url(r'accuracy', views.accuracy, name='accuracy'),
     url(r'moonphases', views.moonphases, name='moonphases'),
@@ -1,9 +1,69 @@
+import calendar
+import datetime
+import hashlib
+import json
+import math
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponsePermanentRedirect, JsonResponse, StreamingHttpResponse,
+)
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from asgiref.sync import sync_to_async
 from calculator.astro import *
+from calculator import events, imgcache, lunations, moonkernel, renderpool, sprites, timing
+from calculator.svg import moon_symbol
+
+# number of dates computed per batch by the JSON API
+API_CHUNK_SIZE = 1000
+
+# most dates returned by one /api/moon request (over 13 years of days), longer ranges need a larger step
+API_MAX_DATES = 5000
+
+# most events returned by one /api/next request
+NEXT_MAX_COUNT = 100
+
+# illumination step of the calendar's Moon icons, days within the same step share one icon
+CALENDAR_ICON_STEP = 0.05
+
+# /calc query parameters, in canonical order
+CALC_PARAMS = ("day", "month", "year", "latitude", "timezone")
+
+# /calc inputs are rounded to these decimals (0.01 degrees of latitude is about 1 km, 0.0001 days is 8.64 s)
+CALC_LATITUDE_DECIMALS = 2
+CALC_DAY_DECIMALS = 4
+
+# cached /calc results: bump the version when the calculations or the results page change
+CALC_CACHE_VERSION = 2
+CALC_CACHE_TIMEOUT = 30 * 24 * 3600
+CALC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# lifetime of the diagram images served to browsers without JavaScript, and of diagrams.js fetched without its
+# current version
+DIAGRAM_CACHE_CONTROL = "public, max-age=86400"
+
+# phase names accepted by the diagram image
+DIAGRAM_PHASES = lunations.EVENT_NAMES + lunations.BETWEEN_NAMES
+
+# seconds a client should wait before retrying a /calc request turned away because the render pool is busy
+CALC_RETRY_AFTER = 1
+
+# clients allowed to read /metrics unless MOON_METRICS_PUBLIC is set
+METRICS_LOCAL_ADDRESSES = ("127.0.0.1", "::1")
 
 # Create your views here.
 
 
+# Invalid user input, the message is shown on the error page
+class InputError(ValueError):
+    pass
+
+
 def index(request):
     return render(request, "index.html")
 
@@ -24,85 +84,209 @@ def moonrises(request):
     return render(request, "moonrises.html")
 
 
-def calculation(request):
-    # get post requests from index.html
-    input_day = request.POST['input_day']
-    input_month = request.POST['input_month']
-    input_year = request.POST['input_year']
-    input_latitude = request.POST['input_latitude']
-    input_timezone = request.POST['input_timezone']
+def moon_calendar(request):
+    # get query parameters, e.g. ?year=2024&month=3&latitude=40&timezone=-5 (month, latitude, timezone optional)
+    input_year = request.GET.get('year', '')
+    input_month = request.GET.get('month', '')
+    input_latitude = request.GET.get('latitude', '')
+    input_timezone = request.GET.get('timezone', '')
+
+    try:
+        year = int(input_year)
+    except ValueError:
+        msg = "Input year must be an integer"
+        return render(request, "error.html", {"result": msg})
+
+    if year < 1900 or year > 9999:
+        msg = "Input year must be in the range [1900, 9999]"
+        return render(request, "error.html", {"result": msg})
+
+    months = range(1, 13)
+    if input_month:
+        try:
+            month = int(input_month)
+        except ValueError:
+            msg = "Input month must be an integer"
+            return render(request, "error.html", {"result": msg})
+
+        if month < 1 or month > 12:
+            msg = "Input month must be in the range [1, 12]"
+            return render(request, "error.html", {"result": msg})
+        months = [month]
+
+    # rise and set times are only shown for a given place
+    observer = input_latitude != '' or input_timezone != ''
+    if observer:
+        try:
+            latitude = float(input_latitude)
+        except ValueError:
+            msg = "Input latitude must be a floating-point number"
+            return render(request, "error.html", {"result": msg})
+
+        if abs(latitude) >= 83.5:
+            msg = "Input latitude must be in the range (-83.5, 83.5)"
+            return render(request, "error.html", {"result": msg})
+
+        try:
+            timezone = float(input_timezone)
+        except ValueError:
+            msg = "Input timezone must be an integer or floating-point number"
+            return render(request, "error.html", {"result": msg})
+
+        if abs(timezone) > 12:
+            msg = "Input timezone must be in the range [-12.0, 12.0]"
+            return render(request, "error.html", {"result": msg})
+
+    # calculate every day of the calendar in one batch
+    from calculator import astro_array
+    start = datetime.date(year, months[0], 1)
+    count = sum(calendar.monthrange(year, month)[1] for month in months)
+    day, month, year_array = astro_array.split_dates(astro_array.date_range_array(start, 1, 0, count))
+    if observer:
+        data = astro_array.calc_moon_data_array(day, month, year_array, latitude, timezone)
+    else:
+        data = astro_array.calc_phase_data_array(day, month, year_array)
+    columns = {key: value.tolist() for key, value in data.items()}
+
+    # one icon per phase and illumination step, referenced from every day that uses it
+    icon_ids = {}
+    icons = []
+    days = []
+    for i, illumination in enumerate(columns["illumination"]):
+        phase = columns["moon_phase"][i]
+        key = phase, round(illumination / CALENDAR_ICON_STEP)
+        if key not in icon_ids:
+            icon_ids[key] = f"moon{len(icons)}"
+            icons.append(moon_symbol(icon_ids[key], phase, key[1] * CALENDAR_ICON_STEP))
+        days.append({
+            "day": int(day[i]),
+            "icon": icon_ids[key],
+            "moon_phase": phase,
+            "illumination": int(1000 * illumination + 0.5) / 10.0,
+            "eclipse": columns["eclipse"][i] if columns["eclipse"][i] != "No eclipse" else "",
+            "rise_time": format_hours(columns["rise_time"][i]) if observer else None,
+            "set_time": format_hours(columns["set_time"][i]) if observer else None,
+        })
+
+    # lay the days out in weeks starting on Monday
+    calendar_months = []
+    first = 0
+    for month in months:
+        weeks = []
+        for week in calendar.monthcalendar(year, month):
+            weeks.append([days[first + d - 1] if d else None for d in week])
+        first += calendar.monthrange(year, month)[1]
+        calendar_months.append({"name": calendar.month_name[month], "weeks": weeks})
+
+    return render(request, "calendar.html", {
+        "title": f"{calendar.month_name[months[0]]} {year}" if len(months) == 1 else str(year),
+        "weekdays": list(calendar.day_abbr),
+        "icons": icons,
+        "months": calendar_months,
+        "observer": observer,
+    })
+
 
+# Parse and check the /calc inputs, returns (day, month, year, latitude, timezone) or raises InputError
+# The latitude is rounded to CALC_LATITUDE_DECIMALS so nearby places share one cached result
+def parse_calculation(input_day, input_month, input_year, input_latitude, input_timezone):
     # defensive checks because somebody will definitely try to break this
     # also if you're reading this hi! hope your day is going well :)
     try:
         day = float(input_day)
     except ValueError:
         msg = "Input day must be an integer or floating-point number"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     if day < 1 or day >= 32:
         msg = "Input day must be in the range [1.0, 32.0)"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     try:
         month = int(input_month)
     except ValueError:
         msg = "Input month must be an integer"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     if month < 1 or month > 12:
         msg = "Input month must be in the range [1, 12]"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     try:
         year = int(input_year)
     except ValueError:
         msg = "Input year must be an integer"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     if year < 1900:
         msg = "Input year must be at least 1900"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     try:
         latitude = float(input_latitude)
     except ValueError:
         msg = "Input latitude must be a floating-point number"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     if abs(latitude) >= 83.5:
         msg = "Input latitude must be in the range (-83.5, 83.5)"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     try:
         timezone = int(input_timezone)
     except ValueError:
         msg = "Input timezone must be an integer or floating-point number"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     if abs(timezone) > 12:
         msg = "Input timezone must be in the range [-12.0, 12.0]"
-        return render(request, "error.html", {"result": msg})
+        raise InputError(msg)
 
     # passed defensive checks
-    # now do the actual calculations
-
+    day = round(day, CALC_DAY_DECIMALS)
     if day - int(day) == 0.0:
         day = int(day)
+    latitude = round(latitude, CALC_LATITUDE_DECIMALS) + 0.0    # + 0.0 turns -0.0 into 0.0
+    return day, month, year, latitude, timezone
+
+
+# Calculate the results page context given parsed inputs
+def compute_calculation(day, month, year, latitude, timezone):
+    state, context = compute_calculation_data(day, month, year, latitude, timezone)
+    if client_diagrams():
+        context.update(client_diagram_context(day, month, year, state))
+        return context
+    with timing.stage("moon_img"):
+        context["moon_img_url"] = get_moon_frame_url(state)
+        if context["moon_img_url"] is None:
+            context["moon_img"] = imgcache.get_moon_img(day, month, year, state=state)
+    with timing.stage("system_img"):
+        context["system_img"] = imgcache.get_system_img(day, month, year, state=state)
+    return context
+
+
+# Calculate the results page context but the images given parsed inputs, returns (MoonState, context)
+def compute_calculation_data(day, month, year, latitude, timezone):
+    with timing.stage("phase"):
+        state = calc_moon_state(day, month, year)
+        moon_phase = str_moon_phase(day, month, year, state=state)
+        illumination = calc_illumination(day, month, year, state=state)
+        phase_angle = calc_phase_angle(day, month, year, state=state)
+    julian_date = state.jd
+    with timing.stage("moon_pos"):
+        right_ascension, declination = moonkernel.calc_moon_pos(julian_date)
+    try:
+        hour_angle = calc_ha(declination, 0, latitude)
+    except ValueError:
+        # the Moon doesn't reach the horizon at this declination and latitude
+        hour_angle = None
 
-    moon_phase = str_moon_phase(day, month, year)
-    illumination = calc_illumination(day, month, year)
-    phase_angle = calc_phase_angle(day, month, year)
-    julian_date = calc_jd(day, month, year)
-    right_ascension, declination = calc_moon_pos(julian_date)
-    hour_angle = calc_ha(declination, 0, latitude)
-    local_sidereal_time = calc_lst(hour_angle, right_ascension)
-    local_time = calc_local_time(local_sidereal_time)
-    rise_hour, rise_minute = convert_time_zone(local_time, timezone)
-    eclipse = check_eclipse(day, month, year)
-
-    moon_img = get_moon_img(day, month, year)
-    system_img = get_system_img(day, month, year)
+    # rise and set times for the local date, in pure Python on the generated kernel
+    with timing.stage("rise_set"):
+        rise_time, set_time = calc_rise_set(calc_jd(int(day), month, year), latitude, timezone,
+                                            moon_pos=moonkernel.calc_moon_pos)
+    with timing.stage("eclipse"):
+        eclipse = check_eclipse(day, month, year, state=state)
 
     end_message = ""
     if moon_phase == "Full Moon":
@@ -110,19 +294,14 @@ def calculation(request):
 
     # format results
     illumination = int(1000 * illumination + 0.5) / 10.0
-    phase_angle = int(1000 * phase_angle + 0.5) / 1000.0
+    # the phase angle is NaN where the phase can't be placed in a lunation
+    phase_angle = None if math.isnan(phase_angle) else int(1000 * phase_angle + 0.5) / 1000.0
     right_ascension = int(1000 * right_ascension + 0.5) / 1000.0
     declination = int(1000 * declination + 0.5) / 1000.0
-    hour_angle = int(1000 * hour_angle + 0.5) / 1000.0
-
-    if rise_hour < 10:
-        rise_hour = f"0{rise_hour}"
-
-    if rise_minute < 10:
-        rise_minute = f"0{rise_minute}"
+    if hour_angle is not None:
+        hour_angle = int(1000 * hour_angle + 0.5) / 1000.0
 
-    # render the results page with numbers and images
-    return render(request, "result.html", {
+    return state, {
         "day": day,
         "month": month,
         "year": year,
@@ -133,10 +312,394 @@ def calculation(request):
         "right_ascension": right_ascension,
         "declination": declination,
         "hour_angle": hour_angle,
-        "rise_hour": rise_hour,
-        "rise_minute": rise_minute,
+        "rise_time": format_hours(rise_time),
+        "set_time": format_hours(set_time),
         "eclipse": eclipse,
-        "moon_img": moon_img,
-        "system_img": system_img,
         "end_message": end_message
+    }
+
+
+def calculation(request):
+    values, response = parse_calculation_request(request)
+    if response is not None:
+        return response
+    return calculation_response(request, get_calculation_page(*values))
+
+
+# Async version of calculation() for ASGI servers (enabled with MOON_ASYNC_CALC)
+# The numbers are calculated on the event loop and the images rendered in calculator.renderpool, answering
+# 503 when the pool is busy, so rendering doesn't hold up other requests
+async def calculation_async(request):
+    values, response = parse_calculation_request(request)
+    if response is not None:
+        return response
+    try:
+        page = await get_calculation_page_async(*values)
+    except renderpool.Overloaded as error:
+        response = render(request, "error.html", {"result": f"{error}, please try again in a moment"}, status=503)
+        response['Retry-After'] = CALC_RETRY_AFTER
+        return response
+    return calculation_response(request, page)
+
+
+# Get the parsed inputs of a /calc request, returns (values, None), or (None, response) for invalid inputs and
+# non-canonical queries
+def parse_calculation_request(request):
+    # get the inputs from the index.html form (GET) or from older clients (POST)
+    if request.method == 'POST':
+        inputs = [request.POST.get(f"input_{name}", '') for name in CALC_PARAMS]
+    else:
+        inputs = [request.GET.get(name, '') for name in CALC_PARAMS]
+
+    try:
+        with timing.stage("parse"):
+            values = parse_calculation(*inputs)
+    except InputError as error:
+        return None, render(request, "error.html", {"result": str(error)})
+
+    # send every equivalent query to one canonical URL, so caches in front of Django only see that
+    if request.method != 'POST':
+        query = urlencode(dict(zip(CALC_PARAMS, (format_number(value) for value in values))))
+        if request.META.get('QUERY_STRING', '') != query:
+            return None, HttpResponsePermanentRedirect(f"{request.path}?{query}")
+    return values, None
+
+
+# Get the /calc response for a page from get_calculation_page()
+def calculation_response(request, page):
+    etag, content = page
+    if request.method == 'POST':
+        return HttpResponse(content)
+
+    response = HttpResponse(content)
+    response['ETag'] = etag
+    response['Cache-Control'] = CALC_CACHE_CONTROL
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+# Get (ETag, rendered results page) given parsed inputs, from the calculation cache if possible
+def get_calculation_page(day, month, year, latitude, timezone):
+    cache = caches[getattr(settings, 'MOON_CALC_CACHE', 'default')]
+    key = calculation_cache_key(day, month, year, latitude, timezone)
+    page = cache.get(key)
+    if page is None:
+        page = render_calculation_page(compute_calculation(day, month, year, latitude, timezone))
+        cache.set(key, page, getattr(settings, 'MOON_CALC_CACHE_TIMEOUT', CALC_CACHE_TIMEOUT))
+    return page
+
+
+# Async version of get_calculation_page(), rendering the images in calculator.renderpool
+# The cache is read and written in a worker thread, as it may be on the network or on disk
+async def get_calculation_page_async(day, month, year, latitude, timezone):
+    cache = caches[getattr(settings, 'MOON_CALC_CACHE', 'default')]
+    key = calculation_cache_key(day, month, year, latitude, timezone)
+    page = await sync_to_async(cache.get, thread_sensitive=False)(key)
+    if page is None:
+        state, context = compute_calculation_data(day, month, year, latitude, timezone)
+        if client_diagrams():
+            context.update(client_diagram_context(day, month, year, state))
+        else:
+            context["moon_img_url"] = get_moon_frame_url(state)
+            context["moon_img"], context["system_img"] = await renderpool.get_images(
+                day, month, year, state, moon=context["moon_img_url"] is None)
+        page = render_calculation_page(context)
+        await sync_to_async(cache.set, thread_sensitive=False)(
+            key, page, getattr(settings, 'MOON_CALC_CACHE_TIMEOUT', CALC_CACHE_TIMEOUT))
+    return page
+
+
+# Get the calculation cache key given parsed inputs
+# Pages are keyed on the versions of the client-side diagram script and the Moon sprites they link to, and on the
+# backend of the images they inline
+def calculation_cache_key(day, month, year, latitude, timezone):
+    atlas = sprites.get_sprites()
+    diagrams = f"client-{get_diagrams_script()[0]}" if client_diagrams() else imgcache.backend
+    if atlas is not None:
+        diagrams += f"-sprites-{atlas['version']}"
+    return f"calc:{CALC_CACHE_VERSION}:{diagrams}:" + ":".join(format_number(value) for value in
+                                                               (day, month, year, latitude, timezone))
+
+
+# Whether results pages draw the diagrams in the browser (MOON_CLIENT_DIAGRAMS) instead of inlining SVGs
+def client_diagrams():
+    return getattr(settings, 'MOON_CLIENT_DIAGRAMS', False)
+
+
+# Get the results page context of the client-side diagrams given day, month, year and their MoonState
+# The numbers are the image cache keys, so the fallback images for browsers without JavaScript are cache hits
+def client_diagram_context(day, month, year, state):
+    phase, illumination = imgcache.moon_key(state.phase, state.illumination)
+    earth_angle, moon_angle = imgcache.system_key(*calc_system_angles(day, month, year, state=state))
+    numbers = {"illumination": f"{illumination:.6f}", "earth_angle": f"{earth_angle:.6f}",
+               "moon_angle": f"{moon_angle:.6f}"}
+    return {
+        "client_diagrams": True,
+        "diagram_phase": phase,
+        "diagram": numbers,
+        "diagrams_js": f"{reverse('diagrams_js')}?v={get_diagrams_script()[0]}",
+        "moon_img_url": get_moon_frame_url(state) or f"{reverse('moon_svg')}?" + urlencode(
+            {"phase": phase, "illumination": numbers["illumination"]}),
+        "system_img_url": f"{reverse('system_svg')}?" + urlencode({"earth_angle": numbers["earth_angle"],
+                                                                    "moon_angle": numbers["moon_angle"]}),
+    }
+
+
+# Get the URL of the pre-rendered Moon image nearest to a MoonState, or None if the sprites haven't been built
+# The frames are served by moon_frame() unless MOON_SPRITE_URL points at another copy, e.g. the collected static files
+def get_moon_frame_url(state):
+    name = sprites.get_frame_name(state.phase, state.illumination)
+    if name is None:
+        return None
+    base_url = getattr(settings, 'MOON_SPRITE_URL', None)
+    return base_url + name if base_url else reverse('moon_frame', args=[name])
+
+
+# diagrams.js as (version, script), read on first use
+diagrams_script = None
+
+
+# Get diagrams.js as (version, script), the version is a hash of the script
+def get_diagrams_script():
+    global diagrams_script
+    if diagrams_script is None:
+        script = render_to_string("diagrams.js")
+        diagrams_script = hashlib.sha256(script.encode()).hexdigest()[:16], script
+    return diagrams_script
+
+
+# Client-side diagram script of the results page, cached for good under its current version (?v=)
+def diagrams_js(request):
+    version, script = get_diagrams_script()
+    response = HttpResponse(script, content_type="text/javascript; charset=utf-8")
+    response['ETag'] = quote_etag(version)
+    response['Cache-Control'] = CALC_CACHE_CONTROL if request.GET.get('v') == version else DIAGRAM_CACHE_CONTROL
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+# Moon image of the results page for browsers without JavaScript, e.g. ?phase=Full+Moon&illumination=1
+def moon_svg(request):
+    phase = request.GET.get('phase', '')
+    if phase not in DIAGRAM_PHASES:
+        return HttpResponseBadRequest("Phase must be one of " + ", ".join(DIAGRAM_PHASES))
+    try:
+        illumination = float(request.GET.get('illumination', ''))
+    except ValueError:
+        return HttpResponseBadRequest("Illumination must be a floating-point number")
+    if not 0 <= illumination <= 1:
+        return HttpResponseBadRequest("Illumination must be in the range [0, 1]")
+    return diagram_response(imgcache.moon_cache.get(imgcache.moon_key(phase, illumination)))
+
+
+# Pre-rendered Moon image by file name, cached for good as the name is a hash of the content
+def moon_frame(request, name):
+    img = sprites.read_frame(name)
+    if img is None:
+        raise Http404("No such Moon image")
+    response = HttpResponse(img, content_type="image/svg+xml")
+    response['Cache-Control'] = CALC_CACHE_CONTROL
+    return response
+
+
+# Sun-Earth-Moon image of the results page for browsers without JavaScript, e.g. ?earth_angle=1&moon_angle=2
+def system_svg(request):
+    try:
+        angles = [float(request.GET.get(name, '')) for name in ('earth_angle', 'moon_angle')]
+    except ValueError:
+        return HttpResponseBadRequest("Angles must be floating-point numbers")
+    if not all(0 <= angle <= 2 * math.pi for angle in angles):
+        return HttpResponseBadRequest("Angles must be in the range [0, 2 pi] radians")
+    return diagram_response(imgcache.system_cache.get(imgcache.system_key(*angles)))
+
+
+# Get the response of a diagram image
+def diagram_response(img):
+    response = HttpResponse(img, content_type="image/svg+xml")
+    response['Cache-Control'] = DIAGRAM_CACHE_CONTROL
+    return response
+
+
+# Render the results page context, returns (ETag, page)
+def render_calculation_page(context):
+    with timing.stage("render"):
+        content = render_to_string("result.html", context)
+    return quote_etag(hashlib.sha256(content.encode()).hexdigest()[:32]), content
+
+
+# Prometheus metrics of the request and stage timings recorded by calculator.timing.TimingMiddleware
+# Only served to local clients unless MOON_METRICS_PUBLIC is set
+def metrics(request):
+    if not getattr(settings, 'MOON_METRICS_PUBLIC', False) and \
+            request.META.get('REMOTE_ADDR') not in METRICS_LOCAL_ADDRESSES:
+        raise Http404("Metrics are only served to local clients")
+    body = timing.export_metrics() + "\n".join(imgcache.export_metrics()) + "\n"
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Format a parsed input without trailing zeros (15.0 -> 15, 40.10 -> 40.1)
+def format_number(value):
+    return f"{value:.10f}".rstrip('0').rstrip('.') if isinstance(value, float) else str(value)
+
+
+def api_moon(request):
+    # get query parameters, e.g. ?start=2024-01-01&end=2024-12-31&step=1&latitude=40&timezone=-5&precision=fast
+    input_start = request.GET.get('start', '')
+    input_end = request.GET.get('end', input_start)
+    input_step = request.GET.get('step', '1')
+    input_latitude = request.GET.get('latitude', '')
+    input_timezone = request.GET.get('timezone', '')
+    precision = request.GET.get('precision', DEFAULT_PRECISION)
+
+    # same defensive checks as calculation(), reported as JSON
+    try:
+        start = datetime.date.fromisoformat(input_start)
+        end = datetime.date.fromisoformat(input_end)
+    except ValueError:
+        return JsonResponse({"error": "Start and end dates must be formatted as YYYY-MM-DD"}, status=400)
+
+    if start.year < 1900:
+        return JsonResponse({"error": "Start year must be at least 1900"}, status=400)
+
+    if end < start:
+        return JsonResponse({"error": "End date must not be before start date"}, status=400)
+
+    try:
+        step = int(input_step)
+    except ValueError:
+        return JsonResponse({"error": "Step must be an integer number of days"}, status=400)
+
+    if step < 1:
+        return JsonResponse({"error": "Step must be at least 1 day"}, status=400)
+
+    try:
+        latitude = float(input_latitude)
+    except ValueError:
+        return JsonResponse({"error": "Latitude must be a floating-point number"}, status=400)
+
+    if abs(latitude) >= 83.5:
+        return JsonResponse({"error": "Latitude must be in the range (-83.5, 83.5)"}, status=400)
+
+    try:
+        timezone = float(input_timezone)
+    except ValueError:
+        return JsonResponse({"error": "Timezone must be an integer or floating-point number"}, status=400)
+
+    if abs(timezone) > 12:
+        return JsonResponse({"error": "Timezone must be in the range [-12.0, 12.0]"}, status=400)
+
+    if precision not in PRECISION_TIERS:
+        return JsonResponse({"error": f"Precision must be one of {', '.join(PRECISION_TIERS)}"}, status=400)
+
+    count = (end - start).days // step + 1
+    if count > API_MAX_DATES:
+        return JsonResponse({"error": f"Range must have at most {API_MAX_DATES} dates, use a larger step or "
+                                      f"python manage.py moon_export"}, status=400)
+    return StreamingHttpResponse(stream_moon_data(start, step, count, latitude, timezone, precision),
+                                 content_type="application/json")
+
+
+def api_next(request):
+    # get query parameters, e.g. ?event=full_moon&start=2024-01-01T00:00&count=3 or
+    # ?event=illumination_above&threshold=0.9
+    input_event = request.GET.get('event', '')
+    input_start = request.GET.get('start', '')
+    input_count = request.GET.get('count', '1')
+    input_threshold = request.GET.get('threshold', '')
+
+    if input_event not in events.PHASE_EVENTS and input_event not in events.ILLUMINATION_EVENTS:
+        names = ", ".join(list(events.PHASE_EVENTS) + list(events.ILLUMINATION_EVENTS))
+        return JsonResponse({"error": f"Event must be one of {names}"}, status=400)
+
+    # start defaults to now, naive times are UTC
+    if input_start:
+        try:
+            start = datetime.datetime.fromisoformat(input_start)
+        except ValueError:
+            return JsonResponse({"error": "Start must be an ISO date or date and time"}, status=400)
+    else:
+        start = datetime.datetime.now(datetime.timezone.utc)
+
+    # the year is checked in UTC, and results must stay within datetime's range
+    try:
+        start_jd = calc_jd_from_datetime(start)
+    except ValueError:
+        start_jd = None
+    if start_jd is None or start.year > 9000:
+        return JsonResponse({"error": "Start year must be in the range [1900, 9000]"}, status=400)
+
+    try:
+        count = int(input_count)
+    except ValueError:
+        return JsonResponse({"error": "Count must be an integer"}, status=400)
+
+    if not 1 <= count <= NEXT_MAX_COUNT:
+        return JsonResponse({"error": f"Count must be in the range [1, {NEXT_MAX_COUNT}]"}, status=400)
+
+    threshold = None
+    if input_event in events.ILLUMINATION_EVENTS:
+        try:
+            threshold = float(input_threshold)
+        except ValueError:
+            return JsonResponse({"error": "Threshold must be a floating-point number"}, status=400)
+
+        if not 0 < threshold < 1:
+            return JsonResponse({"error": "Threshold must be in the range (0, 1)"}, status=400)
+
+    # the events are found in dynamical time, the results are given in UT
+    instants = [events.calc_jd_from_jde(jde)
+                for jde in events.find_events(input_event, events.calc_jde(start_jd), count, threshold)]
+    return JsonResponse({
+        "event": input_event,
+        "start": start.isoformat(),
+        "threshold": threshold,
+        # illumination thresholds crossed too rarely give fewer results than asked for
+        "missing": count - len(instants),
+        "results": [{"julian_date": jd, "utc": calc_datetime(jd).isoformat(timespec="seconds")} for jd in instants],
     })
+
+
+# Yield the JSON API response in pieces, computing API_CHUNK_SIZE dates at a time at precision tier precision
+def stream_moon_data(start, step, count, latitude, timezone, precision=DEFAULT_PRECISION):
+    # numpy is only loaded once the API is used
+    from calculator import astro_array
+
+    # open the results array inside the header object
+    yield json.dumps({"start": start.isoformat(), "step": step, "count": count,
+                      "latitude": latitude, "timezone": timezone, "precision": precision})[:-1] + ', "results": ['
+
+    for first in range(0, count, API_CHUNK_SIZE):
+        dates = astro_array.date_range_array(start, step, first, min(API_CHUNK_SIZE, count - first))
+        day, month, year = astro_array.split_dates(dates)
+        data = astro_array.calc_moon_data_array(day, month, year, latitude, timezone, precision)
+        columns = {key: value.tolist() for key, value in data.items()}
+
+        rows = []
+        for i, date in enumerate(dates.astype(str).tolist()):
+            rows.append(json.dumps({
+                "date": date,
+                "moon_phase": columns["moon_phase"][i],
+                "illumination": columns["illumination"][i],
+                "phase_angle": json_number(columns["phase_angle"][i]),
+                "julian_date": columns["julian_date"][i],
+                "right_ascension": columns["right_ascension"][i],
+                "declination": columns["declination"][i],
+                "hour_angle": json_number(columns["hour_angle"][i]),
+                "rise_time": format_hours(columns["rise_time"][i]),
+                "set_time": format_hours(columns["set_time"][i]),
+                "eclipse": columns["eclipse"][i],
+            }))
+        yield ("," if first else "") + ",".join(rows)
+
+    yield "]}"
+
+
+# Format local time in hours as HH:MM, or None for NaN (no event on this date)
+def format_hours(hours):
+    if math.isnan(hours):
+        return None
+    minutes = int(hours * 60 + 0.5)
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+
+# Replace NaN (no value for this date) with None so it is serialized as null
+def json_number(value):
+    return None if math.isnan(value) else value
@@ -0,0 +1,126 @@
+// Client-side Moon and Sun-Earth-Moon diagrams for the results page
+// Draws the shapes of calculator/svg.py on every <canvas data-diagram="moon|system"> from its data attributes,
+// so the server only sends the numbers
+
+(function () {
+    "use strict";
+
+    // figure size and the (0, 1) x (0, 1) data box in points, as in calculator/svg.py
+    var WIDTH = 460.8;
+    var HEIGHT = 345.6;
+    var BOX_LEFT = 103.104;
+    var BOX_BOTTOM = 307.584;
+    var BOX_SIDE = 266.112;
+
+    // matplotlib named colors used by the diagrams
+    var COLORS = {lightgrey: "#d3d3d3", k: "#000", orange: "#ffa500", b: "#00f", grey: "#808080"};
+
+    // Size canvas for the screen and paint background, returns its context drawing in data coordinates
+    function setup(canvas, background) {
+        var ratio = window.devicePixelRatio || 1;
+        canvas.width = Math.round((canvas.clientWidth || WIDTH) * ratio);
+        canvas.height = Math.round((canvas.clientHeight || HEIGHT) * ratio);
+        var scale = canvas.width / WIDTH;
+
+        var context = canvas.getContext("2d");
+        context.fillStyle = background;
+        context.fillRect(0, 0, canvas.width, canvas.height);
+        context.setTransform(scale * BOX_SIDE, 0, 0, -scale * BOX_SIDE, scale * BOX_LEFT, scale * BOX_BOTTOM);
+        // matplotlib draws patch edges 1 point wide
+        context.lineWidth = 1 / BOX_SIDE;
+        return context;
+    }
+
+    // Fill (unless fill is false) and stroke the current path in color with optional opacity
+    function paint(context, color, opacity, fill) {
+        context.globalAlpha = opacity === undefined ? 1 : opacity;
+        context.fillStyle = context.strokeStyle = COLORS[color] || color;
+        if (fill !== false) {
+            context.fill();
+        }
+        context.stroke();
+        context.globalAlpha = 1;
+    }
+
+    function circle(context, x, y, r, color, opacity, fill) {
+        context.beginPath();
+        context.arc(x, y, r, 0, 2 * Math.PI);
+        paint(context, color, opacity, fill);
+    }
+
+    // width and height are full axes, as in matplotlib
+    function ellipse(context, x, y, width, height, color) {
+        context.beginPath();
+        context.ellipse(x, y, Math.abs(width) / 2, Math.abs(height) / 2, 0, 0, 2 * Math.PI);
+        paint(context, color);
+    }
+
+    function rectangle(context, x, y, width, height, color) {
+        context.beginPath();
+        context.rect(x, y, width, height);
+        paint(context, color);
+    }
+
+    // Draw illuminated Moon given string phase and illumination, like draw_moon_svg()
+    function drawMoon(canvas, phase, illumination) {
+        var context = setup(canvas, "#000");
+
+        // handle new moon
+        if (phase === "New Moon") {
+            circle(context, 0.5, 0.5, 0.5, "#ccc", 0.1);
+            return;
+        }
+
+        // add moon
+        circle(context, 0.5, 0.5, 0.5, "lightgrey");
+
+        // add vertical bar over moon
+        if (phase === "First Quarter" || phase === "Waxing Crescent" || phase === "Waxing Gibbous") {
+            rectangle(context, 0, 0, 0.5, 1, "k");
+        } else if (phase === "Last Quarter" || phase === "Waning Crescent" || phase === "Waning Gibbous") {
+            rectangle(context, 0.5, 0, 0.5, 1, "k");
+        }
+
+        // draw ellipses for crescents and gibbouses
+        if (phase === "Waxing Crescent" || phase === "Waning Crescent") {
+            ellipse(context, 0.5, 0.5, 1 - 2 * illumination, 1, "k");
+        } else if (phase === "Waxing Gibbous" || phase === "Waning Gibbous") {
+            ellipse(context, 0.5, 0.5, 2 * illumination - 1, 1, "lightgrey");
+        }
+    }
+
+    // Draw Sun-Earth-Moon system given Earth and Moon angles (radians), like draw_system_svg()
+    function drawSystem(canvas, earthAngle, moonAngle) {
+        var context = setup(canvas, "#fff");
+        var earthOrbitRadius = 0.32;
+        var moonOrbitRadius = 0.12;
+        var earthX = 0.5 + earthOrbitRadius * Math.cos(earthAngle);
+        var earthY = 0.5 + earthOrbitRadius * Math.sin(earthAngle);
+        var moonX = earthX + moonOrbitRadius * Math.cos(moonAngle);
+        var moonY = earthY + moonOrbitRadius * Math.sin(moonAngle);
+
+        circle(context, 0.5, 0.5, 0.1, "orange");
+        circle(context, 0.5, 0.5, earthOrbitRadius, "k", 1, false);
+        circle(context, earthX, earthY, 0.05, "b");
+        circle(context, earthX, earthY, moonOrbitRadius, "k", 1, false);
+        circle(context, moonX, moonY, 0.035, "grey");
+    }
+
+    function drawAll() {
+        var canvases = document.querySelectorAll("canvas[data-diagram]");
+        for (var i = 0; i < canvases.length; i++) {
+            var canvas = canvases[i];
+            if (canvas.dataset.diagram === "moon") {
+                drawMoon(canvas, canvas.dataset.phase, parseFloat(canvas.dataset.illumination));
+            } else if (canvas.dataset.diagram === "system") {
+                drawSystem(canvas, parseFloat(canvas.dataset.earthAngle), parseFloat(canvas.dataset.moonAngle));
+            }
+        }
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", drawAll);
+    } else {
+        drawAll();
+    }
+})();